@@ -0,0 +1,144 @@
+"""
+Local stand-in for the Gemini API that enforces fake per-key quotas.
+
+POST /v1beta/models/<model>:generateContent?key=<key> (or the
+x-goog-api-key header) answers like Gemini. After `limit` requests of one
+key within `window` seconds, it answers 429 RESOURCE_EXHAUSTED instead.
+That reply carries a Retry-After header and a RetryInfo retryDelay, like
+the real API. Used to test rate_scheduler.py without spending quota:
+
+    with FakeQuotaServer(limit=3, window=1.0) as server:
+        generate(server.url, "key-a", "Hello")   # see test_rate_scheduler.py
+"""
+import collections
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeQuota/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        key = self.headers.get("x-goog-api-key") or parse_qs(urlparse(self.path).query).get("key", [""])[0]
+        quota = self.server.quota
+        retry_after = quota.admit(key)
+        if retry_after is not None:
+            delay = max(1, math.ceil(retry_after))
+            self._send(429, {"error": {
+                "code": 429, "status": "RESOURCE_EXHAUSTED",
+                "message": f"Quota exceeded for key. Please retry in {retry_after:.3f}s.",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo",
+                             "retryDelay": f"{retry_after:.3f}s"}],
+            }}, {"Retry-After": str(delay)})
+            return
+        if quota.latency:
+            time.sleep(quota.latency)
+        prompt = " ".join(part.get("text", "") for content in body.get("contents", [])
+                          for part in content.get("parts", []))
+        self._send(200, {"candidates": [{
+            "content": {"role": "model", "parts": [{"text": f"Echo: {prompt[:80]}"}]},
+            "finishReason": "STOP",
+        }]})
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _Quota:
+    """Sliding window: at most `limit` admitted requests per key per `window` seconds."""
+
+    def __init__(self, limit, window, latency):
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.admitted = collections.defaultdict(collections.deque)
+        self.counts = collections.Counter()  # key -> admitted total
+        self.rejected = collections.Counter()
+        self.lock = threading.Lock()
+
+    def admit(self, key):
+        """None if admitted, else seconds until the key has quota again."""
+        with self.lock:
+            now = time.monotonic()
+            times = self.admitted[key]
+            while times and now - times[0] >= self.window:
+                times.popleft()
+            if len(times) >= self.limit:
+                self.rejected[key] += 1
+                return self.window - (now - times[0])
+            times.append(now)
+            self.counts[key] += 1
+            return None
+
+
+class FakeQuotaServer:
+    """
+    Args:
+        limit (int): Requests allowed per key per window
+        window (float): Window length in seconds (60 for a real per-minute quota)
+        latency (float): Seconds each admitted request takes
+    """
+
+    def __init__(self, limit=5, window=60.0, latency=0.0, host="127.0.0.1", port=0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.quota = _Quota(limit, window, latency)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        quota = self._server.quota
+        with quota.lock:
+            return {"admitted": dict(quota.counts), "rejected": dict(quota.rejected)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake Gemini endpoint with per-key quotas")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--window", type=float, default=60.0)
+    args = parser.parse_args()
+    server = FakeQuotaServer(args.limit, args.window, port=args.port)
+    print(f"Fake quota server on {server.url} ({args.limit} requests / {args.window:g}s per key)")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,157 @@
+"""
+On-disk cache for LLM-judge responses.
+
+DeepEval metrics ask the judge the same prompts every time a test case is
+re-run. When the judged outputs have not changed, the judge verdicts are
+served from SQLite and Ollama is never called.
+
+- Entries are keyed by (model name, SHA-256 of the prompt, response format).
+- The store is capped at `max_bytes`. The size is kept as a running
+  total; once it passes the cap, the least recently used entries are
+  evicted down to EVICT_TO of the cap, so eviction runs once per burst
+  of writes rather than on every put.
+- The mode (argument or JUDGE_CACHE_MODE env var) sets what is used:
+    readwrite  serve hits, store misses (default)
+    record     always call the model, store the fresh response
+    readonly   serve hits, never write
+    bypass     no cache at all
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+MODES = ("readwrite", "record", "readonly", "bypass")
+DEFAULT_PATH = os.environ.get(
+    "JUDGE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".judge_cache.sqlite3"),
+)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+EVICT_TO = 0.9  # share of max_bytes left after an eviction
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class JudgeCache:
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES, mode=None):
+        mode = mode or os.environ.get("JUDGE_CACHE_MODE", "readwrite")
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._size = 0  # running SUM(size), recounted before each eviction
+        if mode != "bypass":
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS judge_responses ("
+                " model TEXT NOT NULL, prompt_hash TEXT NOT NULL, format TEXT NOT NULL,"
+                " response TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, prompt_hash, format))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS judge_responses_lru ON judge_responses (last_used)"
+            )
+            self._conn.commit()
+            self._size = self._sum_sizes()
+
+    @property
+    def reads(self):
+        return self.mode in ("readwrite", "readonly")
+
+    @property
+    def writes(self):
+        return self.mode in ("readwrite", "record")
+
+    def get(self, model, prompt, format=""):
+        """Cached response, or None on a miss (always None unless the mode reads)."""
+        if not self.reads:
+            return None
+        key = (model, prompt_hash(prompt), format or "")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM judge_responses"
+                " WHERE model = ? AND prompt_hash = ? AND format = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode == "readwrite":
+                self._conn.execute(
+                    "UPDATE judge_responses SET last_used = ?"
+                    " WHERE model = ? AND prompt_hash = ? AND format = ?", (time.time(), *key)
+                )
+                self._conn.commit()
+        return row[0]
+
+    def put(self, model, prompt, format, response):
+        if not self.writes:
+            return
+        key = (model, prompt_hash(prompt), format or "")
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT size FROM judge_responses"
+                " WHERE model = ? AND prompt_hash = ? AND format = ?", key
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_responses"
+                " (model, prompt_hash, format, response, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, response, size, time.time()),
+            )
+            self._size += size - (replaced[0] if replaced else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # other processes may have written to the same file since the last count
+        self._size = self._sum_sizes()
+        if self._size <= self.max_bytes:
+            return
+        target = int(self.max_bytes * EVICT_TO)
+        victims = []
+        # oldest first, rowid breaking ties; only the rows needed are read
+        rows = self._conn.execute(
+            "SELECT rowid, size FROM judge_responses ORDER BY last_used, rowid")
+        for rowid, size in rows:
+            if self._size <= target:
+                break
+            victims.append((rowid,))
+            self._size -= size
+        rows.close()
+        self._conn.executemany("DELETE FROM judge_responses WHERE rowid = ?", victims)
+
+    def _sum_sizes(self):
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM judge_responses").fetchone()[0]
+
+    def size_bytes(self):
+        if self._conn is None:
+            return 0
+        with self._lock:
+            return self._sum_sizes()
+
+    def clear(self):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM judge_responses")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size_bytes": self.size_bytes()}
@@ -0,0 +1,184 @@
+"""
+Adaptive prompt packing for quota-limited endpoints.
+
+generate_batch in test_script_AI_validator.py already packs several
+scenarios into one request and splits the answer on ---SCENARIO--- markers.
+PromptPacker does the same for any list of prompts:
+
+- Packs as many queued prompts into one request as the token budget and
+  the current pack size allow.
+- Splits the response on ---ITEM <id>--- markers back into one answer per
+  prompt.
+- Queues again every prompt whose answer is missing, empty or rejected by
+  `validate`. After `max_attempts` tries it is reported as failed.
+- Halves the pack size when too many answers in a pack come back missing.
+  Grows it by one after each clean pack.
+
+Sequential use:
+    packer = PromptPacker({"a1": "prompt one", "a2": "prompt two"})
+    answers = packer.run(lambda prompt: ask_my_bot(prompt, key))
+
+Concurrent use (e.g. with KeyScheduler): next_pack() → send pack.prompt →
+accept(pack, response), until packer.done.
+"""
+import collections
+import re
+
+ITEM_MARKER = "---ITEM {id}---"
+ITEM_SPLIT = re.compile(r"^[ \t]*-{3}\s*ITEM\s*:?\s*(.+?)\s*-{3}[ \t]*$", re.MULTILINE)
+PACK_INSTRUCTIONS = """Answer each of the following {count} prompts independently, as if each were sent on its own.
+Start every answer with its marker line exactly as shown, for example {example}, and keep the order.
+
+"""
+
+
+def estimate_tokens(text):
+    """~4 characters per token; close enough to budget a request."""
+    return (len(text) + 3) // 4
+
+
+class Pack:
+    def __init__(self, ids, prompt):
+        self.ids = ids
+        self.prompt = prompt
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class PromptPacker:
+    """
+    Args:
+        prompts (dict[str, str]): item id -> prompt
+        max_tokens (int): Budget per request: prompts plus `answer_tokens`
+            reserved for each answer
+        answer_tokens (int): Expected answer length per item
+        pack_size (int): Items per request to start with
+        min_pack / max_pack (int): Bounds for the adaptive pack size
+        shrink_above (float): Halve the pack size when a larger share of a
+            pack comes back missing or malformed
+        max_attempts (int): Tries per item before it is reported as failed
+        validate (callable): answer -> bool; False counts as malformed
+    """
+
+    def __init__(self, prompts, max_tokens=6000, answer_tokens=300, pack_size=5,
+                 min_pack=1, max_pack=20, shrink_above=0.25, max_attempts=3, validate=None):
+        self.prompts = {str(k): v for k, v in prompts.items()}
+        self.max_tokens = max_tokens
+        self.answer_tokens = answer_tokens
+        self.pack_size = max(min_pack, min(pack_size, max_pack))
+        self.min_pack = min_pack
+        self.max_pack = max_pack
+        self.shrink_above = shrink_above
+        self.max_attempts = max_attempts
+        self.validate = validate
+        self.queue = collections.deque(self.prompts)
+        self.attempts = collections.Counter()
+        self.results = {}
+        self.failed = []
+        self.in_flight = 0
+        self.requests = 0
+        self.requeued = 0
+        self.pack_sizes = []
+
+    @property
+    def done(self):
+        return not self.queue and not self.in_flight
+
+    # ── Packing ────────────────────────────────────────────────
+    def build_prompt(self, ids):
+        if len(ids) == 1:
+            return self.prompts[ids[0]]  # nothing to split: send the prompt as is
+        header = PACK_INSTRUCTIONS.format(count=len(ids), example=ITEM_MARKER.format(id=ids[0]))
+        body = "\n\n".join(f"{ITEM_MARKER.format(id=i)}\n{self.prompts[i]}" for i in ids)
+        return header + body
+
+    def next_pack(self):
+        """Next request to send, or None if nothing is queued."""
+        if not self.queue:
+            return None
+        ids, used = [], estimate_tokens(PACK_INSTRUCTIONS)
+        while self.queue and len(ids) < self.pack_size:
+            item = self.queue[0]
+            cost = estimate_tokens(self.prompts[item]) + estimate_tokens(ITEM_MARKER) + self.answer_tokens
+            if ids and used + cost > self.max_tokens:
+                break
+            ids.append(self.queue.popleft())
+            used += cost
+        self.in_flight += 1
+        self.requests += 1
+        self.pack_sizes.append(len(ids))
+        return Pack(ids, self.build_prompt(ids))
+
+    # ── Unpacking ──────────────────────────────────────────────
+    @staticmethod
+    def split(response):
+        """{id: answer} for every ---ITEM id--- section of a response."""
+        parts = ITEM_SPLIT.split(response or "")
+        answers = {}
+        for i in range(1, len(parts), 2):
+            answers.setdefault(parts[i].strip(), parts[i + 1].strip())
+        return answers
+
+    def parse(self, pack, response):
+        if len(pack) == 1:
+            return {pack.ids[0]: (response or "").strip()}
+        return self.split(response)
+
+    def accept(self, pack, response):
+        """
+        Record the answers in `response` (None = the request failed);
+        returns {id: answer} of the items it completed.
+        """
+        self.in_flight -= 1
+        answers = self.parse(pack, response) if response is not None else {}
+        completed, missing = {}, []
+        for item in pack.ids:
+            answer = answers.get(item)
+            if answer and (self.validate is None or self.validate(answer)):
+                completed[item] = answer
+            else:
+                missing.append(item)
+        self.results.update(completed)
+        self._requeue(missing)
+        self._adapt(len(missing) / len(pack))
+        return completed
+
+    def _requeue(self, missing):
+        for item in reversed(missing):
+            self.attempts[item] += 1
+            if self.attempts[item] >= self.max_attempts:
+                self.failed.append(item)
+            else:
+                self.queue.appendleft(item)  # retried first, before new items
+                self.requeued += 1
+
+    def _adapt(self, failure_rate):
+        if failure_rate > self.shrink_above:
+            self.pack_size = max(self.min_pack, self.pack_size // 2)
+        elif failure_rate == 0:
+            self.pack_size = min(self.max_pack, self.pack_size + 1)
+
+    # ── Driving ────────────────────────────────────────────────
+    def run(self, send):
+        """Send packs one after another with send(prompt) -> response text."""
+        while not self.done:
+            pack = self.next_pack()
+            try:
+                response = send(pack.prompt)
+            except Exception:
+                self.accept(pack, None)
+                raise
+            self.accept(pack, response)
+        return self.results
+
+    def stats(self):
+        return {
+            "items": len(self.prompts),
+            "answered": len(self.results),
+            "failed": len(self.failed),
+            "requests": self.requests,
+            "requeued": self.requeued,
+            "pack_size": self.pack_size,
+            "mean_pack": round(sum(self.pack_sizes) / len(self.pack_sizes), 2) if self.pack_sizes else 0,
+        }
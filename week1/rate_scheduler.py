@@ -0,0 +1,301 @@
+"""
+Rate-limit-aware request scheduler for several API keys.
+
+The red-team benchmark used fixed sleeps: 65s after every attack and 60s
+whenever a quota error came back. This scheduler spends that time
+sending requests instead:
+
+- Each key has its own token bucket (requests per minute, plus a burst).
+- Any key with a free token picks up the next queued request. Generation
+  and judge requests are sent concurrently across all configured keys.
+- A rate-limit error (HTTP 429 / RESOURCE_EXHAUSTED) pauses only that key,
+  for as long as the server's retry-after hint says. The request is
+  queued again ahead of newer ones.
+- status_line() reports queue depth, in-flight requests and how much of
+  each key's allowed rate has been used.
+
+Usage:
+    with KeyScheduler(API_KEYS, requests_per_minute=5) as scheduler:
+        future = scheduler.submit(lambda key: ask_my_bot(prompt, key))
+        print(future.result())
+"""
+import itertools
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_RETRY_AFTER = 60.0  # quota error without a hint: the per-minute window
+RETRY_DELAY = re.compile(r"retry[_ ]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE)
+RETRY_IN = re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+# "429 Quota exceeded", "HTTP/1.1 429", "Error code: 429", not "used 429 tokens"
+RATE_LIMIT_TEXT = re.compile(
+    r"^\s*429\b|\b(?:HTTP/[\d.]+|status(?: code)?|error code|code)\W{0,3}429\b"
+    r"|Too Many Requests|RESOURCE_EXHAUSTED",
+    re.IGNORECASE,
+)
+
+
+class RateLimited(Exception):
+    """Raised by a request function when the server refused it for quota reasons."""
+
+    def __init__(self, retry_after=None, message="rate limited"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_from(error):
+    """
+    Seconds to wait before retrying after `error`, or None if it is not a
+    rate-limit error. Reads, in order: a RateLimited hint, a Retry-After
+    header on the error or its response, a Gemini RetryInfo "retryDelay" or
+    "Please retry in Ns" in the message.
+    """
+    hint = getattr(error, "retry_after", None)
+    if hint is not None:
+        return float(hint)
+    response = getattr(error, "response", None)  # requests / httpx style errors
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    header = headers.get("Retry-After")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    text = str(error)
+    for pattern in (RETRY_DELAY, RETRY_IN):
+        match = pattern.search(text)
+        if match:
+            return float(match.group(1))
+    if isinstance(error, RateLimited) or _status_code(error) == 429 or RATE_LIMIT_TEXT.search(text):
+        return DEFAULT_RETRY_AFTER
+    return None
+
+
+def _status_code(error):
+    """HTTP status carried by the error (google.api_core .code, httpx/requests .response)."""
+    response = getattr(error, "response", None)
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None),
+                  getattr(response, "status_code", None)):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """
+    `rate_per_minute` tokens per minute, at most `burst` saved up. A
+    retry-after hint blocks the bucket until it has passed. A request
+    costing more than `burst` goes out once the bucket is full and leaves it
+    in debt, so it is never starved.
+    """
+
+    def __init__(self, rate_per_minute, burst=1, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost=1):
+        """Seconds until `cost` tokens are available (0 = now)."""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            missing = max(0.0, min(cost, self.capacity) - self.tokens)
+            return max(missing / self.rate, self.blocked_until - now, 0.0)
+
+    def try_take(self, cost=1):
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            if now < self.blocked_until or self.tokens < min(cost, self.capacity):
+                return False
+            self.tokens -= cost
+            return True
+
+    def block(self, seconds):
+        """Honour a retry-after hint: no tokens until `seconds` from now."""
+        with self._lock:
+            now = self.clock()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self.updated = now
+
+
+class _Job:
+    def __init__(self, fn, kind, cost):
+        self.fn = fn
+        self.kind = kind
+        self.cost = cost
+        self.attempts = 0
+        self.future = Future()
+
+
+class _KeyStats:
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.rate_limited = 0
+        self.busy_seconds = 0.0
+        self.in_flight = 0
+
+
+class KeyScheduler:
+    """
+    Runs submitted request functions on whichever API key has capacity.
+
+    Args:
+        keys (list[str]): API keys; each gets its own bucket and workers
+        requests_per_minute (float): Allowed rate per key
+        burst (int): Requests a key may send back to back after idling
+        concurrency (int): Requests in flight per key
+        max_retries (int): Rate-limit retries per request before giving up
+
+    A request function takes the API key and returns the result. It must
+    raise on rate-limit errors (retry_after_from() recognises Gemini's);
+    any other exception fails its future.
+    """
+
+    def __init__(self, keys, requests_per_minute=5, burst=1, concurrency=2, max_retries=5,
+                 clock=time.monotonic):
+        if not keys:
+            raise ValueError("KeyScheduler needs at least one API key")
+        self.rpm = requests_per_minute
+        self.max_retries = max_retries
+        self.clock = clock
+        self.started = clock()
+        self.buckets = [TokenBucket(requests_per_minute, burst, clock) for _ in keys]
+        self.stats_by_key = [_KeyStats(f"key{i + 1}") for i in range(len(keys))]
+        self._keys = list(keys)
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted, not yet finished (includes retries in flight)
+        self._completed = {}  # kind -> finished requests
+        self._closed = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, args=(i,), daemon=True,
+                             name=f"scheduler-key{i + 1}-{n}")
+            for i in range(len(keys)) for n in range(concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, fn, kind="request", cost=1):
+        """Queue fn(api_key); returns a Future. `cost` = quota units it uses."""
+        job = _Job(fn, kind, cost)
+        with self._lock:
+            self._pending += 1
+        self._queue.put((next(self._seq), job))
+        return job.future
+
+    def close(self, wait=True):
+        """Stop once every submitted request has finished."""
+        self._closed.set()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    # ── Workers ────────────────────────────────────────────────
+    def _done(self):
+        return self._closed.is_set() and self._pending == 0
+
+    def _work(self, index):
+        bucket = self.buckets[index]
+        while not self._done():
+            # only take a job once this key could send it
+            wait = bucket.wait_time()
+            if wait > 0:
+                time.sleep(min(wait, 0.5))
+                continue
+            try:
+                seq, job = self._queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if not bucket.try_take(job.cost):  # too costly for now, or another worker was faster
+                self._queue.put((seq, job))
+                time.sleep(min(bucket.wait_time(job.cost), 0.5))
+                continue
+            self._run(index, seq, job)
+
+    def _run(self, index, seq, job):
+        bucket, stats = self.buckets[index], self.stats_by_key[index]
+        with self._lock:
+            stats.requests += 1
+            stats.in_flight += 1
+        started = self.clock()
+        try:
+            result = job.fn(self._keys[index])
+        except Exception as e:
+            retry_after = retry_after_from(e)
+            if retry_after is None or job.attempts >= self.max_retries:
+                self._finish(job, job.future.set_exception, e)
+            else:
+                job.attempts += 1
+                bucket.block(retry_after)
+                with self._lock:
+                    stats.rate_limited += 1
+                self._queue.put((seq, job))  # original position: ahead of newer jobs
+        else:
+            self._finish(job, job.future.set_result, result)
+        finally:
+            with self._lock:
+                stats.in_flight -= 1
+                stats.busy_seconds += self.clock() - started
+
+    def _finish(self, job, resolve, value):
+        resolve(value)
+        with self._lock:
+            self._pending -= 1
+            self._completed[job.kind] = self._completed.get(job.kind, 0) + 1
+
+    # ── Reporting ──────────────────────────────────────────────
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        elapsed = max(self.clock() - self.started, 1e-9)
+        # what one key's bucket could have granted so far
+        allowed = self.buckets[0].capacity + self.rpm / 60.0 * elapsed
+        with self._lock:
+            keys = [{
+                "key": s.name,
+                "requests": s.requests,
+                "rate_limited": s.rate_limited,
+                "in_flight": s.in_flight,
+                # share of the key's allowed rate actually used so far
+                "utilisation": round(min(1.0, s.requests / allowed), 3),
+                "busy_fraction": round(s.busy_seconds / elapsed, 3),
+            } for s in self.stats_by_key]
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "queue_depth": self.queue_depth(),
+            "in_flight": sum(k["in_flight"] for k in keys),
+            "completed": dict(self._completed),
+            "keys": keys,
+        }
+
+    def status_line(self):
+        stats = self.stats()
+        keys = " | ".join(
+            f"{k['key']} {k['requests']} req {k['utilisation']:.0%}"
+            + (f" ({k['rate_limited']}×429)" if k["rate_limited"] else "")
+            for k in stats["keys"]
+        )
+        return f"📊 queue {stats['queue_depth']} | in flight {stats['in_flight']} | {keys}"
@@ -1,34 +1,48 @@
 import os
-import time
-import json
 import warnings
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime
+from functools import partial
 from dotenv import load_dotenv
 from google import genai  # The 2026 SDK
 from deepeval.test_case import LLMTestCase
 from deepeval.metrics import ToxicityMetric, BiasMetric
 from deepeval.models import GeminiModel
+from prompt_packer import PromptPacker
+from rate_scheduler import KeyScheduler, retry_after_from
+from result_sink import ResultSink, iter_attacks
 
 load_dotenv()
 os.environ["GRPC_VERBOSITY"] = "ERROR"
 warnings.filterwarnings("ignore")
 
-API_KEYS = [os.getenv("GEMINI_KEY_A"), os.getenv("GEMINI_KEY_B")]
+API_KEYS = [k for k in (os.getenv("GEMINI_KEY_A"), os.getenv("GEMINI_KEY_B")) if k]
+# Free Tier in 2026 often allows only 3-5 requests per minute per key
+RPM_PER_KEY = float(os.getenv("GEMINI_RPM", "5"))
+JUDGE_CALLS = 3  # ToxicityMetric asks the judge for opinions, verdicts and a reason
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")  # e.g. a fake_quota_server.py URL
+# Attacks answered per request; halves automatically when answers go missing (1 = no packing)
+PACK_SIZE = int(os.getenv("ATTACK_PACK_SIZE", "5"))
+ERROR_RESPONSE = "ERROR: Could not get response."
 filename = "adversarial_data.json"
-results_storage = []
+# One line per judged attack, flushed as it lands; a re-run skips what is already there
+results_file = "live_safety_results.jsonl"
 
 # --- NEW: Function to get real response from Gemini ---
 def ask_my_bot(prompt, api_key):
     try:
-        client = genai.Client(api_key=api_key)
+        http_options = {"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None
+        client = genai.Client(api_key=api_key, http_options=http_options)
         response = client.models.generate_content(
             model="gemini-2.5-flash", 
             contents=prompt
         )
         return response.text
     except Exception as e:
+        if retry_after_from(e) is not None:
+            raise  # quota hit: the scheduler waits and retries on a key with quota
         print(f"❌ API Error: {e}")
-        return "ERROR: Could not get response."
+        return ERROR_RESPONSE
 
 def run_and_store(metric_class, case, api_key):
     """Evaluates the case using the provided API key."""
@@ -46,48 +60,78 @@ def run_and_store(metric_class, case, api_key):
         }
         return result_entry
     except Exception as e:
+        if retry_after_from(e) is not None:
+            raise
         print(f"❌ Metric Error: {e}")
         return None
 
 if __name__ == "__main__":
-    print("🚀 Running LIVE Red Team Benchmark (Anti-Throttle Mode)...")
+    print(f"🚀 Running LIVE Red Team Benchmark ({len(API_KEYS)} keys × {RPM_PER_KEY:g} rpm)...")
     
-    with open(filename, "r") as f:
-        data = json.load(f)
+    sink = ResultSink(results_file)
+    attacks = [item for item in iter_attacks(filename)
+               if not sink.has(item['attack_category'], item['example_prompt'])]
+    if sink.resumed:
+        print(f"⏩ Resuming: {sink.resumed} attacks already judged in {results_file}")
 
-    for item in data["attacks"]:
-        category = item['attack_category']
-        prompt = item['example_prompt']
-        
-        # 1. GET THE REAL RESPONSE
-        # We loop until we get a response, even if we have to wait
-        bot_response = None
-        while bot_response is None:
-            response_attempt = ask_my_bot(prompt, API_KEYS[0])
-            if "RESOURCE_EXHAUSTED" in response_attempt:
-                print("⏳ Daily/Minute Quota hit. Sleeping 60s...")
-                time.sleep(60)
-            else:
-                bot_response = response_attempt
+    # Several attacks are answered per request (---ITEM n--- sections); answers
+    # that come back missing are asked again, in smaller packs.
+    packer = PromptPacker({str(i): item['example_prompt'] for i, item in enumerate(attacks)},
+                          pack_size=PACK_SIZE, max_pack=max(PACK_SIZE, 1),
+                          validate=lambda answer: answer != ERROR_RESPONSE)
 
-        print(f"\n🕵️ Category: {category} | 🤖 Bot Said: {bot_response[:50]}...")
+    # Generation and judging share every key; each key is paced by its own
+    # token bucket and paused only for as long as a 429's retry-after says.
+    with KeyScheduler(API_KEYS, requests_per_minute=RPM_PER_KEY) as scheduler:
+        packs, judged = {}, {}
 
-        # 2. CREATE THE TEST CASE
-        adversarial_case = LLMTestCase(input=prompt, actual_output=bot_response)
+        def send_packs():
+            # one pack per key in flight, so a shrunken pack size applies to the next ones
+            while len(packs) < len(API_KEYS) and (pack := packer.next_pack()):
+                packs[scheduler.submit(partial(ask_my_bot, pack.prompt), kind="generate")] = pack
 
-        # 3. RUN EVALUATION (Single Metric to save quota)
-        # Use Key B for evaluation to spread the load across two accounts
-        report = run_and_store(ToxicityMetric, adversarial_case, API_KEYS[1])
-        
-        if report:
-            results_storage.append(report)
-            print(f"✅ Toxicity Score: {report['score']}")
+        # 1. GET THE REAL RESPONSES
+        send_packs()
+        while packs or judged:
+            finished, _ = wait(list(packs) + list(judged), return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in packs:
+                    pack = packs.pop(future)
+                    try:
+                        answers = packer.accept(pack, future.result())
+                    except Exception as e:
+                        print(f"\n❌ Gave up on a pack of {len(pack)} after retries: {e}")
+                        answers = packer.accept(pack, None)
+                    for item_id, bot_response in answers.items():
+                        item = attacks[int(item_id)]
+                        category, prompt = item['attack_category'], item['example_prompt']
+                        print(f"\n🕵️ Category: {category} | 🤖 Bot Said: {bot_response[:50]}...")
+
+                        # 2. CREATE THE TEST CASE
+                        adversarial_case = LLMTestCase(input=prompt, actual_output=bot_response)
+
+                        # 3. RUN EVALUATION (Single Metric to save quota), while other
+                        # prompts are still being answered
+                        judge = partial(run_and_store, ToxicityMetric, adversarial_case)
+                        judged[scheduler.submit(judge, kind="judge", cost=JUDGE_CALLS)] = item
+                    send_packs()
+                else:
+                    item = judged.pop(future)
+                    category = item['attack_category']
+                    try:
+                        report = future.result()
+                    except Exception as e:
+                        print(f"❌ Category: {category} | Judge gave up after retries: {e}")
+                        continue
+                    if report:
+                        sink.write(category, item['example_prompt'], report)
+                        print(f"✅ {category} | Toxicity Score: {report['score']}")
+                print(scheduler.status_line())
 
-        # 4. THE SAFETY GAP
-        # Free Tier in 2026 often allows only 3-5 requests per minute.
-        print("🕒 Waiting 65s to refresh minute-limit...")
-        time.sleep(65) 
+    for item_id in packer.failed:
+        print(f"❌ Category: {attacks[int(item_id)]['attack_category']} | No answer after retries")
+    print(f"📦 Packing: {packer.stats()}")
 
-    # Save results
-    with open("live_safety_results.json", "w") as f:
-        json.dump(results_storage, f, indent=4)
\ No newline at end of file
+    # Save results (every run so far, in the old single-file format too)
+    sink.close()
+    sink.export_json("live_safety_results.json")
\ No newline at end of file
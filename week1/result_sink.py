@@ -0,0 +1,134 @@
+"""
+Append-only JSONL result sink for long benchmark runs.
+
+The benchmarks kept every result in `results_storage` and wrote their JSON
+file only at the end, so a crash in hour three lost the whole run. With
+ResultSink:
+
+- Each evaluated case is appended as one JSON line and flushed right away.
+- On restart, cases already in the file are skipped. A case is keyed by
+  attack category and prompt hash, so paid calls are not repeated.
+- export_json() still writes the old JSON array file at the end.
+- iter_attacks() reads adversarial_data.json one attack at a time instead
+  of json.load-ing the whole file.
+
+Usage:
+    sink = ResultSink("live_safety_results.jsonl")
+    for attack in iter_attacks("adversarial_data.json"):
+        if sink.has(attack["attack_category"], attack["example_prompt"]):
+            continue
+        ...
+        sink.write(attack["attack_category"], attack["example_prompt"], report)
+"""
+import hashlib
+import json
+import os
+import threading
+
+READ_CHUNK = 64 * 1024
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def case_key(category, prompt):
+    return f"{category}:{prompt_hash(prompt)}"
+
+
+def read_results(path):
+    """Every complete result line in `path`; a line torn by a crash is skipped."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class ResultSink:
+    def __init__(self, path):
+        self.path = path
+        self.done = {r["case_key"] for r in read_results(path) if "case_key" in r}
+        self.resumed = len(self.done)
+        self._lock = threading.Lock()
+        self._file = open(path, "a+", encoding="utf-8")
+        if self._file.tell():
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")  # end a line torn by the interrupted run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def has(self, category, prompt):
+        return case_key(category, prompt) in self.done
+
+    def write(self, category, prompt, entry):
+        """Append one result and flush it; returns the stored line."""
+        key = case_key(category, prompt)
+        line = {**entry, "category": category, "prompt_hash": prompt_hash(prompt), "case_key": key}
+        with self._lock:
+            self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.done.add(key)
+        return line
+
+    def close(self):
+        self._file.close()
+
+    def export_json(self, path):
+        """Write every stored result as one JSON array (the old output format)."""
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("[")
+            for n, result in enumerate(read_results(self.path)):
+                f.write(",\n" if n else "\n")
+                f.write(json.dumps(result, indent=4, ensure_ascii=False))
+            f.write("\n]\n")
+        os.replace(path + ".tmp", path)
+
+
+def iter_attacks(path, key="attacks", chunk_size=READ_CHUNK):
+    """
+    Yield the items of the top-level `key` array of a JSON file one by one,
+    reading it in chunks.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = ""
+
+        def fill():
+            """Read the next chunk; False at end of file."""
+            nonlocal buffer
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            return bool(chunk)
+
+        # find the array: "<key>" : [
+        marker = json.dumps(key)
+        while True:
+            at = buffer.find(marker)
+            bracket = buffer.find("[", at + len(marker)) if at >= 0 else -1
+            if bracket >= 0:
+                buffer = buffer[bracket + 1:]
+                break
+            if not fill():
+                raise ValueError(f"no {marker} array in {path}")
+
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            yield item
+            buffer = buffer[end:]
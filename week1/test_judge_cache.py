@@ -0,0 +1,62 @@
+import pytest
+
+import judge_cache
+from judge_cache import JudgeCache
+
+
+def test_hits_and_misses_are_keyed_by_model_prompt_and_format(tmp_path):
+    path = str(tmp_path / "judge.sqlite3")
+    cache = JudgeCache(path, mode="readwrite")
+    assert cache.get("llama3.2", "Is this toxic?") is None
+    cache.put("llama3.2", "Is this toxic?", "json", '{"score": 0}')
+
+    assert cache.get("llama3.2", "Is this toxic?", "json") == '{"score": 0}'
+    assert cache.get("llama3.2", "Is this toxic?") is None  # other format
+    assert cache.get("mistral", "Is this toxic?", "json") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+    reopened = JudgeCache(path, mode="readwrite")  # a later test session
+    assert reopened.get("llama3.2", "Is this toxic?", "json") == '{"score": 0}'
+    assert reopened.size_bytes() == len('{"score": 0}')
+
+
+def test_each_mode_reads_and_writes_only_what_it_should(tmp_path):
+    path = str(tmp_path / "judge.sqlite3")
+    JudgeCache(path).put("m", "p", "", "old")
+
+    record = JudgeCache(path, mode="record")
+    assert record.get("m", "p") is None  # always asks the model
+    record.put("m", "p", "", "new")
+
+    readonly = JudgeCache(path, mode="readonly")
+    assert readonly.get("m", "p") == "new"
+    readonly.put("m", "q", "", "never stored")
+    assert JudgeCache(path).get("m", "q") is None
+
+    bypass = JudgeCache(path, mode="bypass")
+    bypass.put("m", "p", "", "ignored")
+    assert bypass.get("m", "p") is None and bypass.size_bytes() == 0
+    assert JudgeCache(path).get("m", "p") == "new"
+
+    with pytest.raises(ValueError):
+        JudgeCache(path, mode="write-only")
+
+
+def test_byte_cap_evicts_least_recently_used_without_dropping_ties(tmp_path, monkeypatch):
+    monkeypatch.setattr(judge_cache.time, "time", lambda: 1000.0)  # every entry ties on last_used
+    cache = JudgeCache(str(tmp_path / "judge.sqlite3"), max_bytes=100)
+    for i in range(10):
+        cache.put("m", f"p{i}", "", "x" * 10)
+    assert cache.size_bytes() == 100
+
+    cache.put("m", "p10", "", "x" * 10)  # over the cap: down to 90 bytes, oldest rows first
+
+    kept = [i for i in range(11) if cache.get("m", f"p{i}") is not None]
+    assert kept == list(range(2, 11))
+    assert cache.size_bytes() == 90
+
+    monkeypatch.setattr(judge_cache.time, "time", lambda: 2000.0)
+    cache.get("m", "p2")  # touched: now the most recently used
+    cache.put("m", "p11", "", "x" * 20)
+    assert cache.get("m", "p2") is not None and cache.get("m", "p3") is None
+    assert cache.size_bytes() <= 90
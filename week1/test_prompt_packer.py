@@ -0,0 +1,69 @@
+import re
+
+from prompt_packer import ITEM_MARKER, PromptPacker, estimate_tokens
+
+
+def echo_model(drop=(), limit=None):
+    """Answers every ---ITEM id--- section, except ids in `drop` (and beyond `limit` items)."""
+    calls = []
+
+    def send(prompt):
+        calls.append(prompt)
+        sections = re.findall(r"^---ITEM (\S+)---\n(.*)$", prompt, re.MULTILINE)
+        if not sections:
+            return f"answer to {prompt}"
+        out = []
+        for n, (item, text) in enumerate(sections):
+            if item in drop or (limit is not None and n >= limit):
+                continue
+            out.append(f"{ITEM_MARKER.format(id=item)}\nanswer to {text}")
+        return "Sure! Here you go.\n\n" + "\n\n".join(out)
+
+    send.calls = calls
+    return send
+
+
+def test_packs_up_to_the_token_budget_and_splits_answers_back():
+    prompts = {str(i): f"attack prompt number {i} " * 5 for i in range(10)}
+    per_item = estimate_tokens(prompts["0"]) + estimate_tokens(ITEM_MARKER) + 50
+    packer = PromptPacker(prompts, max_tokens=per_item * 4 + 100, answer_tokens=50,
+                          pack_size=8, max_pack=8)
+    send = echo_model()
+
+    results = packer.run(send)
+
+    assert results == {i: f"answer to {p}".strip() for i, p in prompts.items()}
+    assert packer.pack_sizes == [4, 4, 2]  # the budget, not pack_size=8, bounds each request
+    assert packer.stats()["requests"] == 3 and packer.failed == []
+
+
+def test_missing_and_malformed_answers_are_requeued_first():
+    prompts = {str(i): f"prompt {i}" for i in range(6)}
+    packer = PromptPacker(prompts, pack_size=3, max_pack=3,
+                          validate=lambda answer: not answer.startswith("ERROR"))
+
+    first = packer.next_pack()
+    response = "---ITEM 0---\nanswer to prompt 0\n---ITEM 1---\nERROR: refused"  # no item 2
+    completed = packer.accept(first, response)
+    assert completed == {"0": "answer to prompt 0"}
+    assert list(packer.queue)[:2] == ["1", "2"]  # retried before new items
+
+    results = packer.run(echo_model())
+    assert sorted(results) == sorted(prompts)
+    assert packer.requeued == 2 and packer.failed == []
+
+
+def test_pack_size_adapts_to_failures_and_gives_up_after_max_attempts():
+    prompts = {str(i): f"prompt {i}" for i in range(40)}
+    packer = PromptPacker(prompts, pack_size=8, max_pack=10, max_attempts=3)
+
+    packer.run(echo_model(limit=3))  # the model only ever answers the first 3 sections
+
+    sizes = packer.pack_sizes
+    assert sizes[0] == 8 and sizes[1] == 4  # 5 of 8 missing → halved
+    assert max(sizes[2:]) == 4  # 1 of 4 missing is within shrink_above, so it settles there
+    assert sorted(packer.results) == sorted(prompts) and packer.failed == []
+
+    hopeless = PromptPacker({"x": "prompt x"}, max_attempts=2)
+    hopeless.run(lambda prompt: "")  # empty answer every time
+    assert hopeless.failed == ["x"] and hopeless.requests == 2 and hopeless.done
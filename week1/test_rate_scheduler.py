@@ -0,0 +1,83 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fake_quota_server import FakeQuotaServer
+from rate_scheduler import KeyScheduler, RateLimited, retry_after_from
+
+
+def generate(base_url, prompt, api_key):
+    request = urllib.request.Request(
+        f"{base_url}/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}",
+        data=json.dumps({"contents": [{"parts": [{"text": prompt}]}]}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def test_within_quota_all_keys_share_the_work_without_429s():
+    with FakeQuotaServer(limit=3, window=1.0) as server:
+        started = time.perf_counter()
+        with KeyScheduler(["key-a", "key-b"], requests_per_minute=150) as scheduler:
+            futures = [scheduler.submit(lambda key, i=i: generate(server.url, f"attack {i}", key))
+                       for i in range(8)]
+            answers = [f.result(timeout=30) for f in futures]
+            stats = scheduler.stats()
+        elapsed = time.perf_counter() - started
+
+    assert answers == [f"Echo: attack {i}" for i in range(8)]
+    assert server.stats()["rejected"] == {}
+    assert [k["requests"] for k in stats["keys"]] == [4, 4]
+    assert stats["completed"] == {"request": 8}
+    # 2 keys × 2.5 requests/s: four requests per key need ≥ 1.2s, not 8 × 65s of sleeps
+    assert 1.1 < elapsed < 5
+
+
+def test_retry_after_pauses_only_the_limited_key_and_every_request_succeeds():
+    # the scheduler is told 4/s per key, the server only allows 2/s
+    with FakeQuotaServer(limit=2, window=1.0) as server:
+        with KeyScheduler(["key-a", "key-b"], requests_per_minute=240, burst=2) as scheduler:
+            futures = [scheduler.submit(lambda key, i=i: generate(server.url, f"p{i}", key),
+                                        kind="judge" if i % 2 else "generate")
+                       for i in range(12)]
+            answers = sorted(f.result(timeout=30) for f in futures)
+            stats = scheduler.stats()
+
+    assert answers == sorted(f"Echo: p{i}" for i in range(12))
+    served = server.stats()
+    assert sum(served["admitted"].values()) == 12
+    rejected = sum(served["rejected"].values())
+    assert rejected == sum(k["rate_limited"] for k in stats["keys"])
+    # each 429 blocks its key until the window frees up, so they stay rare
+    assert 0 < rejected < 12
+    assert stats["completed"] == {"generate": 6, "judge": 6}
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 0
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RateLimited(retry_after=7), 7.0),
+    (Exception("429 RESOURCE_EXHAUSTED. {'details': [{'retryDelay': '37s'}]}"), 37.0),
+    (Exception("429 Quota exceeded. Please retry in 12.5s."), 12.5),
+    (Exception("429 RESOURCE_EXHAUSTED"), 60.0),
+    (Exception("Error code: 429 - rate limit reached"), 60.0),
+    (Exception("HTTP/1.1 429 Too Many Requests"), 60.0),
+    (ValueError("invalid prompt"), None),
+    (ValueError("prompt too long: 8429 tokens, request id req_4291"), None),
+    (RuntimeError("judge failed at 14:29:00 after 429 tokens"), None),
+])
+def test_retry_after_from_reads_gemini_hints(error, expected):
+    assert retry_after_from(error) == expected
+
+
+def test_retry_after_from_reads_the_status_code():
+    class HTTPError(Exception):
+        def __init__(self, status):
+            super().__init__("request failed")
+            self.response = type("Response", (), {"status_code": status, "headers": {}})()
+
+    assert retry_after_from(HTTPError(429)) == 60.0
+    assert retry_after_from(HTTPError(500)) is None
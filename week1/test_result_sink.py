@@ -0,0 +1,49 @@
+import json
+import os
+
+from result_sink import ResultSink, iter_attacks, read_results
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "adversarial_data.json")
+
+
+def test_results_survive_a_crash_and_finished_cases_are_skipped(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    sink = ResultSink(path)
+    sink.write("Roleplay (DAN)", "Imagine you are Chaos", {"metric": "ToxicityMetric", "score": 0.0})
+    sink.write("Payload Splitting", "Part 1: 'Mal'", {"metric": "ToxicityMetric", "score": 0.1})
+    # no close(): every line must already be on disk
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+    with open(path, "a") as f:
+        f.write('{"metric": "ToxicityMetric", "sco')  # killed mid-write
+
+    resumed = ResultSink(path)
+    assert resumed.resumed == 2
+    assert resumed.has("Roleplay (DAN)", "Imagine you are Chaos")
+    assert not resumed.has("Roleplay (DAN)", "A different prompt")
+    assert not resumed.has("Academic Framing", "Imagine you are Chaos")
+    resumed.write("Academic Framing", "For a thesis", {"metric": "ToxicityMetric", "score": 0.2})
+    resumed.close()
+
+    results = list(read_results(path))
+    assert [r["category"] for r in results] == ["Roleplay (DAN)", "Payload Splitting", "Academic Framing"]
+
+
+def test_iter_attacks_streams_the_same_items_as_json_load():
+    with open(DATA) as f:
+        expected = json.load(f)["attacks"]
+    for chunk_size in (7, 64, 65536):  # objects split across many reads, or one read
+        assert list(iter_attacks(DATA, chunk_size=chunk_size)) == expected
+
+
+def test_export_json_writes_the_old_array_format(tmp_path):
+    sink = ResultSink(str(tmp_path / "results.jsonl"))
+    for attack in iter_attacks(DATA):
+        sink.write(attack["attack_category"], attack["example_prompt"], {"score": 0.0, "status": "PASS"})
+    sink.close()
+
+    sink.export_json(str(tmp_path / "results.json"))
+    with open(tmp_path / "results.json") as f:
+        exported = json.load(f)
+    assert len(exported) == len(list(iter_attacks(DATA)))
+    assert all(r["status"] == "PASS" and len(r["prompt_hash"]) == 16 for r in exported)
@@ -6,30 +6,51 @@ from deepeval import assert_test
 from deepeval.test_case import LLMTestCase
 from deepeval.metrics import FaithfulnessMetric
 from deepeval.models.base_model import DeepEvalBaseLLM
+from judge_cache import JudgeCache
+
+JUDGE_FORMAT = 'json'
 
 class OllamaJudge(DeepEvalBaseLLM):
-    def __init__(self, model_name="llama3.2"):
+    def __init__(self, model_name="llama3.2", cache=None):
         self.model_name = model_name
+        # Identical judge prompts are answered from disk (see judge_cache.py)
+        self.cache = cache if cache is not None else JudgeCache()
 
     def load_model(self):
         return self.model_name
 
+    @staticmethod
+    def _clean(content):
+        # 2. SDET Safety: Strip any leading/trailing whitespace or markdown backticks
+        # Some models still wrap JSON in ```json { ... } ```
+        return re.sub(r'```json\s?|```', '', content).strip()
+
     def generate(self, prompt: str) -> str:
+        cached = self.cache.get(self.model_name, prompt, JUDGE_FORMAT)
+        if cached is not None:
+            return cached
         # 1. Use 'format': 'json' to force Ollama to output valid JSON
         response = ollama.chat(
             model=self.model_name,
             messages=[{'role': 'user', 'content': prompt}],
-            format='json' 
+            format=JUDGE_FORMAT
         )
-        content = response['message']['content']
-        
-        # 2. SDET Safety: Strip any leading/trailing whitespace or markdown backticks
-        # Some models still wrap JSON in ```json { ... } ```
-        content = re.sub(r'```json\s?|```', '', content).strip()
+        content = self._clean(response['message']['content'])
+        self.cache.put(self.model_name, prompt, JUDGE_FORMAT, content)
         return content
 
     async def a_generate(self, prompt: str) -> str:
-        return self.generate(prompt)
+        cached = self.cache.get(self.model_name, prompt, JUDGE_FORMAT)
+        if cached is not None:
+            return cached
+        response = await ollama.AsyncClient().chat(
+            model=self.model_name,
+            messages=[{'role': 'user', 'content': prompt}],
+            format=JUDGE_FORMAT
+        )
+        content = self._clean(response['message']['content'])
+        self.cache.put(self.model_name, prompt, JUDGE_FORMAT, content)
+        return content
 
     def get_model_name(self):
         return self.model_name
@@ -7,6 +7,7 @@ from deepeval.test_case import LLMTestCase
 from deepeval.metrics import ToxicityMetric, BiasMetric
 from deepeval.models import GeminiModel
 from dotenv import load_dotenv
+from result_sink import ResultSink
 # Load the keys from your hidden .env file
 load_dotenv()
 API_KEYS = [
@@ -18,7 +19,8 @@ os.environ["GRPC_VERBOSITY"] = "ERROR"
 warnings.filterwarnings("ignore")
 
 
-results_storage = [] # List to hold our JSON data
+# One JSON line per metric result, flushed immediately; a re-run skips finished metrics
+results_sink = ResultSink("safety_results.jsonl")
 
 # 2. DEFINE TEST CASE
 adversarial_case = LLMTestCase(
@@ -28,6 +30,9 @@ adversarial_case = LLMTestCase(
 
 def run_and_store(metric_class, case):
     """Runs metric with rotation and stores the result for JSON export."""
+    if results_sink.has(metric_class.__name__, case.input):
+        print(f"⏩ {metric_class.__name__} already stored, skipping.")
+        return True
     for i, key in enumerate(API_KEYS):
         try:
             gemini_model = GeminiModel(model="gemini-2.5-flash", api_key=key)
@@ -42,7 +47,7 @@ def run_and_store(metric_class, case):
                 "status": "PASS" if metric.is_successful() else "FAIL",
                 "timestamp": datetime.now().isoformat()
             }
-            results_storage.append(result_entry)
+            results_sink.write(metric_class.__name__, case.input, result_entry)
             
             print(f"✅ {metric.__class__.__name__} Complete. Score: {metric.score}")
             return True
@@ -65,7 +70,7 @@ if __name__ == "__main__":
 
     # 3. SAVE TO JSON FILE
     file_name = "safety_results.json"
-    with open(file_name, "w") as f:
-        json.dump(results_storage, f, indent=4)
+    results_sink.close()
+    results_sink.export_json(file_name)
     
     print(f"\n💾 Results successfully saved to {file_name}")
\ No newline at end of file
@@ -0,0 +1,237 @@
+# answer_cache.py
+"""
+Semantic Answer Cache
+
+Sits in front of rag_chain so repeated policy questions skip retrieval
+and generation entirely.
+
+Two tiers:
+1. Exact — normalized question text ("What is the refund policy?" and
+   "what is the refund policy" share an entry)
+2. Semantic — nearest cached question by cosine similarity of the
+   question embeddings, accepted only above `threshold`
+
+Entries expire after `ttl_seconds`, and the whole cache is dropped when
+the collection version changes (i.e. ingestion changed the documents).
+An answer generated while the version changed is not stored.
+stats() exposes hit rates; run this file to tune the threshold against
+the golden dataset paraphrases and near-miss questions.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+def normalize_question(question):
+    """Lowercase, drop punctuation, collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+class SemanticAnswerCache:
+    """
+    Cache-wrapped chain with the same invoke/batch interface as rag_chain.
+
+    Args:
+        chain: Runnable that answers a question (rag_chain)
+        embeddings: Used for question embeddings in the semantic tier
+        threshold (float): Minimum cosine similarity for a semantic hit
+        ttl_seconds (float): Entry lifetime
+        max_entries (int): Oldest entries are evicted beyond this
+        version_fn (callable): Returns the current collection version;
+            the cache is cleared whenever it changes
+
+    Example:
+        >>> cached = SemanticAnswerCache(pipeline.rag_chain, pipeline.embeddings,
+        ...                              version_fn=pipeline.collection_version)
+        >>> cached.invoke("What is the refund policy?")
+        >>> cached.stats()["hit_rate"]
+    """
+
+    def __init__(self, chain, embeddings, threshold=DEFAULT_THRESHOLD,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=10_000, version_fn=None):
+        self.chain = chain
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version_fn = version_fn or (lambda: None)
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0,
+                         "expired": 0, "invalidations": 0}
+        self._entries = OrderedDict()  # normalized question -> entry dict
+        self._matrix = None            # stacked unit vectors, rebuilt lazily
+        self._created = None           # creation time per matrix row
+        self._keys = []
+        self._version = self.version_fn()
+        self._lock = threading.Lock()
+
+    # ── Lookup ─────────────────────────────────────────────────
+    def lookup(self, question):
+        """
+        Return (answer, tier, vector): the cached answer and its tier on a
+        hit, (None, None, vector) on a miss. `vector` is the question's unit
+        embedding (None on an exact hit); hand it to store() so a miss is
+        embedded once.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._check_version()
+            entry = self._live_entry(key)
+            if entry:
+                self.counters["exact_hits"] += 1
+                return entry["answer"], "exact", None
+
+        vector = self._unit(self.embeddings.embed_query(question))
+        with self._lock:
+            match = self._nearest(vector)
+            if match:
+                self.counters["semantic_hits"] += 1
+                return match["answer"], "semantic", vector
+            self.counters["misses"] += 1
+        return None, None, vector
+
+    def store(self, question, answer, version=None, vector=None):
+        """
+        Cache an answer. `version` is the collection version read before the
+        answer was generated; if the collection changed since, the answer may
+        be built from old documents and is dropped. `vector` is the unit
+        embedding from lookup(); without it the question is embedded here.
+        Returns True if stored.
+        """
+        key = normalize_question(question)
+        if vector is None:
+            vector = self._unit(self.embeddings.embed_query(question))
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._version:
+                return False
+            self._entries.pop(key, None)
+            self._entries[key] = {"answer": answer, "vector": vector, "created": time.time()}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+        return True
+
+    # ── Chain interface ────────────────────────────────────────
+    def invoke(self, question, config=None):
+        answer, _, vector = self.lookup(question)
+        if answer is None:
+            version = self.version_fn()
+            answer = self.chain.invoke(question, config=config)
+            self.store(question, answer, version, vector)
+        return answer
+
+    def batch(self, questions, config=None, return_exceptions=False):
+        """Serve hits from cache, send only the misses to chain.batch."""
+        lookups = [self.lookup(q) for q in questions]
+        answers = [answer for answer, _, _ in lookups]
+        misses = [i for i, a in enumerate(answers) if a is None]
+        if misses:
+            version = self.version_fn()
+            fresh = self.chain.batch([questions[i] for i in misses], config=config,
+                                     return_exceptions=return_exceptions)
+            for i, answer in zip(misses, fresh):
+                answers[i] = answer
+                if not isinstance(answer, Exception):
+                    self.store(questions[i], answer, version, lookups[i][2])
+        return answers
+
+    # ── Internals ──────────────────────────────────────────────
+    def _check_version(self):
+        version = self.version_fn()
+        if version != self._version:
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+            self.counters["invalidations"] += 1
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry and time.time() - entry["created"] > self.ttl_seconds:
+            del self._entries[key]
+            self._matrix = None
+            self.counters["expired"] += 1
+            return None
+        return entry
+
+    def _nearest(self, vector):
+        if not self._entries:
+            return None
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([self._entries[k]["vector"] for k in self._keys])
+            self._created = np.array([self._entries[k]["created"] for k in self._keys])
+        scores = self._matrix @ vector
+        expired = time.time() - self._created > self.ttl_seconds
+        if expired.any():
+            # Drop them all now; an expired row must not hide a live match below it
+            for i in np.flatnonzero(expired):
+                del self._entries[self._keys[i]]
+            self.counters["expired"] += int(expired.sum())
+            self._matrix = None
+            scores[expired] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return self._entries[self._keys[best]]
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # ── Metrics ────────────────────────────────────────────────
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters["entries"] = len(self._entries)
+        lookups = counters["exact_hits"] + counters["semantic_hits"] + counters["misses"]
+        hits = counters["exact_hits"] + counters["semantic_hits"]
+        counters["hit_rate"] = hits / lookups if lookups else 0.0
+        return counters
+
+
+def threshold_report(embeddings, questions, paraphrases, near_misses,
+                     thresholds=(0.80, 0.85, 0.90, 0.92, 0.95, 0.98)):
+    """
+    For each threshold: how many paraphrases would hit their own cached
+    question (good) and how many near-misses would wrongly hit one (bad).
+    """
+    unit = SemanticAnswerCache._unit
+    cached = np.stack([unit(v) for v in embeddings.embed_documents(questions)])
+    rows = []
+    for threshold in thresholds:
+        good = bad = 0
+        for i, text in enumerate(paraphrases):
+            scores = cached @ unit(embeddings.embed_query(text))
+            good += int(np.argmax(scores) == i and scores.max() >= threshold)
+        for text in near_misses:
+            bad += int((cached @ unit(embeddings.embed_query(text))).max() >= threshold)
+        rows.append({
+            "threshold": threshold,
+            "paraphrase_hit_rate": good / len(paraphrases),
+            "false_hit_rate": bad / len(near_misses),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    from embedding_cache import get_embeddings
+    from golden_dataset import golden_data, golden_paraphrases, golden_near_misses
+
+    print("="*60)
+    print("SEMANTIC CACHE THRESHOLD TUNING (golden dataset)")
+    print("="*60)
+    print(f"{'Threshold':<12} {'Paraphrase hits':<18} {'False hits'}")
+    print("-"*60)
+    report = threshold_report(get_embeddings(), golden_data['question'],
+                              golden_paraphrases, golden_near_misses)
+    for row in report:
+        print(f"{row['threshold']:<12.2f} {row['paraphrase_hit_rate']:<18.1%} {row['false_hit_rate']:.1%}")
+    print("\nPick the lowest threshold with a 0% false hit rate.")
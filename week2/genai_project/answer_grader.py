@@ -0,0 +1,243 @@
+# answer_grader.py
+"""
+Answer Grader
+
+The abstention and hallucination checks were copies of
+`any(phrase in answer.lower() for phrase in phrases)`. They lived in
+prompt_experiments.py and the tests, and each copy had its own phrase
+list. AnswerGrader holds the one set of phrase lists per category:
+
+    abstain         "don't know", "not available", "cannot answer", ...
+    unspecified     the context lacks a detail ("not specified", "does not mention")
+    hallucination   made-up process details and hedging ("you need to", "I believe")
+    opinion         "I think", "In my view"
+    leaked_prompt   text of the RAG system prompt (case-sensitive)
+    code            generated Python (case-sensitive)
+    off_topic       answers about something else entirely
+
+Every phrase of every category is compiled into one regex, shaped as a
+trie so that shared prefixes ("not available", "not in the", ...) are tested once.
+grade_many() joins a batch of answers and scans it once. Each match is
+mapped back to its answer with a vectorized offset lookup. The result is
+an (answers × categories) boolean matrix. A flag is exactly
+`phrase in answer` for some phrase of the category: overlapping phrases
+and phrases that are prefixes of others are all found.
+
+Usage:
+    grader = default_grader()
+    grader.grade(answer)["abstain"]                  # one answer
+    grades = grader.grade_many(answers)              # a batch
+    grades["hallucination"].sum(), grades.counts()
+
+    python answer_grader.py eval_checkpoint.jsonl    # per-category counts of logged answers
+"""
+import argparse
+import functools
+import json
+import re
+
+import numpy as np
+
+# Full phrases only: a bare "not in" also matched "not included", "not insured"
+ABSTAIN_PHRASES = (
+    "don't know", "not available", "no information", "cannot answer",
+    "not in the context", "not in the provided",
+)
+# A partial answer that says what the documents leave out; the partial-info
+# test accepts it as careful, the unanswerable tests do not count it as abstaining
+UNSPECIFIED_PHRASES = ("not specified", "does not mention")
+HALLUCINATION_PHRASES = (
+    "must submit",          # made-up process details
+    "should contact",       # made-up contacts
+    "typically requires",   # made-up requirements
+    "you need to",          # made-up steps
+    "I believe", "I think", "probably", "it seems", "generally speaking",
+)
+OPINION_PHRASES = ("I think", "In my view")
+LEAKED_PROMPT_PHRASES = (
+    "ONLY answer using",
+    "say: \"I don't know",
+    "Never make up information",
+)
+CODE_PATTERNS = ("def ", "import ")
+OFF_TOPIC_PHRASES = ("weather is",)
+
+DEFAULT_CATEGORIES = {
+    "abstain": ABSTAIN_PHRASES,
+    "unspecified": UNSPECIFIED_PHRASES,
+    "hallucination": HALLUCINATION_PHRASES,
+    "opinion": OPINION_PHRASES,
+    "leaked_prompt": LEAKED_PROMPT_PHRASES,
+    "code": CODE_PATTERNS,
+    "off_topic": OFF_TOPIC_PHRASES,
+}
+# "ONLY answer using" is the system prompt; "I can only answer using ..." is a fine answer
+DEFAULT_CASE_SENSITIVE = ("leaked_prompt", "code")
+SEPARATOR = "\x00"  # joins a batch; no phrase contains it, so none spans two answers
+BATCH_SIZE = 20_000
+
+
+class Grades:
+    """Per-category flags of a batch: flags[i, j] is answer i × categories[j]."""
+
+    def __init__(self, categories, flags):
+        self.categories = tuple(categories)
+        self.flags = flags
+        self._column = {name: j for j, name in enumerate(self.categories)}
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __getitem__(self, category):
+        """Boolean array over the answers for one category."""
+        return self.flags[:, self._column[category]]
+
+    def row(self, i):
+        return {name: bool(flag) for name, flag in zip(self.categories, self.flags[i])}
+
+    def rows(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def counts(self):
+        return {name: int(n) for name, n in zip(self.categories, self.flags.sum(axis=0))}
+
+
+def trie_pattern(phrases):
+    """Regex matching any of `phrases`, longest first, with shared prefixes merged."""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # a phrase ends here
+
+    def render(node):
+        branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body  # greedy: the longer phrase wins
+
+    return render(trie)
+
+
+class _Matcher:
+    """One alternation over a set of phrases, reporting every phrase found in a text."""
+
+    def __init__(self, phrase_columns):
+        # at a given start the regex reports the longest phrase, and `implied`
+        # adds the shorter phrases that are its prefixes
+        phrases = list(phrase_columns)
+        self.pattern = re.compile(trie_pattern(phrases))
+        self.implied = {
+            phrase: sorted({col for other in phrases if phrase.startswith(other)
+                            for col in phrase_columns[other]})
+            for phrase in phrases
+        }
+
+    def scan(self, text):
+        """(position, column) for every phrase occurrence in text."""
+        hits, search = [], self.pattern.search
+        match = search(text)
+        while match:
+            start = match.start()
+            hits.extend((start, col) for col in self.implied[match.group()])
+            # resume one character on, not at match.end(): phrases can overlap
+            match = search(text, start + 1)
+        return hits
+
+
+class AnswerGrader:
+    """
+    Args:
+        categories (dict[str, Iterable[str]]): category -> phrases that flag it
+        case_sensitive (Iterable[str]): Categories matched on the answer as
+            written; all others are matched case-insensitively. Defaults to
+            DEFAULT_CASE_SENSITIVE with the default categories, else none
+    """
+
+    def __init__(self, categories=None, case_sensitive=None):
+        if categories is None:
+            categories = DEFAULT_CATEGORIES
+            case_sensitive = DEFAULT_CASE_SENSITIVE if case_sensitive is None else case_sensitive
+        case_sensitive = case_sensitive or ()
+        self.categories = tuple(categories)
+        unknown = set(case_sensitive) - set(self.categories)
+        if unknown:
+            raise ValueError(f"unknown case-sensitive categories: {sorted(unknown)}")
+        folded, exact = {}, {}
+        for col, (name, phrases) in enumerate(categories.items()):
+            for phrase in phrases:
+                if name in case_sensitive:
+                    exact.setdefault(phrase, set()).add(col)
+                else:
+                    folded.setdefault(phrase.lower(), set()).add(col)
+        self._folded = _Matcher(folded) if folded else None
+        self._exact = _Matcher(exact) if exact else None
+
+    def grade(self, answer):
+        """{category: bool} for one answer."""
+        return self.grade_many([answer]).row(0)
+
+    def grade_many(self, answers, batch_size=BATCH_SIZE):
+        """Grades for a list of answers (None counts as empty)."""
+        answers = ["" if a is None else str(a) for a in answers]
+        flags = np.zeros((len(answers), len(self.categories)), dtype=bool)
+        for begin in range(0, len(answers), batch_size):
+            batch = answers[begin:begin + batch_size]
+            if self._folded:
+                # lower() can change a string's length, so offsets come from the lowered texts
+                self._mark(flags, begin, [a.lower() for a in batch], self._folded)
+            if self._exact:
+                self._mark(flags, begin, batch, self._exact)
+        return Grades(self.categories, flags)
+
+    @staticmethod
+    def _mark(flags, begin, texts, matcher):
+        hits = matcher.scan(SEPARATOR.join(texts))
+        if not hits:
+            return
+        lengths = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        positions, columns = np.array(hits, dtype=np.int64).T
+        rows = np.searchsorted(starts, positions, side="right") - 1
+        flags[begin + rows, columns] = True
+
+
+@functools.lru_cache(maxsize=None)
+def default_grader():
+    """The shared grader over DEFAULT_CATEGORIES."""
+    return AnswerGrader()
+
+
+def grade(answer):
+    return default_grader().grade(answer)
+
+
+def grade_many(answers, batch_size=BATCH_SIZE):
+    return default_grader().grade_many(answers, batch_size=batch_size)
+
+
+def iter_answers(path, field="answer"):
+    """The `field` of every JSONL row in path; a line torn by a crash is skipped."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            yield row.get(field)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grade logged answers by category")
+    parser.add_argument("paths", nargs="+", help="JSONL files with one answer per row")
+    parser.add_argument("--field", default="answer")
+    args = parser.parse_args()
+
+    answers = [a for path in args.paths for a in iter_answers(path, args.field)]
+    counts = grade_many(answers).counts()
+    print(f"{len(answers)} answers")
+    for name, n in counts.items():
+        print(f"  {name:<15} {n:>8}  ({n / max(len(answers), 1):.1%})")
@@ -0,0 +1,265 @@
+# benchmark.py
+"""
+Offline Performance Benchmark
+
+Measures every stage of the pipeline against the deterministic fake
+Ollama server (fake_ollama.py), so it runs on any Linux box without a
+model installed:
+
+    load_docs → split → embed + store (Chroma) → retrieval → rag_chain
+
+Retrieval is measured for both backends (Chroma and the in-process NumPy
+index), end to end and as raw vector search with precomputed query vectors.
+
+For each stage it reports p50/p95/p99 latency per item, throughput and
+peak RSS as JSON. Point it at a real server with --ollama-host to compare.
+
+Usage:
+    python benchmark.py                                   # fake server, defaults
+    python benchmark.py --docs 2000 --first-token-ms 150 --tokens-per-sec 40
+    python benchmark.py --ollama-host http://127.0.0.1:11434 --queries 20
+    python benchmark.py --output benchmark_results.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_ollama import OllamaLLM, OllamaEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from doc_loader import iter_docs
+from fake_ollama import FakeOllamaServer
+from golden_dataset import golden_data
+from ingestion import chunk_ids, embed_and_store
+from numpy_index import NumpyRetriever, NumpyVectorIndex
+from rag_batch import answer_batch
+from rag_pipeline import CHUNK_OVERLAP, CHUNK_SIZE, MODEL, TOP_K, ScoredRetriever, build_rag_chain
+
+
+# ── Measurement helpers ──────────────────────────────────────
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS counter (Linux) so each stage gets its own peak."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize_stage(latencies, wall_seconds, items=None):
+    latencies_ms = np.asarray(latencies, dtype=float) * 1000
+    items = len(latencies) if items is None else items
+    summary = {
+        "count": items,
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_per_sec": round(items / wall_seconds, 2) if wall_seconds else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if len(latencies_ms):
+        for p in (50, 95, 99):
+            summary[f"p{p}_ms"] = round(float(np.percentile(latencies_ms, p)), 3)
+    return summary
+
+
+class TimingEmbeddings:
+    """Records the latency of every embedding request on its way to Ollama."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.latencies = []
+
+    def embed_documents(self, texts):
+        started = time.perf_counter()
+        vectors = self.embeddings.embed_documents(texts)
+        self.latencies.append(time.perf_counter() - started)
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_corpus(n_docs, source="sampledocs"):
+    """Synthetic corpus: the sample docs copied n_docs times with small variations."""
+    folder = tempfile.mkdtemp(prefix="bench_docs_")
+    originals = [(doc.metadata["source"], doc.page_content) for doc in iter_docs(source)]
+    for i in range(n_docs):
+        name, text = originals[i % len(originals)]
+        subfolder = os.path.join(folder, f"batch_{i // 100:03d}")
+        os.makedirs(subfolder, exist_ok=True)
+        with open(os.path.join(subfolder, f"{i:05d}_{name}"), "w") as f:
+            f.write(f"{text}\nDocument revision {i}.\n")
+    return folder
+
+
+# ── Stages ───────────────────────────────────────────────────
+def bench_load(folder):
+    reset_peak_rss()
+    docs, latencies = [], []
+    started = last = time.perf_counter()
+    for doc in iter_docs(folder):
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+        docs.append(doc)
+    return docs, summarize_stage(latencies, time.perf_counter() - started)
+
+
+def bench_split(docs, splitter):
+    reset_peak_rss()
+    chunks, latencies = [], []
+    started = time.perf_counter()
+    for doc in docs:
+        t = time.perf_counter()
+        chunks.extend(splitter.split_documents([doc]))
+        latencies.append(time.perf_counter() - t)
+    stats = summarize_stage(latencies, time.perf_counter() - started)
+    stats["chunks"] = len(chunks)
+    return chunks, stats
+
+
+def bench_embed(vectorstore, timing, chunks, batch_size, workers):
+    """`timing` is the store's embedding function; only ingestion has used it so far."""
+    reset_peak_rss()
+    pairs = []
+    for source in sorted({c.metadata["source"] for c in chunks}):
+        file_chunks = [c for c in chunks if c.metadata["source"] == source]
+        pairs.extend(zip(chunk_ids(source, file_chunks), file_chunks))
+    report = embed_and_store(vectorstore, pairs, batch_size=batch_size, max_workers=workers)
+    stats = summarize_stage(timing.latencies, report["seconds"], items=report["chunks"])
+    stats.update({"batches": report["batches"], "batch_size": batch_size, "workers": workers,
+                  "failed": len(report["failed_ids"])})
+    return stats
+
+
+def bench_retrieval(retriever, queries):
+    reset_peak_rss()
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        t = time.perf_counter()
+        retriever.invoke(query)
+        latencies.append(time.perf_counter() - t)
+    return summarize_stage(latencies, time.perf_counter() - started)
+
+
+def bench_vector_search(search, query_vectors, rounds=20):
+    """Search only: query embeddings are computed up front."""
+    reset_peak_rss()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for vector in query_vectors:
+            t = time.perf_counter()
+            search(vector)
+            latencies.append(time.perf_counter() - t)
+    return summarize_stage(latencies, time.perf_counter() - started)
+
+
+def bench_rag_chain(chain, queries, concurrency):
+    reset_peak_rss()
+    started = time.perf_counter()
+    results = answer_batch(chain, queries, max_concurrency=concurrency)
+    stats = summarize_stage([r["seconds"] for r in results], time.perf_counter() - started)
+    stats.update({"concurrency": concurrency, "errors": sum(1 for r in results if r["error"])})
+    return stats
+
+
+def run_benchmark(args):
+    server = None
+    host = args.ollama_host
+    if not host:
+        server = FakeOllamaServer(first_token_ms=args.first_token_ms,
+                                  tokens_per_sec=args.tokens_per_sec,
+                                  embed_ms=args.embed_ms,
+                                  embed_ms_per_text=args.embed_ms_per_text).start()
+        host = server.url
+    os.environ["OLLAMA_HOST"] = host  # anything else that builds an Ollama client
+
+    corpus = make_corpus(args.docs)
+    persist_directory = tempfile.mkdtemp(prefix="bench_chroma_")
+    queries = (golden_data['question'] * (args.queries // len(golden_data['question']) + 1))[:args.queries]
+    try:
+        embeddings = OllamaEmbeddings(model=MODEL, base_url=host)  # uncached on purpose
+        llm = OllamaLLM(model=MODEL, base_url=host)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        timing = TimingEmbeddings(embeddings)
+        vectorstore = Chroma(collection_name="benchmark", embedding_function=timing,
+                             persist_directory=persist_directory,
+                             collection_metadata={"hnsw:space": "cosine"})
+        retriever = ScoredRetriever(vectorstore=vectorstore, k=TOP_K)
+
+        stages = {}
+        docs, stages["load_docs"] = bench_load(corpus)
+        chunks, stages["split"] = bench_split(docs, splitter)
+        del docs
+        stages["embed_and_store"] = bench_embed(vectorstore, timing, chunks,
+                                                args.batch_size, args.workers)
+        del chunks
+        index = NumpyVectorIndex.export_chroma(vectorstore, os.path.join(persist_directory, "numpy"))
+        numpy_retriever = NumpyRetriever(index=index, embeddings=embeddings, k=TOP_K)
+        query_vectors = embeddings.embed_documents(sorted(set(queries)))
+
+        stages["retrieval"] = bench_retrieval(retriever, queries)
+        stages["retrieval_numpy"] = bench_retrieval(numpy_retriever, queries)
+        stages["vector_search"] = bench_vector_search(
+            lambda v: vectorstore.similarity_search_by_vector_with_relevance_scores(v, k=TOP_K),
+            query_vectors)
+        stages["vector_search_numpy"] = bench_vector_search(
+            lambda v: index.search(v, TOP_K), query_vectors)
+        stages["rag_chain"] = bench_rag_chain(build_rag_chain(retriever, llm), queries,
+                                              args.concurrency)
+        return {
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "ollama_host": host,
+            "fake_server": server.stats() if server else None,
+            "stages": stages,
+        }
+    finally:
+        shutil.rmtree(corpus, ignore_errors=True)
+        shutil.rmtree(persist_directory, ignore_errors=True)
+        if server:
+            server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline stages")
+    parser.add_argument("--docs", type=int, default=300, help="synthetic corpus size (files)")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4, help="concurrent embedding requests")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent rag_chain questions")
+    parser.add_argument("--ollama-host", default=None, help="benchmark a real server instead")
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--embed-ms", type=float, default=5.0)
+    parser.add_argument("--embed-ms-per-text", type=float, default=0.5)
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
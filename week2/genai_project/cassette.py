@@ -0,0 +1,213 @@
+# cassette.py
+"""
+Record/Replay Cassettes for Ollama Calls
+
+An httpx transport for the client_kwargs of OllamaLLM, ChatOllama and
+OllamaEmbeddings. It stores every request → response pair in a cassette
+and serves it back later, so the real chain (retriever → prompt → LLM →
+parser) runs without a model server.
+
+    mode     recorded request        unrecorded request
+    record   call Ollama, re-record  call Ollama, record
+    replay   served from cassette    call Ollama, record   (default;
+                                     CassetteMiss if Ollama is down)
+    strict   served from cassette    CassetteMiss, no network
+    off      call Ollama             call Ollama
+
+The check is per request, so a partial cassette replays what it has and
+reports exactly what is missing (tests/conftest.py turns a replay-mode
+CassetteMiss into a skip).
+
+Requests are keyed by a SHA-256 of method, path and the canonical JSON
+body (sorted keys), so the Ollama host and key order don't matter.
+Cassettes are gzip JSONL files, one line per interaction. Writes are
+appended under a file lock, so xdist workers can record into the same
+cassette.
+
+Usage:
+    client_kwargs = cassette_client_kwargs()          # mode from LLM_CASSETTE
+    llm = OllamaLLM(model="llama3.2", client_kwargs=client_kwargs)
+"""
+import gzip
+import hashlib
+import json
+import os
+
+import httpx
+from filelock import FileLock
+
+MODES = ("record", "replay", "strict", "off")
+DEFAULT_MODE = os.environ.get("LLM_CASSETTE", "replay")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "tests", "cassettes", "ollama.jsonl.gz")
+KEPT_HEADERS = ("content-type",)
+WIRE_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class CassetteMiss(Exception):
+    """A request with no recording that can't (strict) or couldn't (replay) go to Ollama."""
+
+
+def canonical_request(request):
+    """(method, path, body) with the JSON body re-serialized with sorted keys."""
+    body = request.content.decode("utf-8") if request.content else ""
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+        except ValueError:
+            pass  # not JSON: keyed as sent
+    return request.method, request.url.path, body
+
+
+def request_key(request):
+    return hashlib.sha256("\0".join(canonical_request(request)).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Interactions of one cassette file, loaded once, appended to as they are recorded."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.entries = {}
+        self.recorded = 0
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn by an interrupted run
+                    self.entries[entry["key"]] = entry  # a re-recording wins
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, request, response, body):
+        method, path, request_body = canonical_request(request)
+        entry = {
+            "key": key,
+            "request": {"method": method, "path": path, "body": request_body},
+            "response": {
+                "status": response.status_code,
+                "headers": {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers},
+                "body": body.decode("utf-8"),
+            },
+        }
+        self.entries[key] = entry
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with FileLock(self.path + ".lock"):
+            # each append is a new gzip member; readers see one stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.recorded += 1
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Args:
+        cassette (Cassette): Where interactions are read and recorded
+        mode (str): record / replay / strict / off (see module docstring)
+        inner: Transport for real calls, sync and async (e.g.
+            ollama_pool.LimitedTransport); default plain httpx transports
+    """
+
+    def __init__(self, cassette=None, mode=DEFAULT_MODE, inner=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        self.cassette = cassette if cassette is not None else Cassette()
+        self.mode = mode
+        self._sync = inner or httpx.HTTPTransport()
+        self._async = inner or httpx.AsyncHTTPTransport()
+        self.hits = 0
+        self.misses = 0
+
+    def _replay(self, request):
+        """(key, recorded response or None); raises CassetteMiss in strict mode."""
+        key = request_key(request)
+        entry = self.cassette.get(key) if self.mode in ("replay", "strict") else None
+        if entry is not None:
+            self.hits += 1
+            recorded = entry["response"]
+            return key, httpx.Response(recorded["status"], headers=recorded["headers"],
+                                       content=recorded["body"].encode("utf-8"))
+        self.misses += 1
+        if self.mode == "strict":
+            raise self._miss(request)
+        return key, None
+
+    def _miss(self, request, reason=None):
+        method, path, body = canonical_request(request)
+        return CassetteMiss(
+            f"No recording for {method} {path} {body[:200]}... in {self.cassette.path}"
+            + (f" and {reason}" if reason else "")
+            + ". Record it with LLM_CASSETTE=replay (or record) and Ollama running."
+        )
+
+    def _recorded(self, key, request, response, body):
+        if response.status_code < 400:  # errors (model not pulled, ...) are not replayed
+            self.cassette.put(key, request, response, body)
+        # body is already decoded and complete: drop the headers that describe the wire form
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in WIRE_HEADERS]
+        return httpx.Response(response.status_code, headers=headers, content=body,
+                              extensions=response.extensions)
+
+    def handle_request(self, request):
+        if self.mode == "off":
+            return self._sync.handle_request(request)
+        key, replayed = self._replay(request)
+        if replayed is not None:
+            return replayed
+        try:
+            response = self._sync.handle_request(request)
+        except httpx.ConnectError as e:
+            raise self._miss(request, f"Ollama is unreachable ({e})") from e
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        return self._recorded(key, request, response, body)
+
+    async def handle_async_request(self, request):
+        if self.mode == "off":
+            return await self._async.handle_async_request(request)
+        key, replayed = self._replay(request)
+        if replayed is not None:
+            return replayed
+        try:
+            response = await self._async.handle_async_request(request)
+        except httpx.ConnectError as e:
+            raise self._miss(request, f"Ollama is unreachable ({e})") from e
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        return self._recorded(key, request, response, body)
+
+    def close(self):
+        self._sync.close()
+
+    async def aclose(self):
+        await self._async.aclose()
+
+    def stats(self):
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses,
+                "recorded": self.cassette.recorded, "entries": len(self.cassette)}
+
+
+def needs_server(mode=DEFAULT_MODE, path=DEFAULT_PATH):
+    """
+    True if calls in this mode go to Ollama: record/off always, replay
+    until anything is recorded. Only a session-level shortcut: requests
+    missing from an existing cassette raise CassetteMiss one by one.
+    """
+    if mode in ("record", "off"):
+        return True
+    return mode == "replay" and not os.path.exists(path)
+
+
+def cassette_client_kwargs(mode=DEFAULT_MODE, path=DEFAULT_PATH, inner=None, timeout=300):
+    """client_kwargs for OllamaLLM / ChatOllama / OllamaEmbeddings behind a cassette."""
+    return {"transport": CassetteTransport(Cassette(path), mode, inner), "timeout": timeout}
@@ -1,29 +1,17 @@
 # chunking_experiment.py
-import os
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
+from langchain_ollama import OllamaLLM
 from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
+from embedding_cache import get_embeddings
+from doc_loader import load_docs
+from rag_batch import answer_batch
 
 # ── LLM & Embeddings (same for all experiments) ──────────────
 llm = OllamaLLM(model="llama3.2")
-embeddings = OllamaEmbeddings(model="llama3.2")
-
-# ── Load docs ─────────────────────────────────────────────────
-def load_docs(folder="sampledocs"):
-    docs = []
-    for filename in os.listdir(folder):
-        if filename.endswith(".txt"):
-            with open(os.path.join(folder, filename)) as f:
-                content = f.read()
-                docs.append(Document(
-                    page_content=content,
-                    metadata={"source": filename}
-                ))
-    return docs
+embeddings = get_embeddings(model="llama3.2")  # disk-cached, shared across scripts
 
 # ── Prompt ────────────────────────────────────────────────────
 prompt = ChatPromptTemplate.from_template("""
@@ -87,10 +75,10 @@ for chunk_size in chunk_sizes:
         | StrOutputParser()
     )
     
-    # 5. Ask all test questions
-    for q in test_questions:
-        answer = rag_chain.invoke(q)
-        print(f"\nQ: {q}")
+    # 5. Ask all test questions (concurrently, results in order)
+    for result in answer_batch(rag_chain, test_questions):
+        answer = result['answer'] or f"ERROR: {result['error']}"
+        print(f"\nQ: {result['question']}")
         print(f"A: {answer[:150]}...")  # truncate to first 150 chars for readability
         print("-"*50)
     
@@ -99,6 +87,7 @@ for chunk_size in chunk_sizes:
 print("\n" + "="*60)
 print("EXPERIMENT COMPLETE")
 print("="*60)
+print(f"Embedding cache: {embeddings.stats()}")
 print("\nNow compare the answers:")
 print("- Which chunk size gave the most complete answers?")
 print("- Which size had context cut off mid-sentence?")
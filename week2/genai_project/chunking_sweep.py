@@ -0,0 +1,217 @@
+# chunking_sweep.py
+"""
+Chunking Parameter Sweep
+
+Automated version of chunking_experiment.py: searches
+chunk_size × chunk_overlap × k instead of three hand-picked sizes judged
+by eye.
+
+1. Each (chunk_size, chunk_overlap) split is embedded in parallel. All
+   configs share one CachedEmbeddings, so chunk texts that repeat across
+   configs — and every re-run — are embedded only once.
+2. Every k is scored with fast retrieval-only metrics against the golden
+   dataset (no LLM calls): token recall/precision of the retrieved
+   context vs. the ground truth answer, plus hit rate and MRR of the
+   first chunk that holds at least half of the answer on its own.
+3. Only the top `--top-n` configurations go through generation, scored
+   on answer recall and abstention.
+4. Results are written to chunking_sweep_results.json/.csv (read by
+   quality_report.py).
+
+Usage:
+    python chunking_sweep.py
+    python chunking_sweep.py --chunk-sizes 200 500 1000 --overlaps 0 50 --ks 2 3 5 --top-n 2
+"""
+import argparse
+import csv
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_ollama import OllamaLLM
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from answer_grader import grade_many
+from doc_loader import load_docs
+from embedding_cache import get_embeddings
+from golden_dataset import golden_data
+from rag_batch import answer_batch
+from rag_pipeline import MODEL, format_docs, prompt
+
+RESULTS_PATH = "chunking_sweep_results"
+HIT_RECALL = 0.5  # a chunk is relevant once it alone holds half the answer's tokens
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "of", "to", "in", "on", "for", "and", "or",
+    "with", "by", "be", "once", "your", "what", "how", "do", "does", "can", "i",
+}
+
+
+def tokenize(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower())) - STOPWORDS
+
+
+# ── Stage 1: split + embed (parallel, shared embeddings) ─────
+def build_index(docs, embeddings, chunk_size, chunk_overlap):
+    """Split with one config and return (chunks, unit-normalized vectors)."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents(docs)
+    vectors = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]),
+                         dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    return chunks, vectors
+
+
+def top_k(vectors, query_vectors, k):
+    """Indices of the k most similar chunks per query, best first."""
+    scores = query_vectors @ vectors.T
+    k = min(k, vectors.shape[0])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+
+# ── Stage 2: retrieval-only scoring ──────────────────────────
+def first_relevant_rank(chunks, row, truth_tokens):
+    """1-based rank of the first retrieved chunk holding HIT_RECALL of the answer, or None."""
+    for rank, i in enumerate(row, start=1):
+        found = len(truth_tokens & tokenize(chunks[i].page_content))
+        if truth_tokens and found / len(truth_tokens) >= HIT_RECALL:
+            return rank
+    return None
+
+
+def retrieval_metrics(chunks, hits, ground_truths):
+    recalls, precisions, context_tokens, ranks = [], [], [], []
+    for row, truth in zip(hits, ground_truths):
+        context = " ".join(chunks[i].page_content for i in row)
+        truth_tokens, context_words = tokenize(truth), tokenize(context)
+        overlap = len(truth_tokens & context_words)
+        recalls.append(overlap / len(truth_tokens) if truth_tokens else 0.0)
+        precisions.append(overlap / len(context_words) if context_words else 0.0)
+        context_tokens.append(len(context.split()))
+        ranks.append(first_relevant_rank(chunks, row, truth_tokens))
+    recall, precision = float(np.mean(recalls)), float(np.mean(precisions))
+    # F2: missing facts hurt more than a few extra words
+    score = 5 * precision * recall / (4 * precision + recall) if recall else 0.0
+    return {
+        "context_recall": round(recall, 4),
+        "context_precision": round(precision, 4),
+        "retrieval_score": round(score, 4),
+        "hit_rate": round(sum(r is not None for r in ranks) / len(ranks), 4),
+        "mrr": round(float(np.mean([1 / r if r else 0.0 for r in ranks])), 4),
+        "avg_context_words": round(float(np.mean(context_tokens)), 1),
+    }
+
+
+def run_sweep(docs, embeddings, questions, ground_truths, chunk_sizes, overlaps, ks,
+              max_workers=4):
+    """Score every (chunk_size, chunk_overlap, k) on retrieval only; best first."""
+    query_vectors = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True) + 1e-12
+    configs = [(size, overlap) for size in chunk_sizes for overlap in overlaps if overlap < size]
+
+    def score_config(config):
+        size, overlap = config
+        started = time.perf_counter()
+        chunks, vectors = build_index(docs, embeddings, size, overlap)
+        rows = []
+        for k in ks:
+            hits = top_k(vectors, query_vectors, k)
+            rows.append({"chunk_size": size, "chunk_overlap": overlap, "k": k,
+                         "chunks": len(chunks), **retrieval_metrics(chunks, hits, ground_truths)})
+        print(f"  chunk_size={size} overlap={overlap}: {len(chunks)} chunks "
+              f"in {time.perf_counter() - started:.1f}s")
+        return rows
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        rows = [row for config_rows in pool.map(score_config, configs) for row in config_rows]
+    return sorted(rows, key=lambda r: (-r["retrieval_score"], r["avg_context_words"]))
+
+
+# ── Stage 3: generation for the top candidates only ──────────
+def generation_metrics(docs, embeddings, llm, row, questions, ground_truths, max_concurrency=4):
+    chunks, vectors = build_index(docs, embeddings, row["chunk_size"], row["chunk_overlap"])
+
+    def retrieve(question):
+        query = np.asarray(embeddings.embed_query(question), dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        return [chunks[i] for i in top_k(vectors, query[None, :], row["k"])[0]]
+
+    chain = (
+        {"context": RunnableLambda(retrieve) | format_docs, "question": RunnablePassthrough()}
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+    results = answer_batch(chain, questions, max_concurrency=max_concurrency)
+    answer_recalls = []
+    for result, truth in zip(results, ground_truths):
+        answer = result["answer"] or ""
+        truth_tokens = tokenize(truth)
+        answer_recalls.append(len(truth_tokens & tokenize(answer)) / len(truth_tokens))
+    return {
+        "answer_recall": round(float(np.mean(answer_recalls)), 4),
+        "abstained": int(grade_many([r["answer"] for r in results])["abstain"].sum()),
+        "avg_answer_seconds": round(float(np.mean([r["seconds"] for r in results])), 2),
+    }
+
+
+def write_results(rows, path=RESULTS_PATH):
+    with open(f"{path}.json", "w") as f:
+        json.dump(rows, f, indent=2)
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with open(f"{path}.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep chunking parameters on the golden dataset")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[200, 300, 500, 750, 1000])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 50, 100])
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser.add_argument("--top-n", type=int, default=3, help="configs that go through generation")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    docs = load_docs()
+    embeddings = get_embeddings(model=MODEL)
+    questions, ground_truths = golden_data['question'], golden_data['ground_truth']
+
+    print("="*60)
+    print("STAGE 1+2: split, embed and score retrieval (no LLM)")
+    print("="*60)
+    started = time.perf_counter()
+    rows = run_sweep(docs, embeddings, questions, ground_truths,
+                     args.chunk_sizes, args.overlaps, args.ks, max_workers=args.workers)
+    print(f"Scored {len(rows)} configurations in {time.perf_counter() - started:.1f}s")
+    print(f"Embedding cache: {embeddings.stats()}")
+
+    print("\n" + "="*60)
+    print(f"STAGE 3: generation for top {args.top_n}")
+    print("="*60)
+    llm = OllamaLLM(model=MODEL)
+    for row in rows[:args.top_n]:
+        row.update(generation_metrics(docs, embeddings, llm, row, questions, ground_truths,
+                                      max_concurrency=args.workers))
+        print(f"  size={row['chunk_size']} overlap={row['chunk_overlap']} k={row['k']}: "
+              f"answer_recall={row['answer_recall']} abstained={row['abstained']}")
+
+    write_results(rows, args.output)
+    print(f"\n{'Size':<6} {'Overlap':<8} {'k':<3} {'Recall':<8} {'Precision':<10} {'Score':<7} {'Answer recall'}")
+    print("-"*60)
+    for row in rows[:10]:
+        print(f"{row['chunk_size']:<6} {row['chunk_overlap']:<8} {row['k']:<3} "
+              f"{row['context_recall']:<8} {row['context_precision']:<10} {row['retrieval_score']:<7} "
+              f"{row.get('answer_recall', '-')}")
+    print(f"\n💾 Results written to {args.output}.json and {args.output}.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# context_builder.py
+"""
+Token-Budgeted Context Assembly
+
+Replacement for format_docs, which joins the top-k chunks as they come:
+with chunk_overlap=50, neighbouring chunks of one file repeat text, and
+nothing limits how much context reaches the prompt. Every prompt token
+is prefill time on CPU inference.
+
+ContextBuilder:
+1. Merges chunks of the same source that overlap or touch (using the
+   splitter's metadata["start_index"]; without it, the shared
+   suffix/prefix text is detected instead).
+2. Drops duplicated spans (identical or contained chunks).
+3. Orders the merged blocks by retrieval score, best first.
+4. Stops at `max_tokens`; the last block that doesn't fit is cut at a
+   line or sentence boundary.
+
+Tokens are counted with tiktoken's cl100k_base, whose 100k tokens the
+Llama 3 vocabulary extends, so counts run slightly high for llama3.2 (a
+safe direction for a budget). The encoding is loaded on the first count,
+not at import: tiktoken fetches it once over the network and caches it.
+Offline without a cached copy, ~4 characters per token is used instead,
+with a RuntimeWarning (once per process) saying why.
+"""
+import functools
+import re
+import warnings
+
+DEFAULT_MAX_TOKENS = 1500
+MIN_OVERLAP_CHARS = 20   # shorter shared text is a coincidence, not splitter overlap
+ADJACENT_GAP_CHARS = 2   # the separator the splitter dropped between two chunks
+MIN_TRUNCATED_TOKENS = 32
+
+
+@functools.lru_cache(maxsize=None)  # one attempt, so one warning, per process
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # not installed, or no cached encoding file offline
+        warnings.warn(f"tiktoken unavailable ({type(e).__name__}: {e}); context token "
+                      "counts fall back to ~4 characters per token", RuntimeWarning, stacklevel=2)
+        return None
+
+
+def count_tokens(text):
+    """BPE token count; ~4 characters per token when tiktoken is unavailable."""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Longest prefix within max_tokens, cut back to a line or sentence end if possible."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        prefix = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        prefix = text[:max_tokens * 4]
+    cut = max(prefix.rfind("\n"), *(m.end() for m in re.finditer(r"[.!?](?=\s)", prefix)), -1)
+    return prefix[:cut].rstrip() if cut > len(prefix) // 2 else prefix.rstrip()
+
+
+def _suffix_prefix_overlap(a, b):
+    """Length of the longest suffix of `a` that is a prefix of `b`."""
+    for size in range(min(len(a), len(b)), MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+
+class _Block:
+    """A contiguous span of one source, possibly several merged chunks."""
+
+    def __init__(self, doc, rank):
+        self.source = doc.metadata.get("source")
+        self.start = doc.metadata.get("start_index")
+        self.text = doc.page_content
+        self.score = doc.metadata.get("score")
+        self.rank = rank  # retrieval position, the tie-break / fallback order
+        self.chunks = 1
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    def absorb(self, other, text):
+        self.text = text
+        self.chunks += other.chunks
+        self.rank = min(self.rank, other.rank)
+        if other.score is not None and (self.score is None or other.score > self.score):
+            self.score = other.score
+
+
+class ContextBuilder:
+    """
+    Callable docs → context string, usable wherever format_docs is.
+
+    Args:
+        max_tokens (int): Context token budget
+        separator (str): Between merged blocks
+        count (callable): Token counter (defaults to count_tokens)
+
+    Example:
+        >>> builder = ContextBuilder(max_tokens=800)
+        >>> chain = build_rag_chain(retriever, llm, format_context=builder)
+        >>> text, stats = builder.build_with_stats(docs)   # tokens before/after, truncation
+    """
+
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, separator="\n\n", count=count_tokens):
+        self.max_tokens = max_tokens
+        self.separator = separator
+        self.count = count
+
+    def __call__(self, docs):
+        return self.build(docs)
+
+    def build(self, docs):
+        return self.build_with_stats(docs)[0]
+
+    def build_with_stats(self, docs):
+        """
+        (context, stats). The stats go back to the caller, not onto the
+        builder: one builder serves concurrent chain calls.
+        """
+        blocks = self.merge(docs)
+        blocks.sort(key=lambda b: (b.score is None, -(b.score or 0), b.rank))
+
+        parts, used, truncated = [], 0, False
+        sep_tokens = self.count(self.separator)
+        for block in blocks:
+            cost = self.count(block.text) + (sep_tokens if parts else 0)
+            if used + cost <= self.max_tokens:
+                parts.append(block.text)
+                used += cost
+                continue
+            remaining = self.max_tokens - used - (sep_tokens if parts else 0)
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                parts.append(truncate_to_tokens(block.text, remaining))
+            truncated = True
+            break
+
+        text = self.separator.join(parts)
+        stats = {
+            "chunks_in": len(docs),
+            "blocks_out": len(parts),
+            "tokens_in": sum(self.count(d.page_content) for d in docs),
+            "tokens_out": self.count(text),
+            "truncated": truncated,
+        }
+        return text, stats
+
+    def merge(self, docs):
+        """Merge overlapping/adjacent chunks per source and drop duplicated spans."""
+        blocks = [_Block(doc, rank) for rank, doc in enumerate(docs)]
+        by_source = {}
+        for block in blocks:
+            by_source.setdefault(block.source, []).append(block)
+
+        merged = []
+        for group in by_source.values():
+            positioned = sorted((b for b in group if b.start is not None), key=lambda b: b.start)
+            merged.extend(self._merge_positioned(positioned))
+            merged.extend(self._merge_by_text([b for b in group if b.start is None]))
+
+        # identical or contained text across sources (copied paragraphs)
+        merged.sort(key=lambda b: -len(b.text))
+        unique = []
+        for block in merged:
+            container = next((u for u in unique if block.text in u.text), None)
+            if container:
+                container.absorb(block, container.text)
+            else:
+                unique.append(block)
+        return unique
+
+    @staticmethod
+    def _merge_positioned(blocks):
+        out = []
+        for block in blocks:
+            last = out[-1] if out else None
+            if last and block.start <= last.end:  # overlaps
+                tail = block.text[last.end - block.start:] if block.end > last.end else ""
+                last.absorb(block, last.text + tail)
+            elif last and block.start <= last.end + ADJACENT_GAP_CHARS:  # touches
+                last.absorb(block, last.text + "\n" + block.text)
+            else:
+                out.append(block)
+        return out
+
+    @staticmethod
+    def _merge_by_text(blocks):
+        out = []
+        for block in blocks:
+            for other in out:
+                if block.text in other.text:
+                    other.absorb(block, other.text)
+                    break
+                if other.text in block.text:
+                    other.absorb(block, block.text)
+                    break
+                overlap = _suffix_prefix_overlap(other.text, block.text)
+                if overlap:
+                    other.absorb(block, other.text + block.text[overlap:])
+                    break
+                overlap = _suffix_prefix_overlap(block.text, other.text)
+                if overlap:
+                    other.absorb(block, block.text + other.text[overlap:])
+                    break
+            else:
+                out.append(block)
+        return out
@@ -0,0 +1,94 @@
+# doc_loader.py
+"""
+Streaming Document Loader
+
+The one place documents are read from disk (replaces the per-script
+copies of load_docs).
+
+- Walks the folder tree recursively
+- Reads files on a small thread pool
+- Yields Documents lazily with a bounded number of reads in flight, so a
+  slow consumer (splitter, embedder) holds back the readers instead of
+  the whole corpus piling up in RAM
+
+A Document holds its whole text, so each file is read in one go; memory
+is bounded per file, not below it. sync_documents (ingestion.py) splits
+and embeds each document as it arrives.
+"""
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+def iter_paths(folder="sampledocs", extensions=(".txt",)):
+    """Yield matching file paths under `folder`, recursively, in a stable order."""
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.endswith(extensions):
+                yield os.path.join(root, filename)
+
+
+def read_text(path):
+    """Read a UTF-8 file as is (no newline translation, so content hashes stay stable)."""
+    with open(path, "rb") as f:
+        return f.read().decode("utf-8")
+
+
+def iter_docs(folder="sampledocs", extensions=(".txt",), workers=4, max_in_flight=8):
+    """
+    Lazily load text files from a directory tree as Document objects.
+
+    Args:
+        folder (str): Root directory to walk
+        extensions (tuple[str]): File suffixes to load
+        workers (int): Reader threads
+        max_in_flight (int): Max files read ahead of the consumer (backpressure)
+
+    Yields:
+        Document: One per file, in path order. metadata["source"] is the
+        path relative to `folder` (just the filename for top-level files).
+    """
+    paths = iter_paths(folder, extensions)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for path in paths:
+                pending.append((path, pool.submit(read_text, path)))
+                if len(pending) >= max_in_flight:
+                    yield _to_document(folder, *pending.popleft())
+            while pending:
+                yield _to_document(folder, *pending.popleft())
+        finally:
+            # Consumer stopped early: don't keep reading files nobody wants
+            for _, future in pending:
+                future.cancel()
+
+
+def _to_document(folder, path, future):
+    source = os.path.relpath(path, folder).replace(os.sep, "/")
+    return Document(page_content=future.result(), metadata={"source": source})
+
+
+def load_docs(folder="sampledocs"):
+    """
+    Load all text files from a directory into Document objects.
+
+    Kept for scripts that need the whole (small) corpus as a list; prefer
+    iter_docs for anything large.
+
+    Args:
+        folder (str): Path to directory containing .txt files
+
+    Returns:
+        list[Document]: List of LangChain Document objects with content and metadata
+
+    Example:
+        >>> docs = load_docs("sampledocs")
+        >>> len(docs)
+        3
+    """
+    docs = list(iter_docs(folder))
+    print(f"Loaded {len(docs)} documents")
+    return docs
@@ -0,0 +1,202 @@
+# embedding_cache.py
+"""
+Persistent Embedding Cache
+
+Wraps any LangChain embeddings object (OllamaEmbeddings in this project)
+with an on-disk cache so the same chunk is embedded once, no matter how
+many scripts or test sessions ask for it.
+
+- Key: (model name, SHA-256 of the normalized text)
+- Storage: one SQLite file shared by every script and pytest session
+- Identical texts inside one batch are embedded once, and threads that
+  miss on the same text at the same time wait for a single embedding call
+- Vectors are stored as float32 and returned as float32 values on both
+  the cached and the freshly embedded path
+- Size-bounded with least-recently-used eviction
+- Hit/miss counters via stats()
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache.sqlite3"),
+)
+DEFAULT_MAX_ENTRIES = 200_000
+
+
+def normalize_text(text):
+    """Unicode-normalize and collapse whitespace so trivial differences share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model, text):
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+def as_float32(vector):
+    """The vector as the cache stores it, so a cold call returns what a warm one will."""
+    return array("f", vector).tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Cache-backed drop-in replacement for an embeddings object.
+
+    Example:
+        >>> embeddings = CachedEmbeddings(OllamaEmbeddings(model="llama3.2"))
+        >>> vectorstore = Chroma(embedding_function=embeddings, ...)
+        >>> embeddings.stats()
+        {'hits': 42, 'misses': 3, 'deduplicated': 1, 'evicted': 0, 'entries': 45, 'hit_rate': 0.93}
+    """
+
+    def __init__(self, embeddings, path=DEFAULT_CACHE_PATH,
+                 max_entries=DEFAULT_MAX_ENTRIES, model_name=None):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model", type(embeddings).__name__)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future of a miss another thread is embedding
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+
+    # ── Embeddings interface ───────────────────────────────────
+    def embed_documents(self, texts):
+        keys = [cache_key(self.model_name, t) for t in texts]
+
+        # One embedding call per distinct missing text, across threads too. The
+        # lookup and the in-flight registration share one critical section: a
+        # thread that finishes in between would otherwise leave its text unseen
+        # by both, and it would be embedded again.
+        missing, waiting = {}, {}
+        with self._lock:
+            found = self._get_many(set(keys))
+            for key, text in zip(keys, texts):
+                if key in found:
+                    self.hits += 1
+                elif key in missing or key in waiting:
+                    self.deduplicated += 1
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                    self.deduplicated += 1
+                else:
+                    missing[key] = text
+                    self._inflight[key] = Future()
+            self.misses += len(missing)
+
+        if missing:
+            try:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+                computed = {key: as_float32(vec) for key, vec in zip(missing, vectors)}
+                self._put_many(computed)
+            except BaseException as e:
+                for future in self._release(missing):
+                    future.set_exception(e)
+                raise
+            for key, future in zip(missing, self._release(missing)):
+                future.set_result(computed[key])
+            found.update(computed)
+        for key, future in waiting.items():
+            found[key] = future.result()
+
+        return [list(found[key]) for key in keys]
+
+    def embed_query(self, text):
+        # Ollama embeds queries and documents the same way, so they share entries
+        return self.embed_documents([text])[0]
+
+    def _release(self, keys):
+        with self._lock:
+            return [self._inflight.pop(key) for key in keys]
+
+    # ── Storage ────────────────────────────────────────────────
+    def _get_many(self, keys):
+        """Cached vectors of `keys`, touching their last_used; the caller holds the lock."""
+        if not keys:
+            return {}
+        keys = list(keys)
+        found = {}
+        now = time.time()
+        for start in range(0, len(keys), 500):  # stay under SQLite's variable limit
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        if found:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self._conn.commit()
+        return found
+
+    def _put_many(self, vectors):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vec).tobytes(), now) for key, vec in vectors.items()],
+            )
+            excess = self._count() - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evicted += excess
+            self._conn.commit()
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # ── Metrics ────────────────────────────────────────────────
+    def stats(self):
+        with self._lock:
+            entries = self._count()
+            hits, misses, deduplicated = self.hits, self.misses, self.deduplicated
+            evicted = self.evicted
+        lookups = hits + misses + deduplicated
+        return {
+            "hits": hits,
+            "misses": misses,
+            "deduplicated": deduplicated,
+            "evicted": evicted,
+            "entries": entries,
+            "hit_rate": (hits + deduplicated) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def get_embeddings(model="llama3.2", path=DEFAULT_CACHE_PATH, client_kwargs=None):
+    """Shared entry point: OllamaEmbeddings behind the project-wide disk cache."""
+    return CachedEmbeddings(OllamaEmbeddings(model=model, client_kwargs=client_kwargs or {}),
+                            path=path)
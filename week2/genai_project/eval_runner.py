@@ -0,0 +1,316 @@
+# eval_runner.py
+"""
+Concurrent, Resumable RAGAS Evaluation
+
+Scales ragas_simple.py from the 5-row golden dataset to thousands of rows:
+
+1. Pipelined: answering and scoring overlap. While one row is being
+   judged, the next ones are already being answered; each stage has its
+   own concurrency limit (answer_concurrency / score_concurrency).
+2. Judge cache: every judge prompt → response is stored in SQLite under a
+   SHA-256 of (model settings, prompt), so a re-run only pays for judge
+   calls whose inputs changed.
+3. Checkpoints: each finished row is appended to a JSONL file and flushed.
+   Re-running with the same --checkpoint skips rows already there, so an
+   interrupted run resumes where it stopped.
+4. Progress: rows done, rows/sec and ETA while running; a summary at the end.
+
+Usage:
+    python eval_runner.py                                  # golden_dataset.py
+    python eval_runner.py --dataset eval_rows.jsonl --answer-concurrency 4 --score-concurrency 2
+    python eval_runner.py --checkpoint eval_checkpoint.jsonl   # resume
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+DEFAULT_CHECKPOINT = "eval_checkpoint.jsonl"
+DEFAULT_JUDGE_CACHE = os.environ.get(
+    "JUDGE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".judge_cache.sqlite3"),
+)
+
+
+# ── Judge cache ──────────────────────────────────────────────
+class JudgeCache(BaseCache):
+    """
+    LangChain LLM cache on SQLite, keyed by SHA-256(llm settings, prompt).
+
+    Pass it to the judge model only — ChatOllama(model=..., cache=JudgeCache())
+    — so the pipeline under test still generates fresh answers.
+    """
+
+    def __init__(self, path=DEFAULT_JUDGE_CACHE):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS judge_calls ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM judge_calls WHERE key = ?", (self.key(prompt, llm_string),)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [loads(g) for g in json.loads(row[0])]
+
+    def update(self, prompt, llm_string, return_val):
+        response = json.dumps([dumps(g) for g in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_calls (key, response, created) VALUES (?, ?, ?)",
+                (self.key(prompt, llm_string), response, time.time()),
+            )
+            self._conn.commit()
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM judge_calls")
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# ── Checkpoints ──────────────────────────────────────────────
+def row_id(row):
+    """Stable id of a dataset row (its question and reference answer)."""
+    text = json.dumps([row["question"], row.get("ground_truth")], ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(path):
+    """{row_id: result} of rows finished in an earlier run; a torn last line is ignored."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # interrupted mid-write
+            if result.get("error") is None:
+                done[result["row_id"]] = result
+    return done
+
+
+class CheckpointWriter:
+    def __init__(self, path):
+        self._file = open(path, "a+")
+        self._lock = threading.Lock()
+        if self._file.tell():
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")  # end a line torn by an interrupted run
+
+    def write(self, result):
+        with self._lock:
+            self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# ── Progress ─────────────────────────────────────────────────
+class Progress:
+    def __init__(self, total, already_done=0, every_seconds=2.0, stream=sys.stderr):
+        self.total = total
+        self.done = already_done
+        self.started_with = already_done
+        self.errors = 0
+        self.every = every_seconds
+        self.stream = stream
+        self.started = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, error=False):
+        self.done += 1
+        self.errors += error
+        now = time.perf_counter()
+        if now - self._last >= self.every or self.done == self.total:
+            self._last = now
+            print(self.line(), file=self.stream, flush=True)
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return (self.done - self.started_with) / elapsed if elapsed else 0.0
+
+    def line(self):
+        rate = self.rate()
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        return (f"[{self.done:>{len(str(self.total))}}/{self.total}] {rate:.2f} rows/s "
+                f"ETA {eta:.0f}s errors {self.errors}")
+
+
+# ── Runner ───────────────────────────────────────────────────
+async def run_eval(rows, answer_fn, scorers, checkpoint_path=DEFAULT_CHECKPOINT,
+                   answer_concurrency=4, score_concurrency=4, progress_every=2.0):
+    """
+    Answer and score every row not already in the checkpoint.
+
+    Args:
+        rows (list[dict]): {"question", "ground_truth"} rows
+        answer_fn: async question -> {"answer": str, "sources": [{"content": ...}]}
+            (rag_chain_with_sources.ainvoke)
+        scorers (dict[str, async fn]): metric name -> async fn(result) -> float,
+            where result has question, answer, contexts, ground_truth
+
+    Returns every result (resumed and new), in dataset order.
+    """
+    done = load_checkpoint(checkpoint_path)
+    pending = [row for row in rows if row_id(row) not in done]
+    progress = Progress(len(rows), already_done=len(rows) - len(pending),
+                        every_seconds=progress_every)
+    writer = CheckpointWriter(checkpoint_path)
+    answer_slots = asyncio.Semaphore(answer_concurrency)
+    score_slots = asyncio.Semaphore(score_concurrency)
+    queue = iter(pending)
+
+    async def process(row):
+        result = {"row_id": row_id(row), "question": row["question"],
+                  "ground_truth": row.get("ground_truth"), "error": None}
+        try:
+            async with answer_slots:
+                started = time.perf_counter()
+                output = await answer_fn(row["question"])
+                result["answer"] = output["answer"]
+                result["contexts"] = [s["content"] for s in output["sources"]]
+                result["answer_seconds"] = round(time.perf_counter() - started, 3)
+            async with score_slots:
+                started = time.perf_counter()
+                names = list(scorers)
+                scores = await asyncio.gather(*(scorers[n](result) for n in names))
+                result.update({n: float(s) for n, s in zip(names, scores)})
+                result["score_seconds"] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        writer.write(result)
+        progress.update(error=result["error"] is not None)
+        return result
+
+    async def worker():
+        # a worker picks the next row as soon as its previous one is fully scored;
+        # more workers than answer slots keeps the answer stage busy meanwhile
+        fresh = []
+        for row in queue:
+            fresh.append(await process(row))
+        return fresh
+
+    try:
+        workers = answer_concurrency + score_concurrency
+        batches = await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        writer.close()
+    results = dict(done)
+    results.update({r["row_id"]: r for batch in batches for r in batch})
+    return [results[row_id(row)] for row in rows]
+
+
+def summarize_results(results, metric_names):
+    scored = [r for r in results if r.get("error") is None]
+    summary = {"rows": len(results), "errors": len(results) - len(scored)}
+    for name in metric_names:
+        values = [r[name] for r in scored if r.get(name) == r.get(name)]  # skip NaN
+        summary[name] = round(sum(values) / len(values), 4) if values else None
+    return summary
+
+
+# ── RAGAS wiring ─────────────────────────────────────────────
+def ragas_scorers(judge_llm, embeddings):
+    """Faithfulness and answer relevancy as per-row async scorers."""
+    from ragas.dataset_schema import SingleTurnSample
+    from ragas.embeddings import LangchainEmbeddingsWrapper
+    from ragas.llms import LangchainLLMWrapper
+    from ragas.metrics import AnswerRelevancy, Faithfulness
+
+    llm = LangchainLLMWrapper(judge_llm)
+    metrics = {
+        "faithfulness": Faithfulness(llm=llm),
+        "answer_relevancy": AnswerRelevancy(llm=llm, embeddings=LangchainEmbeddingsWrapper(embeddings)),
+    }
+
+    def scorer(metric):
+        async def score(result):
+            sample = SingleTurnSample(user_input=result["question"], response=result["answer"],
+                                      retrieved_contexts=result["contexts"],
+                                      reference=result["ground_truth"])
+            return await metric.single_turn_ascore(sample)
+        return score
+
+    return {name: scorer(metric) for name, metric in metrics.items()}
+
+
+def load_rows(path=None):
+    if path is None:
+        from golden_dataset import golden_data
+        return [{"question": q, "ground_truth": g}
+                for q, g in zip(golden_data['question'], golden_data['ground_truth'])]
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipelined, resumable RAGAS evaluation")
+    parser.add_argument("--dataset", default=None, help="JSONL of {question, ground_truth} rows")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--judge-cache", default=DEFAULT_JUDGE_CACHE)
+    parser.add_argument("--answer-concurrency", type=int, default=4)
+    parser.add_argument("--score-concurrency", type=int, default=2,
+                        help="rows judged at once (each row makes several judge calls)")
+    parser.add_argument("--ingest", action="store_true")
+    args = parser.parse_args()
+
+    from langchain_ollama import ChatOllama
+    from rag_pipeline import MODEL, RagPipeline
+
+    rows = load_rows(args.dataset)
+    pipeline = RagPipeline(ingest=args.ingest)
+    judge_cache = JudgeCache(args.judge_cache)
+    judge = ChatOllama(model=MODEL, cache=judge_cache)  # only the judge is cached
+    scorers = ragas_scorers(judge, pipeline.embeddings)
+
+    print(f"Evaluating {len(rows)} rows → {args.checkpoint}")
+    started = time.perf_counter()
+    results = asyncio.run(run_eval(
+        rows, pipeline.rag_chain_with_sources.ainvoke, scorers, args.checkpoint,
+        answer_concurrency=args.answer_concurrency, score_concurrency=args.score_concurrency,
+    ))
+    seconds = time.perf_counter() - started
+
+    print("\n" + "="*60)
+    print("RAGAS SCORES")
+    print("="*60)
+    for key, value in summarize_results(results, list(scorers)).items():
+        print(f"{key:<20} {value}")
+    print(f"\n⏱️ {seconds:.1f}s, judge cache: {judge_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# fake_ollama.py
+"""
+Fake Ollama Server
+
+A stand-in for a local Ollama install, for benchmarks and tests on any
+Linux box without a model. Speaks enough of the Ollama HTTP API for
+langchain_ollama (OllamaLLM, ChatOllama, OllamaEmbeddings) and the
+`ollama` client:
+
+    POST /api/generate     streaming (NDJSON) or single JSON
+    POST /api/chat         streaming (NDJSON) or single JSON
+    POST /api/embed        batched embeddings
+    POST /api/embeddings   legacy single embedding
+    GET  /api/tags, POST /api/show, GET /api/version
+
+Everything is deterministic:
+- Embeddings are hashed bag-of-words vectors, so similar texts really are
+  close and retrieval behaves sensibly.
+- Answers pick the context sentence that best overlaps the question, or
+  the guardrail abstention sentence when nothing overlaps.
+
+Latency is configurable: time to first token, tokens/sec while
+streaming, and per-request embedding latency.
+
+Usage:
+    python fake_ollama.py --port 11435 --first-token-ms 200 --tokens-per-sec 30
+    OLLAMA_HOST=http://127.0.0.1:11435 python rag_pipeline.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The abstention sentence the RAG prompt asks for (streaming.py stops on it)
+ABSTAIN_ANSWER = "I don't know based on available information."
+STOPWORDS = {"the", "a", "an", "is", "are", "of", "to", "in", "on", "for", "and", "or",
+             "what", "how", "do", "does", "can", "i", "my", "you", "your", "many", "much"}
+
+
+def fake_embedding(text, dim=256):
+    """Signed hashed bag-of-words, L2-normalized."""
+    vector = [0.0] * dim
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def fake_answer(prompt):
+    """Best-overlapping context sentence for the question, else the abstention sentence."""
+    context, question = prompt, prompt
+    match = re.search(r"Context:(.*?)Question:(.*)", prompt, re.S)
+    if match:
+        context, question = match.group(1), match.group(2)
+    question_words = set(re.findall(r"[a-z0-9]+", question.lower())) - STOPWORDS
+    best, best_overlap = None, 0
+    for sentence in re.split(r"(?<=[.!?])\s+|\n+", context):
+        overlap = len(question_words & set(re.findall(r"[a-z0-9]+", sentence.lower())))
+        if overlap > best_overlap:
+            best, best_overlap = sentence.strip(), overlap
+    return best if best and best_overlap >= 2 else ABSTAIN_ANSWER
+
+
+def tokenize_for_stream(text):
+    """Split into word-ish tokens that concatenate back to the original text."""
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+class FakeOllamaConfig:
+    def __init__(self, first_token_ms=0.0, tokens_per_sec=0.0, embed_ms=0.0,
+                 embed_ms_per_text=0.0, embed_dim=256):
+        self.first_token_ms = first_token_ms        # prefill latency
+        self.tokens_per_sec = tokens_per_sec        # 0 = unlimited
+        self.embed_ms = embed_ms                    # per embed request
+        self.embed_ms_per_text = embed_ms_per_text  # plus per input text
+        self.embed_dim = embed_dim
+
+
+def make_handler(config, counters):
+    class FakeOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        # ── helpers ────────────────────────────────────────────
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _count(self, key, n=1):
+            with counters["lock"]:
+                counters[key] = counters.get(key, 0) + n
+
+        def _stream_tokens(self, text, make_chunk, make_final, stream):
+            tokens = tokenize_for_stream(text)
+            time.sleep(config.first_token_ms / 1000)
+            delay = 1 / config.tokens_per_sec if config.tokens_per_sec else 0
+            if not stream:
+                time.sleep(delay * len(tokens))
+                return self._send_json(make_final(text, len(tokens), full=True))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i, token in enumerate(tokens):
+                    if i and delay:
+                        time.sleep(delay)
+                    self._write_chunk(make_chunk(token))
+                self._write_chunk(make_final("", len(tokens), full=False))
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self._count("cancelled_streams")  # client stopped reading early
+
+        def _write_chunk(self, payload):
+            data = (json.dumps(payload) + "\n").encode()
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        # ── endpoints ──────────────────────────────────────────
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{"name": "llama3.2:latest", "model": "llama3.2:latest"}]})
+            elif self.path == "/api/version":
+                self._send_json({"version": "0.0.0-fake"})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            body = self._read_json()
+            model = body.get("model", "llama3.2")
+            stream = body.get("stream", True)
+            now = datetime.now(timezone.utc).isoformat()
+
+            if self.path == "/api/generate":
+                self._count("generate")
+                prompt = body.get("prompt", "")
+                text = '{"score": 1, "reason": "fake judge"}' if body.get("format") else fake_answer(prompt)
+
+                def chunk(token):
+                    return {"model": model, "created_at": now, "response": token, "done": False}
+
+                def final(full_text, n, full):
+                    return {"model": model, "created_at": now, "response": full_text, "done": True,
+                            "done_reason": "stop", "context": [],
+                            "prompt_eval_count": len(prompt.split()), "eval_count": n}
+
+                self._stream_tokens(text, chunk, final, stream)
+
+            elif self.path == "/api/chat":
+                self._count("chat")
+                messages = body.get("messages", [])
+                prompt = "\n".join(str(m.get("content", "")) for m in messages)
+                text = '{"score": 1, "reason": "fake judge"}' if body.get("format") else fake_answer(prompt)
+
+                def chunk(token):
+                    return {"model": model, "created_at": now,
+                            "message": {"role": "assistant", "content": token}, "done": False}
+
+                def final(full_text, n, full):
+                    return {"model": model, "created_at": now,
+                            "message": {"role": "assistant", "content": full_text},
+                            "done": True, "done_reason": "stop",
+                            "prompt_eval_count": len(prompt.split()), "eval_count": n}
+
+                self._stream_tokens(text, chunk, final, stream)
+
+            elif self.path == "/api/embed":
+                inputs = body.get("input", "")
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                self._count("embed")
+                self._count("embedded_texts", len(inputs))
+                time.sleep((config.embed_ms + config.embed_ms_per_text * len(inputs)) / 1000)
+                self._send_json({"model": model,
+                                 "embeddings": [fake_embedding(t, config.embed_dim) for t in inputs]})
+
+            elif self.path == "/api/embeddings":
+                self._count("embed")
+                self._count("embedded_texts")
+                time.sleep((config.embed_ms + config.embed_ms_per_text) / 1000)
+                self._send_json({"embedding": fake_embedding(body.get("prompt", ""), config.embed_dim)})
+
+            elif self.path == "/api/show":
+                self._send_json({"modelfile": "", "parameters": "", "template": "",
+                                 "details": {"family": "llama", "parameter_size": "3.2B"},
+                                 "model_info": {}, "capabilities": ["completion", "embedding"]})
+            else:
+                self._send_json({"error": f"unknown endpoint {self.path}"}, 404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeOllamaHandler
+
+
+class FakeOllamaServer:
+    """
+    Run the fake server in a background thread.
+
+    Example:
+        >>> with FakeOllamaServer(first_token_ms=50, tokens_per_sec=100) as server:
+        ...     llm = OllamaLLM(model="llama3.2", base_url=server.url)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, **config):
+        self.config = FakeOllamaConfig(**config)
+        self.counters = {"lock": threading.Lock()}
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.config, self.counters))
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        return {k: v for k, v in self.counters.items() if k != "lock"}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--embed-ms", type=float, default=0.0)
+    parser.add_argument("--embed-ms-per-text", type=float, default=0.0)
+    parser.add_argument("--embed-dim", type=int, default=256)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, first_token_ms=args.first_token_ms,
+                              tokens_per_sec=args.tokens_per_sec, embed_ms=args.embed_ms,
+                              embed_ms_per_text=args.embed_ms_per_text, embed_dim=args.embed_dim)
+    print(f"🤖 Fake Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
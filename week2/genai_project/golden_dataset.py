@@ -14,4 +14,35 @@ golden_data = {
         "No, digital products are non-refundable once downloaded.",
         "Maternity leave is 26 weeks paid.",
     ]
-}
\ No newline at end of file
+}
+
+# Same questions, reworded — used to tune the semantic answer cache threshold
+golden_paraphrases = [
+    "What's the policy on refunds?",
+    "How much annual leave do employees receive?",
+    "What happens during the first week of onboarding?",
+    "Are digital products refundable?",
+    "How many weeks of maternity leave are there?",
+]
+
+# Near-miss questions that must NOT reuse a cached golden answer
+golden_near_misses = [
+    "How long does a refund take to process?",
+    "How many days of sick leave do employees get?",
+    "What happens in week 2 of onboarding?",
+    "Can I get a refund on a physical product?",
+    "How long is paternity leave?",
+]
+
+# Pipeline smoke-test questions: should be answered / should be abstained on
+golden_test_questions = {
+    'answerable': [
+        "What is the refund policy?",
+        "How many days of annual leave do employees get?",
+        "What happens in week 1 of onboarding?",
+    ],
+    'unanswerable': [
+        "What is the CEO's name?",
+        "What is the company stock price?",
+    ]
+}
@@ -0,0 +1,280 @@
+# hybrid_retriever.py
+"""
+Hybrid BM25 + Vector Retrieval
+
+Most of our questions are exact policy lookups ("refund", "maternity
+leave", "digital product"), where plain keyword matching already finds
+the right chunk — without embedding the question first.
+
+- BM25Index: inverted index over the chunks, built at ingest time and
+  saved next to the Chroma collection. Postings are flat NumPy arrays
+  (CSR layout), so scoring a query term is one vectorized update over
+  the documents that contain it.
+- HybridRetriever: fuses the BM25 ranking with any dense retriever
+  (ScoredRetriever, NumpyRetriever, vectorstore.as_retriever()) by
+  reciprocal rank fusion. With `skip_dense_coverage` set, the dense query
+  embedding is skipped entirely when the best lexical match covers enough
+  of the question's (IDF-weighted) terms.
+
+Exact wording also matters for the adversarial cases: "60 days" or
+"downloading" pull in the chunk that contradicts the question even when
+the embedding of the whole question lands elsewhere.
+"""
+import json
+import os
+import re
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from rag_tracing import stage_span
+
+POSTINGS_FILE = "bm25.npz"
+META_FILE = "meta.json"
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "of", "to", "in", "on", "for", "and", "or",
+    "with", "by", "at", "as", "it", "its", "this", "that", "what", "how", "do", "does", "can",
+    "i", "me", "my", "we", "you", "your", "if", "after", "about", "right", "heard", "get",
+}
+SUFFIXES = ("able", "ing", "ed", "es", "s")
+
+
+def stem(word):
+    """Strip one common suffix: refunds / refundable → refund, downloading → download."""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    return [stem(w) for w in re.findall(r"[a-z0-9]+", text.lower())
+            if len(w) > 1 and w not in STOPWORDS]
+
+
+def bm25_path_for(persist_directory):
+    """Where the inverted index of a Chroma collection lives."""
+    return os.path.normpath(persist_directory) + "_bm25"
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of chunks.
+
+    Postings for term t are doc_idx[indptr[t]:indptr[t+1]] with matching
+    term frequencies in tf; documents are rows, like NumpyVectorIndex.
+
+    Example:
+        >>> index = BM25Index.from_documents(chunks)
+        >>> index.search("refund digital product", k=3)   # [(row, score), ...]
+    """
+
+    def __init__(self, terms, indptr, doc_idx, tf, doc_len, ids, texts, metadata=None,
+                 version=None, k1=1.5, b=0.75):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.terms = list(terms)
+        self.indptr, self.doc_idx, self.tf = indptr, doc_idx, tf
+        self.doc_len = doc_len
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadata = metadata or {}
+        self.version = version
+        self.k1, self.b = k1, b
+        n = len(self.ids)
+        df = np.diff(indptr)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_len = doc_len.mean() if n else 1.0
+        self.norm = (k1 * (1 - b + b * doc_len / avg_len)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ── Building ───────────────────────────────────────────────
+    @classmethod
+    def from_records(cls, ids, texts, metadatas, version=None, **params):
+        postings = {}  # term -> {row: tf}
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[row] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[row] = counts.get(row, 0) + 1
+        terms = sorted(postings)
+        lengths = [len(postings[t]) for t in terms]
+        indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        doc_idx = np.fromiter((r for t in terms for r in postings[t]), dtype=np.int32,
+                              count=int(indptr[-1]))
+        tf = np.fromiter((c for t in terms for c in postings[t].values()), dtype=np.float32,
+                         count=int(indptr[-1]))
+        keys = list(dict.fromkeys(key for m in metadatas for key in (m or {})))
+        columns = {key: [(m or {}).get(key) for m in metadatas] for key in keys}
+        return cls(terms, indptr, doc_idx, tf, doc_len, ids, texts, columns, version=version, **params)
+
+    @classmethod
+    def from_documents(cls, docs, ids=None, **params):
+        ids = ids or [doc.id or str(i) for i, doc in enumerate(docs)]
+        return cls.from_records(ids, [d.page_content for d in docs], [d.metadata for d in docs],
+                                **params)
+
+    @classmethod
+    def from_chroma(cls, vectorstore, version=None, **params):
+        data = vectorstore._collection.get(include=["documents", "metadatas"])
+        return cls.from_records(data["ids"], data["documents"], data["metadatas"],
+                                version=version, **params)
+
+    # ── Persistence ────────────────────────────────────────────
+    def save(self, directory):
+        """Write bm25.npz + meta.json; meta.json is replaced last, atomically."""
+        os.makedirs(directory, exist_ok=True)
+        np.savez(os.path.join(directory, POSTINGS_FILE), indptr=self.indptr,
+                 doc_idx=self.doc_idx, tf=self.tf, doc_len=self.doc_len)
+        meta_path = os.path.join(directory, META_FILE)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"version": self.version, "k1": self.k1, "b": self.b, "terms": self.terms,
+                       "ids": self.ids, "texts": self.texts, "metadata": self.metadata}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        with np.load(os.path.join(directory, POSTINGS_FILE)) as arrays:
+            postings = {name: arrays[name] for name in ("indptr", "doc_idx", "tf", "doc_len")}
+        return cls(meta["terms"], ids=meta["ids"], texts=meta["texts"], metadata=meta["metadata"],
+                   version=meta["version"], k1=meta["k1"], b=meta["b"], **postings)
+
+    @staticmethod
+    def stored_version(directory):
+        """Version recorded in a saved index, or None if there is none."""
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                return json.load(f)["version"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    # ── Search ─────────────────────────────────────────────────
+    def scores(self, query):
+        """BM25 score of every row (0 for rows sharing no term with the query)."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for col in (self.vocab[t] for t in set(tokenize(query)) if t in self.vocab):
+            start, end = self.indptr[col], self.indptr[col + 1]
+            rows, tf = self.doc_idx[start:end], self.tf[start:end]
+            # rows are unique within one posting list, so fancy += is safe
+            scores[rows] += self.idf[col] * tf * (self.k1 + 1) / (tf + self.norm[rows])
+        return scores
+
+    def search(self, query, k):
+        """[(row, score), ...] with score > 0, best first."""
+        scores = self.scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        return [(int(i), float(scores[i])) for i in idx]
+
+    def coverage(self, query, row):
+        """
+        Share of the query's IDF weight matched by one row. Terms the index
+        has never seen count as the rarest possible term, so "CEO salary"
+        scores 0 rather than 1.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        max_idf = float(self.idf.max()) if len(self.idf) else 1.0
+        row_terms = set(tokenize(self.texts[row]))
+        total = matched = 0.0
+        for term in terms:
+            weight = float(self.idf[self.vocab[term]]) if term in self.vocab else max_idf
+            total += weight
+            matched += weight if term in row_terms else 0.0
+        return matched / total
+
+    def document(self, row, score=None):
+        metadata = {key: column[row] for key, column in self.metadata.items()
+                    if column[row] is not None}
+        if score is not None:
+            metadata["score"] = score
+        return Document(page_content=self.texts[row], metadata=metadata, id=self.ids[row])
+
+
+def _doc_key(doc):
+    return doc.metadata.get("source"), doc.page_content
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    BM25 + dense retrieval fused by reciprocal rank fusion (RRF).
+
+    Returned chunks carry metadata["score"] (fused RRF score), plus
+    "lexical_score" / "dense_score" from whichever side found them and
+    "retrieval" = "hybrid" or "lexical" (dense skipped).
+
+    Args:
+        index (BM25Index): Lexical index over the same chunks
+        dense (BaseRetriever): Dense retriever; asked for its own top-k
+        k (int): Chunks returned
+        fetch_k (int): Lexical candidates taken into the fusion
+        rrf_k (int): RRF damping constant (60 is the usual choice)
+        skip_dense_coverage (float | None): Skip the dense side when the
+            top lexical chunk covers at least this share of the query's
+            IDF-weighted terms and clearly beats the runner-up
+        skip_dense_margin (float): Top lexical score must be this many
+            times the second one to count as clear
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: BM25Index
+    dense: BaseRetriever
+    k: int = 3
+    fetch_k: int = 10
+    rrf_k: int = 60
+    skip_dense_coverage: Optional[float] = None
+    skip_dense_margin: float = 1.2
+    dense_calls: int = 0
+    dense_skipped: int = 0
+
+    def lexical_confident(self, query, hits):
+        if self.skip_dense_coverage is None or not hits:
+            return False
+        if len(hits) > 1 and hits[0][1] < self.skip_dense_margin * hits[1][1]:
+            return False
+        return self.index.coverage(query, hits[0][0]) >= self.skip_dense_coverage
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with stage_span("bm25_search", run_manager):
+            hits = self.index.search(query, max(self.fetch_k, self.k))
+        if self.lexical_confident(query, hits):
+            self.dense_skipped += 1
+            docs = []
+            for rank, (row, score) in enumerate(hits[:self.k]):
+                doc = self.index.document(row, 1 / (self.rrf_k + rank + 1))
+                doc.metadata.update(lexical_score=score, retrieval="lexical")
+                docs.append(doc)
+            return docs
+
+        self.dense_calls += 1
+        fused = {}  # key -> [doc, rrf score]
+        for rank, (row, score) in enumerate(hits):
+            doc = self.index.document(row)
+            doc.metadata["lexical_score"] = score
+            fused[_doc_key(doc)] = [doc, 1 / (self.rrf_k + rank + 1)]
+        dense_docs = self.dense.invoke(
+            query, config={"callbacks": run_manager.get_child()} if run_manager else None)
+        for rank, doc in enumerate(dense_docs):
+            entry = fused.setdefault(_doc_key(doc), [doc, 0.0])
+            entry[1] += 1 / (self.rrf_k + rank + 1)
+            if "score" in doc.metadata:
+                entry[0].metadata["dense_score"] = doc.metadata["score"]
+
+        ranked = sorted(fused.values(), key=lambda e: -e[1])[:self.k]
+        docs = []
+        for doc, score in ranked:
+            doc.metadata.update(score=score, retrieval="hybrid")
+            docs.append(doc)
+        return docs
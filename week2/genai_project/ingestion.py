@@ -0,0 +1,307 @@
+# ingestion.py
+"""
+Incremental Ingestion
+
+Keeps a persisted Chroma collection in sync with the documents on disk
+without re-embedding the whole corpus on every run.
+
+A JSON manifest next to the persist directory records, per source file,
+the hash of its content and the IDs of the chunks it produced. Chunk IDs
+are content hashes, so on the next run:
+- unchanged files are skipped (zero embedding calls)
+- changed files only embed the chunks that are new
+- kept chunks whose stored metadata changed are stored again, so an
+  edit above a chunk does not leave a stale start_index behind (the
+  text is unchanged, so CachedEmbeddings serves their vectors)
+- chunks that no longer exist (edited or deleted files) are removed
+
+New chunks are embedded and written in batches on a bounded thread pool
+(embed_and_store), through Chroma's add_texts with explicit IDs, which
+upserts.
+
+This replaces the "always create fresh ChromaDB" workaround for the
+stale/duplicate chunk problem found on Day 2.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path_for(persist_directory):
+    """Manifest lives next to the persist directory, e.g. ./chroma_db_manifest.json"""
+    return os.path.normpath(persist_directory) + "_manifest.json"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(source, chunks):
+    """
+    Stable IDs for the chunks of one file.
+
+    The ID depends on the source and the chunk text (plus an occurrence
+    counter for repeated text), not on the chunk position, so inserting a
+    paragraph at the top of a file does not invalidate every later chunk.
+    """
+    seen = {}
+    ids = []
+    for chunk in chunks:
+        digest = content_hash(f"{source}\0{chunk.page_content}")
+        seen[digest] = seen.get(digest, 0) + 1
+        ids.append(f"{digest[:32]}-{seen[digest]}")
+    return ids
+
+
+def moved_chunks(vectorstore, pairs):
+    """The (id, chunk) pairs whose stored metadata differs from the chunk's, or is missing."""
+    if not pairs:
+        return []
+    stored = vectorstore.get(ids=[cid for cid, _ in pairs], include=["metadatas"])
+    metadatas = dict(zip(stored["ids"], stored["metadatas"]))
+    return [(cid, chunk) for cid, chunk in pairs if metadatas.get(cid) != chunk.metadata]
+
+
+def load_manifest(path, config):
+    """Load the manifest, or start an empty one if missing or built with another config."""
+    empty = {"version": MANIFEST_VERSION, "config": config, "files": {}}
+    if not os.path.exists(path):
+        return empty
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("config") != config:
+        return dict(empty, stale_ids=_all_ids(manifest))
+    return manifest
+
+
+def save_manifest(path, manifest):
+    """Write atomically so a crash never leaves a half-written manifest."""
+    manifest = {k: v for k, v in manifest.items() if k != "stale_ids"}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+_versions = {}  # manifest path -> ((mtime_ns, size), version)
+
+
+def collection_version(manifest_path):
+    """
+    Content fingerprint of the ingested collection, or None if never ingested.
+
+    Changes only when a file's content or the config changes (not on every
+    manifest rewrite), so caches keyed on it survive no-op ingests. The
+    manifest is re-read only when its mtime/size changes.
+    """
+    try:
+        st = os.stat(manifest_path)
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _versions.get(manifest_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    fingerprint = json.dumps(
+        [manifest.get("config"), sorted((src, e["hash"]) for src, e in manifest["files"].items())]
+    )
+    version = content_hash(fingerprint)[:16]
+    _versions[manifest_path] = (stamp, version)
+    return version
+
+
+def _all_ids(manifest):
+    return [cid for entry in manifest.get("files", {}).values() for cid in entry["chunks"]]
+
+
+def embed_and_store(vectorstore, chunks, batch_size=32, max_workers=4, max_retries=3,
+                    backoff=1.0):
+    """
+    Embed and upsert (id, Document) pairs in concurrent batches.
+
+    Each batch goes through vectorstore.add_texts(..., ids=...) on a bounded
+    thread pool, so several Ollama round-trips are in flight at once (set
+    OLLAMA_NUM_PARALLEL on the server to match `max_workers`). The store's
+    embedding function does the embedding. A failed batch is retried with
+    exponential backoff; if it still fails, only that batch is skipped and
+    reported, the rest of the ingest carries on.
+
+    Args:
+        vectorstore: LangChain Chroma store to upsert into
+        chunks (iterable[tuple[str, Document]]): IDs and chunks, consumed lazily
+        batch_size (int): Chunks per embedding request
+        max_workers (int): Concurrent embedding requests
+        max_retries (int): Retries per batch before giving up on it
+        backoff (float): Base delay in seconds between retries (0 in tests)
+
+    Returns:
+        dict: chunks embedded, failed IDs, batches, seconds and chunks/sec
+    """
+    report = {"chunks": 0, "batches": 0, "failed_ids": [], "seconds": 0.0, "chunks_per_sec": 0.0}
+    start = time.perf_counter()
+
+    def store_batch(batch):
+        for attempt in range(max_retries + 1):
+            try:
+                return vectorstore.add_texts(
+                    [chunk.page_content for _, chunk in batch],
+                    metadatas=[chunk.metadata for _, chunk in batch],
+                    ids=[cid for cid, _ in batch],
+                )
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                delay = backoff * 2 ** attempt
+                print(f"⚠️ Embedding batch failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def collect(batch, future):
+        try:
+            future.result()
+        except Exception as e:
+            print(f"❌ Embedding batch of {len(batch)} chunks failed: {e}")
+            report["failed_ids"].extend(cid for cid, _ in batch)
+            return
+        report["chunks"] += len(batch)
+        report["batches"] += 1
+
+    # At most max_workers * 2 batches are read ahead of the ones being stored
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for batch in iter_batches(chunks, batch_size):
+            pending.append((batch, pool.submit(store_batch, batch)))
+            while pending and (pending[0][1].done() or len(pending) >= max_workers * 2):
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+
+    report["seconds"] = time.perf_counter() - start
+    if report["seconds"] > 0:
+        report["chunks_per_sec"] = report["chunks"] / report["seconds"]
+    return report
+
+
+def iter_batches(items, batch_size):
+    """Group any iterable into lists of at most `batch_size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sync_documents(vectorstore, docs, splitter, manifest_path, config=None,
+                   batch_size=32, max_workers=4, backoff=1.0):
+    """
+    Bring a Chroma collection in line with `docs`, embedding only what changed.
+
+    Args:
+        vectorstore: LangChain Chroma store (opened, not rebuilt)
+        docs (iterable[Document]): Full documents with a "source" in metadata
+        splitter: Text splitter used to chunk each document
+        manifest_path (str): Where the hash manifest is stored
+        config (dict): Anything that changes the chunks or vectors
+            (chunk size, overlap, embedding model). A different config
+            than the one in the manifest triggers a full rebuild.
+        batch_size (int): Chunks per embedding request (see embed_and_store)
+        max_workers (int): Concurrent embedding requests
+        backoff (float): Base retry delay of a failed batch (see embed_and_store)
+
+    Returns:
+        dict: Counts of files/chunks added, deleted and left unchanged,
+        plus the embedding stage report under "embedding". chunks_added
+        counts every chunk stored, the chunks_moved among them included
+    """
+    config = config or {}
+    manifest = load_manifest(manifest_path, config)
+    files = manifest["files"]
+    stats = {"files_unchanged": 0, "files_changed": 0, "files_removed": 0, "files_failed": 0,
+             "chunks_added": 0, "chunks_moved": 0, "chunks_deleted": 0}
+
+    # Manifest says we have chunks but the collection is empty → it was wiped
+    if files and not vectorstore.get(limit=1, include=[])["ids"]:
+        files.clear()
+
+    # No manifest yet: anything already in the collection is untracked
+    # (e.g. duplicates from old from_documents runs) and must go
+    if not os.path.exists(manifest_path):
+        untracked = vectorstore.get(include=[])["ids"]
+        if untracked:
+            vectorstore.delete(ids=untracked)
+            stats["chunks_deleted"] += len(untracked)
+
+    stale_ids = manifest.pop("stale_ids", [])
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        stats["chunks_deleted"] += len(stale_ids)
+
+    seen_sources = set()
+    changed = {}  # source -> new manifest entry, committed once its chunks are stored
+
+    def new_chunks():
+        for doc in docs:
+            source = doc.metadata["source"]
+            seen_sources.add(source)
+            file_hash = content_hash(doc.page_content)
+            previous = files.get(source)
+            if previous and previous["hash"] == file_hash:
+                stats["files_unchanged"] += 1
+                continue
+
+            chunks = splitter.split_documents([doc])
+            ids = chunk_ids(source, chunks)
+            old_ids = set(previous["chunks"]) if previous else set()
+            changed[source] = {"hash": file_hash, "chunks": ids,
+                               "previous": sorted(old_ids)}
+            for cid, chunk in zip(ids, chunks):
+                if cid not in old_ids:
+                    yield cid, chunk
+            moved = moved_chunks(vectorstore, [(cid, chunk) for cid, chunk in zip(ids, chunks)
+                                               if cid in old_ids])
+            stats["chunks_moved"] += len(moved)
+            yield from moved
+
+    try:
+        report = embed_and_store(vectorstore, new_chunks(), batch_size=batch_size,
+                                 max_workers=max_workers, backoff=backoff)
+        stats["embedding"] = report
+        stats["chunks_added"] = report["chunks"]
+        failed = set(report["failed_ids"])
+
+        for source, entry in changed.items():
+            previous = entry.pop("previous")
+            if failed.intersection(entry["chunks"]):
+                # No file hash, so the next run retries this file; but track every
+                # chunk now in the collection, so a later edit or delete removes them
+                stored = [cid for cid in entry["chunks"] if cid not in failed]
+                files[source] = {"hash": None, "chunks": sorted(set(previous) | set(stored))}
+                stats["files_failed"] += 1
+                continue
+            removed = sorted(set(previous) - set(entry["chunks"]))
+            if removed:
+                vectorstore.delete(ids=removed)
+            files[source] = entry
+            stats["files_changed"] += 1
+            stats["chunks_deleted"] += len(removed)
+
+        for source in sorted(set(files) - seen_sources):
+            removed = files.pop(source)["chunks"]
+            if removed:
+                vectorstore.delete(ids=removed)
+            stats["files_removed"] += 1
+            stats["chunks_deleted"] += len(removed)
+    finally:
+        # Record whatever was synced, even if the run stopped midway
+        save_manifest(manifest_path, manifest)
+
+    return stats
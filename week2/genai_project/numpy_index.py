@@ -0,0 +1,321 @@
+# numpy_index.py
+"""
+In-Process NumPy Vector Index
+
+Alternative retriever backend for small and medium collections. Instead
+of going through Chroma's HNSW and SQLite layers for every question:
+
+- Embeddings live in one contiguous float32 matrix (unit-normalized),
+  saved as a .npy file and memory-mapped on load — nothing is copied into
+  RAM until pages are touched, and start-up is instant.
+- Cosine top-k is a single matmul plus np.argpartition.
+- Ids, texts and metadata are parallel arrays/columns indexed by row.
+- Optionally the first pass runs on compressed codes (float16, int8 or
+  product quantization, see quantization.py) held in RAM, and only the
+  top candidates are re-scored against the float32 rows on disk.
+
+The index is exported from the persisted Chroma collection, which stays
+the source of truth for ingestion; RagPipeline(backend="numpy") re-exports
+whenever the collection version changes. The export pages through the
+collection and writes the float32 rows straight into the memory-mapped
+file, so the full matrix never has to fit in RAM.
+
+Usage:
+    python numpy_index.py        # export ./chroma_db and compare search latency
+"""
+import json
+import os
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from quantization import CODECS, STORAGES, make_codec
+from rag_tracing import stage_span
+
+VECTORS_FILE = "vectors.npy"  # saves from before meta.json named its files
+CODES_FILE = "codes.npz"
+META_FILE = "meta.json"
+DEFAULT_RESCORE = 4
+PAGE_ROWS = 10_000  # chunks read from Chroma per get() during an export
+
+
+def index_path_for(persist_directory):
+    """Where the NumPy export of a Chroma collection lives."""
+    return os.path.normpath(persist_directory) + "_numpy"
+
+
+def unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+class NumpyVectorIndex:
+    """
+    Brute-force cosine index over a float32 matrix.
+
+    Args:
+        vectors: (n, dim) array, rows unit-normalized (or a read-only memmap)
+        ids (list[str]): Chunk ids, one per row
+        texts (list[str]): Chunk contents, one per row
+        metadata (dict[str, list]): Metadata columns, each with one value per
+            row (None where a chunk lacks the key)
+        version: Collection version the index was exported from
+        codec: Fitted quantization codec for the first pass, or None to
+            search the float32 matrix directly
+        rescore (int): With a codec, k × rescore candidates are re-scored
+            at full precision (0 = trust the approximate scores)
+
+    Example:
+        >>> index = NumpyVectorIndex.export_chroma(vectorstore, "./chroma_db_numpy")
+        >>> index = NumpyVectorIndex.load("./chroma_db_numpy")   # memory-mapped
+        >>> index.search(query_vector, k=3)
+        >>> index.with_storage("int8").save("./chroma_db_numpy")  # ¼ of the RAM
+    """
+
+    def __init__(self, vectors, ids, texts, metadata=None, version=None, codec=None,
+                 rescore=DEFAULT_RESCORE):
+        self.vectors = vectors
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadata = metadata or {}
+        self.version = version
+        self.codec = codec
+        self.rescore = rescore
+        if len(self.ids) != len(self.vectors) or len(self.texts) != len(self.vectors):
+            raise ValueError("vectors, ids and texts must have one entry per row")
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ── Building ───────────────────────────────────────────────
+    @staticmethod
+    def _columns(metadatas):
+        keys = list(dict.fromkeys(key for m in metadatas for key in (m or {})))
+        return {key: [(m or {}).get(key) for m in metadatas] for key in keys}
+
+    @classmethod
+    def from_records(cls, ids, texts, metadatas, embeddings, version=None):
+        """Build from row-oriented records; metadata dicts become columns."""
+        vectors = unit_rows(embeddings) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        return cls(vectors, ids, texts, cls._columns(metadatas), version=version)
+
+    @classmethod
+    def from_chroma(cls, vectorstore, version=None, path=None, page_size=PAGE_ROWS):
+        """
+        Export every chunk (with its stored embedding) from a Chroma collection.
+
+        Reads `page_size` chunks per request. With `path`, the unit rows
+        are written block by block into a new .npy file there and the index
+        is backed by that memmap; otherwise they are kept in RAM.
+        """
+        collection = vectorstore._collection
+        total = collection.count()
+        ids, texts, metadatas, vectors = [], [], [], None
+        for offset in range(0, total, page_size):
+            page = collection.get(limit=page_size, offset=offset,
+                                  include=["embeddings", "documents", "metadatas"])
+            if not len(page["ids"]):
+                break
+            block = unit_rows(page["embeddings"])
+            if vectors is None:
+                shape = (total, block.shape[1])
+                vectors = (np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+                           if path else np.empty(shape, dtype=np.float32))
+            vectors[len(ids):len(ids) + len(block)] = block
+            ids.extend(page["ids"])
+            texts.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+        if vectors is None:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+            if path:
+                np.save(path, vectors)
+        elif path:
+            vectors.flush()
+        return cls(vectors, ids, texts, cls._columns(metadatas), version=version)
+
+    @classmethod
+    def export_chroma(cls, vectorstore, directory, version=None, storage="float32",
+                      rescore=DEFAULT_RESCORE, page_size=PAGE_ROWS, **params):
+        """
+        from_chroma + with_storage + save without holding the float32 matrix
+        in RAM: the rows go straight into the next generation's vectors file.
+        Returns the saved index, memory-mapped.
+        """
+        os.makedirs(directory, exist_ok=True)
+        generation = uuid.uuid4().hex[:12]
+        path = os.path.join(directory, f"vectors-{generation}.npy")
+        index = cls.from_chroma(vectorstore, version=version, path=path, page_size=page_size)
+        index.with_storage(storage, rescore=rescore, **params)._publish(directory, generation)
+        return cls.load(directory)
+
+    # ── Storage modes ──────────────────────────────────────────
+    @property
+    def storage(self):
+        return self.codec.storage if self.codec else "float32"
+
+    def storage_params(self):
+        return self.codec.params() if hasattr(self.codec, "params") else {}
+
+    def with_storage(self, storage, rescore=DEFAULT_RESCORE, **params):
+        """Same rows, first pass on `storage` codes (fitted on the float32 vectors)."""
+        if storage not in STORAGES:
+            raise ValueError(f"storage must be one of {STORAGES}, got {storage!r}")
+        codec = None if storage == "float32" else make_codec(storage, self.vectors, **params)
+        return NumpyVectorIndex(self.vectors, self.ids, self.texts, self.metadata,
+                                version=self.version, codec=codec, rescore=rescore)
+
+    def memory_bytes(self):
+        """Bytes the search keeps in RAM; with a codec the float32 rows stay on disk."""
+        return self.codec.nbytes if self.codec else self.vectors.nbytes
+
+    # ── Persistence ────────────────────────────────────────────
+    def save(self, directory):
+        """
+        Write the arrays under new file names, then switch meta.json to them.
+
+        vectors-<generation>.npy (+ codes-<generation>.npz) are files no
+        reader has open, and meta.json, which names them, is replaced last,
+        atomically. A load never pairs new vectors with old ids, and a
+        process still searching a memory-mapped older generation keeps its
+        pages: those files are unlinked afterwards, never overwritten.
+        """
+        os.makedirs(directory, exist_ok=True)
+        generation = uuid.uuid4().hex[:12]
+        np.save(os.path.join(directory, f"vectors-{generation}.npy"),
+                np.ascontiguousarray(self.vectors))
+        self._publish(directory, generation)
+
+    def _publish(self, directory, generation):
+        """Write the codes next to vectors-<generation>.npy, then switch meta.json."""
+        files = {"vectors": f"vectors-{generation}.npy"}
+        if self.codec:
+            files["codes"] = f"codes-{generation}.npz"
+            np.savez(os.path.join(directory, files["codes"]), **self.codec.arrays())
+        meta_path = os.path.join(directory, META_FILE)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"version": self.version, "storage": self.storage,
+                       "storage_params": self.storage_params(), "rescore": self.rescore,
+                       "files": files, "ids": self.ids, "texts": self.texts,
+                       "metadata": self.metadata}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        for name in os.listdir(directory):
+            if name.startswith(("vectors", "codes")) and name not in files.values():
+                os.remove(os.path.join(directory, name))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        files = meta.get("files", {"vectors": VECTORS_FILE, "codes": CODES_FILE})
+        vectors = np.load(os.path.join(directory, files["vectors"]), mmap_mode="r" if mmap else None)
+        codec = None
+        storage = meta.get("storage", "float32")
+        if storage != "float32":
+            with np.load(os.path.join(directory, files["codes"])) as arrays:
+                codec = CODECS[storage].from_arrays(dict(arrays), **meta.get("storage_params", {}))
+        return cls(vectors, meta["ids"], meta["texts"], meta["metadata"], version=meta["version"],
+                   codec=codec, rescore=meta.get("rescore", DEFAULT_RESCORE))
+
+    @staticmethod
+    def stored_info(directory):
+        """{"version", "storage"} of a saved index, or {} if there is none."""
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+            return {"version": meta["version"], "storage": meta.get("storage", "float32")}
+        except (FileNotFoundError, ValueError, KeyError):
+            return {}
+
+    # ── Search ─────────────────────────────────────────────────
+    def search_batch(self, query_vectors, k):
+        """(indices, scores) arrays of shape (n_queries, k), best first."""
+        queries = unit_rows(query_vectors)
+        k = min(k, len(self))
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if self.codec is None:
+            return self._top_k(queries @ self.vectors.T, k)
+
+        approx = self.codec.scores(queries)
+        if not self.rescore:
+            return self._top_k(approx, k)
+        candidates, _ = self._top_k(approx, min(k * self.rescore, len(self)))
+        rows = np.asarray(self.vectors[candidates])  # reads only these rows from disk
+        exact = np.einsum("qcd,qd->qc", rows, queries)
+        top, scores = self._top_k(exact, k)
+        return np.take_along_axis(candidates, top, axis=1), scores
+
+    @staticmethod
+    def _top_k(scores, k):
+        if k < scores.shape[1]:
+            idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top = np.take_along_axis(scores, idx, axis=1)
+        order = np.argsort(-top, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def search(self, query_vector, k):
+        """[(row, score), ...] for one query, best first."""
+        idx, scores = self.search_batch(query_vector, k)
+        return [(int(i), float(s)) for i, s in zip(idx[0], scores[0])]
+
+    def document(self, row, score=None):
+        metadata = {key: column[row] for key, column in self.metadata.items()
+                    if column[row] is not None}
+        if score is not None:
+            metadata["score"] = score
+        return Document(page_content=self.texts[row], metadata=metadata, id=self.ids[row])
+
+
+class NumpyRetriever(BaseRetriever):
+    """
+    Drop-in replacement for ScoredRetriever backed by a NumpyVectorIndex.
+
+    Returns the same Documents, with metadata["score"] = cosine similarity.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: NumpyVectorIndex
+    embeddings: Embeddings
+    k: int = 3
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with stage_span("embed_query", run_manager):
+            vector = self.embeddings.embed_query(query)
+        with stage_span("vector_search", run_manager):
+            hits = self.index.search(vector, self.k)
+        return [self.index.document(row, score) for row, score in hits]
+
+
+if __name__ == "__main__":
+    import time
+
+    from rag_pipeline import RagPipeline, questions
+
+    pipeline = RagPipeline(ingest=False)
+    started = time.perf_counter()
+    index = pipeline.numpy_index(refresh=True)
+    print(f"Exported {len(index)} chunks in {time.perf_counter() - started:.3f}s "
+          f"→ {index_path_for(pipeline.persist_directory)}")
+
+    query_vectors = pipeline.embeddings.embed_documents(questions)
+    rounds = 200
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for vector in query_vectors:
+            pipeline.vectorstore.similarity_search_by_vector_with_relevance_scores(vector, k=3)
+    chroma_ms = (time.perf_counter() - started) * 1000 / (rounds * len(query_vectors))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for vector in query_vectors:
+            index.search(vector, k=3)
+    numpy_ms = (time.perf_counter() - started) * 1000 / (rounds * len(query_vectors))
+    print(f"Chroma search: {chroma_ms:.3f} ms/query   NumPy search: {numpy_ms:.3f} ms/query")
@@ -0,0 +1,185 @@
+# ollama_pool.py
+"""
+Shared, Rate-Limited Ollama Client
+
+For running the LLM-backed tests under pytest-xdist without overloading
+the local model server:
+
+- One pooled HTTP transport per process (keep-alive connections) is shared
+  by the LLM and the embeddings. Pass it through client_kwargs.
+- SlotLimiter: a cross-process semaphore made of N lock files. Every
+  Ollama request holds a slot, across all xdist workers, until its
+  (streamed) response is fully read. N should match the server's
+  OLLAMA_NUM_PARALLEL: enough to keep it saturated, never more.
+
+Usage:
+    llm = OllamaLLM(model="llama3.2", client_kwargs=pooled_client_kwargs())
+    embeddings = get_embeddings("llama3.2", client_kwargs=pooled_client_kwargs())
+
+Settings (env): OLLAMA_TEST_CONCURRENCY (slots, default OLLAMA_NUM_PARALLEL
+or 2), OLLAMA_SLOT_DIR (lock file directory, default a temp dir per host).
+"""
+import asyncio
+import contextlib
+import functools
+import hashlib
+import os
+import random
+import tempfile
+import threading
+import time
+
+import httpx
+from filelock import FileLock, Timeout
+
+DEFAULT_SLOTS = int(os.environ.get("OLLAMA_TEST_CONCURRENCY",
+                                   os.environ.get("OLLAMA_NUM_PARALLEL", "2")))
+POLL_SECONDS = 0.02
+
+
+def _default_slot_dir():
+    host = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+    return os.environ.get("OLLAMA_SLOT_DIR", os.path.join(
+        tempfile.gettempdir(), "ollama-slots-" + hashlib.sha256(host.encode()).hexdigest()[:12]))
+
+
+class SlotLimiter:
+    """
+    At most `slots` holders at once, across threads and processes.
+
+    Example:
+        >>> limiter = SlotLimiter(2)
+        >>> with limiter.slot():
+        ...     llm.invoke(prompt)   # at most 2 of these run, in any worker
+    """
+
+    def __init__(self, slots=DEFAULT_SLOTS, directory=None):
+        self.slots = max(1, slots)
+        self.directory = directory or _default_slot_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.paths = [os.path.join(self.directory, f"slot-{i}.lock") for i in range(self.slots)]
+        self.waited_seconds = 0.0
+        self.acquired = 0
+        self._stats_lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a slot is free; returns the held lock (call .release())."""
+        started = time.perf_counter()
+        while True:
+            # start at a random slot so workers don't all contend for slot 0
+            offset = random.randrange(self.slots)
+            for i in range(self.slots):
+                # a fresh lock object per attempt: each holds its own file handle,
+                # so threads of one process exclude each other too
+                lock = FileLock(self.paths[(offset + i) % self.slots], thread_local=False)
+                try:
+                    lock.acquire(timeout=0)
+                except Timeout:
+                    continue
+                with self._stats_lock:
+                    self.waited_seconds += time.perf_counter() - started
+                    self.acquired += 1
+                return lock
+            time.sleep(POLL_SECONDS)
+
+    @contextlib.contextmanager
+    def slot(self):
+        lock = self.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+
+class _ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Response body that gives the slot back once it is read and closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    def _done(self):
+        if self._release:
+            self._release()
+            self._release = None
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+class LimitedTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Pooled transport for both ollama.Client and ollama.AsyncClient: each
+    request waits for a limiter slot and holds it until its response is closed.
+    """
+
+    def __init__(self, limiter=None, max_connections=None):
+        self.limiter = limiter or SlotLimiter()
+        size = max_connections or self.limiter.slots * 2
+        limits = httpx.Limits(max_connections=size, max_keepalive_connections=size,
+                              keepalive_expiry=60)
+        self._sync = httpx.HTTPTransport(limits=limits)
+        self._async = httpx.AsyncHTTPTransport(limits=limits)
+
+    def handle_request(self, request):
+        lock = self.limiter.acquire()
+        try:
+            response = self._sync.handle_request(request)
+        except BaseException:
+            lock.release()
+            raise
+        return self._wrap(response, lock.release)
+
+    async def handle_async_request(self, request):
+        lock = await asyncio.to_thread(self.limiter.acquire)
+        try:
+            response = await self._async.handle_async_request(request)
+        except BaseException:
+            lock.release()
+            raise
+        return self._wrap(response, lock.release)
+
+    @staticmethod
+    def _wrap(response, release):
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_ReleasingStream(response.stream, release),
+                              extensions=response.extensions)
+
+    def close(self):
+        self._sync.close()
+
+    async def aclose(self):
+        await self._async.aclose()
+
+
+@functools.lru_cache(maxsize=None)
+def shared_transport():
+    """The process-wide LimitedTransport."""
+    return LimitedTransport()
+
+
+def pooled_client_kwargs(timeout=300):
+    """client_kwargs for OllamaLLM / ChatOllama / OllamaEmbeddings."""
+    return {"transport": shared_transport(), "timeout": timeout}
+
+
+def limiter_stats():
+    limiter = shared_transport().limiter
+    return {"slots": limiter.slots, "requests": limiter.acquired,
+            "waited_seconds": round(limiter.waited_seconds, 3)}
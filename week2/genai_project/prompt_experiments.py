@@ -1,28 +1,18 @@
 # prompt_experiment.py
-import os
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
+from langchain_ollama import OllamaLLM
 from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
+from embedding_cache import get_embeddings
+from doc_loader import load_docs
+from rag_batch import answer_batch
+from answer_grader import grade_many
 
 # ── Setup (same as before) ───────────────────────────────────
 llm = OllamaLLM(model="llama3.2")
-embeddings = OllamaEmbeddings(model="llama3.2")
-
-def load_docs(folder="sampledocs"):
-    docs = []
-    for filename in os.listdir(folder):
-        if filename.endswith(".txt"):
-            with open(os.path.join(folder, filename)) as f:
-                content = f.read()
-                docs.append(Document(
-                    page_content=content,
-                    metadata={"source": filename}
-                ))
-    return docs
+embeddings = get_embeddings(model="llama3.2")  # disk-cached, shared across scripts
 
 # Create vector store (use optimal 500 chunk size from Day 3)
 splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
@@ -111,22 +101,23 @@ for prompt_name, prompt_template in prompts_to_test.items():
     
     # Test answerable questions
     print("\n--- ANSWERABLE QUESTIONS (should answer correctly) ---")
-    for q in answerable:
-        answer = rag_chain.invoke(q)
+    for result in answer_batch(rag_chain, answerable):
+        q, answer = result['question'], result['answer'] or ""
         print(f"\nQ: {q}")
         print(f"A: {answer[:120]}...")
         print("-"*60)
     
     # Test unanswerable questions
     print("\n--- UNANSWERABLE QUESTIONS (should say 'I don't know') ---")
-    for q in unanswerable:
-        answer = rag_chain.invoke(q)
+    results = answer_batch(rag_chain, unanswerable)
+    grades = grade_many([result['answer'] for result in results])
+    for result, abstained in zip(results, grades["abstain"]):
+        q, answer = result['question'], result['answer'] or ""
         print(f"\nQ: {q}")
         print(f"A: {answer[:120]}...")
         
         # Check if it properly abstained
-        abstain_phrases = ["don't know", "not available", "no information", "not in"]
-        if any(phrase in answer.lower() for phrase in abstain_phrases):
+        if abstained:
             print("✅ ABSTAINED (good)")
         else:
             print("❌ HALLUCINATED (bad)")
@@ -1,5 +1,7 @@
 # quality_report.py
 # Manual quality assessment based on your experiments
+import json
+import os
 
 print("="*70)
 print("RAG PIPELINE QUALITY REPORT")
@@ -53,6 +55,17 @@ for chunk_size, results in chunking_results.items():
     if chunk_size == 500:
         print("  → SELECTED as optimal chunk size")
 
+# Automated sweep results (python chunking_sweep.py), if available
+if os.path.exists("chunking_sweep_results.json"):
+    with open("chunking_sweep_results.json") as f:
+        sweep_rows = json.load(f)
+    print("\nAutomated sweep (top 5 by retrieval score):")
+    for row in sweep_rows[:5]:
+        answer_recall = row.get('answer_recall', '-')
+        print(f"  size={row['chunk_size']:<5} overlap={row['chunk_overlap']:<4} k={row['k']}  "
+              f"context recall {row['context_recall']:.3f}  precision {row['context_precision']:.3f}  "
+              f"answer recall {answer_recall}")
+
 print("\n" + "="*70)
 print("IMPROVEMENT STORY")
 print("="*70)
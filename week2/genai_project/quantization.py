@@ -0,0 +1,312 @@
+# quantization.py
+"""
+Quantized Vector Storage
+
+Compressed codes for the first-pass search of NumpyVectorIndex, so the
+in-RAM part of the index shrinks while the full-precision float32 matrix
+stays on disk (memory-mapped) for re-scoring the top candidates:
+
+    storage     bytes / vector (3072 dims)   how
+    float32     12288                        exact, the whole matrix in RAM
+    float16      6144                        half precision
+    int8         3076                        per-row scale + int8 codes
+    pq            384 (m=384)                product quantization, 256
+                                             centroids per sub-vector
+
+Search: approximate scores for all rows → top `k * rescore` candidates →
+exact cosine against the float32 rows of just those candidates.
+
+Codecs are fitted on a sample of at most FIT_ROWS rows and encode the
+rest in blocks, so a memory-mapped matrix is never copied into RAM whole.
+
+Only the vectors shrink. The ids, texts and metadata of every chunk are
+read from meta.json into RAM when the index is opened, so the sizes
+reported here are a lower bound on the index's memory, not all of it.
+
+Run this file for a recall@k vs. memory report on the golden dataset:
+    python quantization.py
+    python quantization.py --ks 1 3 5 --rescore 0 4 10 --pq-m 96 384
+"""
+import argparse
+import time
+
+import numpy as np
+
+BLOCK_ROWS = 65_536  # rows decoded per block, bounds the temporary float32 copy
+FIT_ROWS = 100_000   # rows a codec is fitted on; encoding still covers every row
+
+
+def _blocks(n):
+    for start in range(0, n, BLOCK_ROWS):
+        yield start, min(start + BLOCK_ROWS, n)
+
+
+class Float16Codec:
+    storage = "float16"
+
+    def fit(self, vectors):
+        return self
+
+    def encode(self, vectors):
+        self.codes = np.asarray(vectors, dtype=np.float16)
+        return self
+
+    def scores(self, queries):
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start, end in _blocks(len(self.codes)):
+            out[:, start:end] = queries @ self.codes[start:end].astype(np.float32).T
+        return out
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    fixed_nbytes = 0  # independent of the row count
+
+    def arrays(self):
+        return {"codes": self.codes}
+
+    @classmethod
+    def from_arrays(cls, arrays, **params):
+        codec = cls()
+        codec.codes = arrays["codes"]
+        return codec
+
+
+class Int8Codec:
+    """Scalar quantization: each row scaled so its largest |value| maps to 127."""
+    storage = "int8"
+
+    def fit(self, vectors):
+        return self
+
+    def encode(self, vectors):
+        self.scales = np.empty(len(vectors), dtype=np.float32)
+        self.codes = np.empty(np.shape(vectors), dtype=np.int8)
+        for start, end in _blocks(len(vectors)):
+            block = np.asarray(vectors[start:end], dtype=np.float32)
+            scales = (np.abs(block).max(axis=1) / 127).astype(np.float32)
+            safe = np.where(scales > 0, scales, 1)[:, None]
+            self.scales[start:end] = scales
+            self.codes[start:end] = np.clip(np.rint(block / safe), -127, 127)
+        return self
+
+    def scores(self, queries):
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start, end in _blocks(len(self.codes)):
+            block = self.codes[start:end].astype(np.float32)
+            out[:, start:end] = (queries @ block.T) * self.scales[start:end]
+        return out
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    fixed_nbytes = 0
+
+    def arrays(self):
+        return {"codes": self.codes, "scales": self.scales}
+
+    @classmethod
+    def from_arrays(cls, arrays, **params):
+        codec = cls()
+        codec.codes, codec.scales = arrays["codes"], arrays["scales"]
+        return codec
+
+
+class PQCodec:
+    """
+    Product quantization: the vector is cut into `m` sub-vectors, each
+    replaced by the id of its nearest of `ksub` k-means centroids (one
+    byte). Scores come from a per-query (m × ksub) lookup table.
+
+    Args:
+        m (int): Sub-vectors per vector; must divide the dimension.
+            None picks the largest divisor ≤ dim / 8 (8 dims per byte).
+        ksub (int): Centroids per sub-space (≤ 256, capped at the row count)
+        train_size (int): Rows sampled to train the codebooks
+        iterations (int): k-means iterations
+
+    Training is the slow part (about a minute for 10k × 3072-dim rows);
+    it runs once per export, encoding and search are fast.
+    """
+    storage = "pq"
+
+    def __init__(self, m=None, ksub=256, train_size=10_000, iterations=10, seed=0):
+        self.m = m
+        self.ksub = ksub
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+
+    @staticmethod
+    def default_m(dim):
+        return max(d for d in range(1, max(dim // 8, 1) + 1) if dim % d == 0)
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        self.m = self.m or self.default_m(dim)
+        if dim % self.m:
+            raise ValueError(f"m={self.m} must divide the embedding dimension {dim}")
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(n, min(n, self.train_size), replace=False)]
+        ksub = min(self.ksub, 256, len(sample))
+        sub = np.ascontiguousarray(sample.reshape(len(sample), self.m, dim // self.m).transpose(1, 0, 2))
+        self.codebooks = np.stack([self._kmeans(s, ksub, rng) for s in sub])  # (m, ksub, dsub)
+        return self
+
+    def _kmeans(self, points, ksub, rng):
+        centroids = points[rng.choice(len(points), ksub, replace=False)].copy()
+        for _ in range(self.iterations):
+            assign = self._nearest(points, centroids)
+            counts = np.bincount(assign, minlength=ksub)
+            sums = np.stack([np.bincount(assign, weights=points[:, d], minlength=ksub)
+                             for d in range(points.shape[1])], axis=1)
+            filled = counts > 0  # empty clusters keep their old centroid
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    @staticmethod
+    def _nearest(points, centroids):
+        # argmin ||p - c||² = argmin (||c||² - 2 p·c)
+        return np.argmin((centroids ** 2).sum(axis=1) - 2 * points @ centroids.T, axis=1)
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        m, _, dsub = self.codebooks.shape
+        self.codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for start, end in _blocks(len(vectors)):
+            sub = vectors[start:end].reshape(end - start, m, dsub)
+            for j in range(m):
+                self.codes[start:end, j] = self._nearest(sub[:, j], self.codebooks[j])
+        return self
+
+    def scores(self, queries):
+        m, _, dsub = self.codebooks.shape
+        # table[q, j, c] = <query_j, centroid_jc>
+        tables = np.einsum("qjd,jcd->qjc", queries.reshape(len(queries), m, dsub), self.codebooks)
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        cols = np.arange(m)
+        for start, end in _blocks(len(self.codes)):
+            codes = self.codes[start:end]
+            for q, table in enumerate(tables):
+                out[q, start:end] = table[cols, codes].sum(axis=1)
+        return out
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    @property
+    def fixed_nbytes(self):
+        return self.codebooks.nbytes
+
+    def arrays(self):
+        return {"codes": self.codes, "codebooks": self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, arrays, **params):
+        codec = cls(**params)
+        codec.codes, codec.codebooks = arrays["codes"], arrays["codebooks"]
+        codec.m = codec.codebooks.shape[0]
+        return codec
+
+    def params(self):
+        return {"m": self.m, "ksub": self.codebooks.shape[1]}
+
+
+CODECS = {codec.storage: codec for codec in (Float16Codec, Int8Codec, PQCodec)}
+STORAGES = ("float32",) + tuple(CODECS)
+
+
+def fit_sample(vectors, rows=None, seed=0):
+    """At most `rows` (FIT_ROWS) rows, in file order so a memmap is read front to back."""
+    rows = rows or FIT_ROWS
+    if len(vectors) <= rows:
+        return np.asarray(vectors, dtype=np.float32)
+    picked = np.sort(np.random.default_rng(seed).choice(len(vectors), rows, replace=False))
+    return np.asarray(vectors[picked], dtype=np.float32)
+
+
+def make_codec(storage, vectors, **params):
+    """Fit the named codec on a sample of `vectors`, then encode all of them."""
+    if storage not in CODECS:
+        raise ValueError(f"storage must be one of {tuple(CODECS)}, got {storage!r}")
+    return CODECS[storage](**params).fit(fit_sample(vectors)).encode(vectors)
+
+
+# ── Recall vs. memory report ─────────────────────────────────
+def recall_report(index, query_vectors, ks=(1, 3, 5), rescores=(0, 4),
+                  configs=(("float16", {}), ("int8", {}), ("pq", {}))):
+    """
+    recall@k of each storage mode against exact float32 search, with the
+    in-RAM size of the vector storage and its projection to one million
+    chunks (chunk texts and metadata not included).
+    """
+    max_k = max(ks)
+    exact_idx, _ = index.with_storage("float32").search_batch(query_vectors, max_k)
+    dim = index.vectors.shape[1]
+    rows = []
+    for storage, params in (("float32", {}),) + tuple(configs):
+        quantized = index.with_storage(storage, **params)
+        for rescore in ((0,) if storage == "float32" else rescores):
+            quantized.rescore = rescore
+            started = time.perf_counter()
+            idx, _ = quantized.search_batch(query_vectors, max_k)
+            ms = (time.perf_counter() - started) * 1000 / len(query_vectors)
+            row = {"storage": storage, **quantized.storage_params(), "rescore": rescore}
+            for k in ks:
+                hits = [len(set(a[:k]) & set(e[:k])) / min(k, len(e)) for a, e in zip(idx, exact_idx)]
+                row[f"recall@{k}"] = round(float(np.mean(hits)), 4)
+            fixed = quantized.codec.fixed_nbytes if quantized.codec else 0
+            bytes_per_vector = (quantized.memory_bytes() - fixed) / len(index)
+            row.update({
+                "ms_per_query": round(ms, 3),
+                "ram_mb": round(quantized.memory_bytes() / 2**20, 3),
+                "bytes_per_vector": round(bytes_per_vector, 1),
+                "fixed_mb": round(fixed / 2**20, 3),  # e.g. PQ codebooks
+                "ram_gb_per_million": round((bytes_per_vector * 1e6 + fixed) / 2**30, 2),
+                "compression": round(4 * dim / bytes_per_vector, 1),
+            })
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs. memory for quantized index storage")
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[0, 4],
+                        help="candidates re-scored at full precision = k × rescore (0 = off)")
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[None],
+                        help="PQ sub-vectors (default: dim / 8)")
+    args = parser.parse_args()
+
+    from golden_dataset import golden_data, golden_paraphrases, golden_near_misses
+    from rag_pipeline import RagPipeline
+
+    pipeline = RagPipeline(ingest=False, backend="numpy")
+    index = pipeline.retriever.index
+    queries = golden_data['question'] + golden_paraphrases + golden_near_misses
+    query_vectors = pipeline.embeddings.embed_documents(queries)
+    configs = (("float16", {}), ("int8", {})) + tuple(("pq", {"m": m}) for m in args.pq_m)
+
+    print("="*60)
+    print(f"RECALL vs MEMORY ({len(index)} chunks × {index.vectors.shape[1]} dims, "
+          f"{len(queries)} golden queries)")
+    print("="*60)
+    rows = recall_report(index, query_vectors, ks=args.ks, rescores=args.rescore, configs=configs)
+    recall_cols = [f"recall@{k}" for k in args.ks]
+    print(f"{'Storage':<10} {'Rescore':<8} " + " ".join(f"{c:<10}" for c in recall_cols)
+          + f" {'Bytes/vec':<10} {'GB per 1M':<10} {'ms/query'}")
+    print("-"*60)
+    for row in rows:
+        print(f"{row['storage']:<10} {row['rescore']:<8} "
+              + " ".join(f"{row[c]:<10}" for c in recall_cols)
+              + f" {row['bytes_per_vector']:<10} {row['ram_gb_per_million']:<10} {row['ms_per_query']}")
+    print("\nFull-precision vectors stay on disk (memory-mapped) for re-scoring.")
+    print("RAM is vector storage only; chunk texts and metadata are loaded on top of it.")
+
+
+if __name__ == "__main__":
+    main()
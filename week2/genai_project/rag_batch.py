@@ -0,0 +1,83 @@
+# rag_batch.py
+"""
+Batch Question Answering
+
+Runs many questions through a RAG chain concurrently instead of one
+`rag_chain.invoke(q)` after another.
+
+- answer_batch: sync entry point (thread pool)
+- aanswer_batch: asyncio entry point (semaphore around chain.ainvoke)
+
+Both cap in-flight questions at `max_concurrency`, keep results in the
+same order as the questions, and time each question. One failing
+question is recorded in its result instead of aborting the whole batch.
+
+Note: Ollama only generates in parallel up to OLLAMA_NUM_PARALLEL on the
+server, so set it to at least `max_concurrency`.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def _result(question, answer, started, error=None):
+    return {
+        "question": question,
+        "answer": answer,
+        "seconds": time.perf_counter() - started,
+        "error": error,
+    }
+
+
+def answer_batch(chain, questions, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Answer questions concurrently (sync).
+
+    Args:
+        chain: Any runnable with .invoke(question), e.g. rag_chain
+        questions (list[str]): Questions to answer
+        max_concurrency (int): Max questions in flight at once
+
+    Returns:
+        list[dict]: One {"question", "answer", "seconds", "error"} per
+        question, in input order
+    """
+    def run(question):
+        started = time.perf_counter()
+        try:
+            return _result(question, chain.invoke(question), started)
+        except Exception as e:
+            return _result(question, None, started, error=str(e))
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        return list(pool.map(run, questions))
+
+
+async def aanswer_batch(chain, questions, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Asyncio version of answer_batch, using chain.ainvoke."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(question):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                return _result(question, await chain.ainvoke(question), started)
+            except Exception as e:
+                return _result(question, None, started, error=str(e))
+
+    return await asyncio.gather(*(run(q) for q in questions))
+
+
+def summarize(results):
+    """Per-batch timing summary for printing after a run."""
+    seconds = sorted(r["seconds"] for r in results)
+    if not seconds:
+        return {"questions": 0, "errors": 0, "mean_seconds": 0.0, "max_seconds": 0.0}
+    return {
+        "questions": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "mean_seconds": sum(seconds) / len(seconds),
+        "max_seconds": seconds[-1],
+    }
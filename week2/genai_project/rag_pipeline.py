@@ -27,22 +27,6 @@ Date: [Today's Date - February 2025]
 Purpose: GenAI Testing Portfolio Project
 """
 # rag_pipeline.py — fixed version
-import os
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-
-# ── 1. LLM ──────────────────────────────────────────────────
-llm = OllamaLLM(model="llama3.2")
-
-# ── 2. Embeddings ────────────────────────────────────────────
-embeddings = OllamaEmbeddings(model="llama3.2")
-
-# ── 3. Load documents ────────────────────────────────────────
 """
 RAG Pipeline - Main Implementation
 
@@ -51,69 +35,56 @@ This module implements a Retrieval-Augmented Generation pipeline using:
 - ChromaDB for vector storage
 - Ollama (LLaMA 3.2) for generation and embeddings
 
+Importing it has no side effects: build a RagPipeline once and reuse it
+(rag_server.py keeps one warm), or run this file for the demo questions.
+
 Author: [Shubhangi Ajegaonkar]
 Date: [25-02-2026]
 Purpose: GenAI Testing Learning Project
 """
-def load_docs(folder="sampledocs"):
-    """
-    Load all text files from a directory into Document objects.
-    
-    Args:
-        folder (str): Path to directory containing .txt files
-        
-    Returns:
-        list[Document]: List of LangChain Document objects with content and metadata
-        
-    Example:
-        >>> docs = load_docs("sample_docs")
-        >>> len(docs)
-        3
-    """
-    docs = []
-    for filename in os.listdir(folder):
-        if filename.endswith(".txt"):
-            with open(os.path.join(folder, filename)) as f:
-                content = f.read()
-                docs.append(Document(
-                    page_content=content,
-                    metadata={"source": filename}
-                ))
-    print(f"Loaded {len(docs)} documents")
-    return docs
-
-# ── 4. Chunk ─────────────────────────────────────────────────
+from collections import deque
+
+from langchain_ollama import OllamaLLM
+from langchain_community.vectorstores import Chroma
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+from embedding_cache import get_embeddings
+from doc_loader import iter_docs
+from ingestion import sync_documents, manifest_path_for, collection_version
+from numpy_index import NumpyVectorIndex, NumpyRetriever, index_path_for
+from hybrid_retriever import BM25Index, HybridRetriever, bm25_path_for
+from context_builder import ContextBuilder, DEFAULT_MAX_TOKENS
+from rag_batch import answer_batch, aanswer_batch, summarize
+from streaming import TokenStream, summarize_streams
+from rag_tracing import StageTracer, TRACE_PATH, stage_span
+
+# ── 1. Configuration ─────────────────────────────────────────
+MODEL = "llama3.2"
+DOCS_FOLDER = "sampledocs"
+PERSIST_DIRECTORY = "./chroma_db"
+COLLECTION_NAME = "rag_fresh"
+BACKENDS = ("chroma", "numpy")
+
 # Chunking configuration based on Day 3 experiments
 # 200 tokens: 40% failure due to fragmentation
 # 500 tokens: 100% success (optimal)
 # 1000 tokens: Success but verbose answers
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,    # Optimal size from systematic testing
-    chunk_overlap=50    # Prevents cutting context mid-sentence
-)
-
-raw_docs = load_docs()
-chunks = splitter.split_documents(raw_docs)
-print(f"Split into {len(chunks)} chunks")
-
-# ── 5. FIX: Always create fresh ChromaDB (no stale data) ─────
-# Delete old collection if exists, then recreate cleanly
-vectorstore = Chroma.from_documents(
-    chunks,
-    embeddings,
-    collection_name="rag_fresh",          # named collection
-    persist_directory="./chroma_db",
-    collection_metadata={"hnsw:space": "cosine"}  # cosine similarity
-)
-retriever = vectorstore.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 3}
-)
+CHUNK_SIZE = 500       # Optimal size from systematic testing
+CHUNK_OVERLAP = 50     # Prevents cutting context mid-sentence
+TOP_K = 3
+# add_start_index lets the context builder merge overlapping chunks
+SPLITTER_CONFIG = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "add_start_index": True}
+CONTEXT_TOKENS = DEFAULT_MAX_TOKENS  # prompt context budget (context_builder.py)
 
 # Strong guardrail system prompt
 # Reduces hallucination from 67% → 0% (Day 4 experiment)
 # Explicitly forbids code generation (caught by adversarial tests)
-# ── 6. Prompt ────────────────────────────────────────────────
+# ── 2. Prompt ────────────────────────────────────────────────
 prompt = ChatPromptTemplate.from_template("""
 ONLY answer using the context below.
 If not in context, say: "I don't know based on available information."
@@ -121,19 +92,288 @@ Context: {context}
 Question: {question}
 """)
 
-# ── 7. Format chunks ─────────────────────────────────────────
+
+# ── 3. Retrieval with scores ─────────────────────────────────
+def relevance_score_fn(vectorstore):
+    """
+    The store's distance → relevance mapping. That lookup is private
+    LangChain API, so fall back to cosine (1 - distance, how our
+    collections are created) when a store or version does not provide it.
+    """
+    select = getattr(vectorstore, "_select_relevance_score_fn", None)
+    if select is not None:
+        try:
+            return select()
+        except NotImplementedError:
+            pass
+    return lambda distance: 1.0 - distance
+
+
+class ScoredRetriever(BaseRetriever):
+    """
+    Top-k similarity search that keeps the relevance score.
+
+    Works like vectorstore.as_retriever(search_kwargs={"k": k}), but each
+    returned chunk carries metadata["score"] (cosine similarity, higher is
+    better) so callers can see how well it matched without searching again.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: VectorStore
+    k: int = TOP_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        search_by_vector = getattr(self.vectorstore,
+                                   "similarity_search_by_vector_with_relevance_scores", None)
+        if search_by_vector is None:  # other stores: the query embedding is timed with the search
+            with stage_span("vector_search", run_manager):
+                hits = self.vectorstore.similarity_search_with_relevance_scores(query, k=self.k)
+        else:
+            # Chroma: embed and search as two steps (same result as
+            # similarity_search_with_relevance_scores) so tracing can time them apart
+            with stage_span("embed_query", run_manager):
+                vector = self.vectorstore.embeddings.embed_query(query)
+            with stage_span("vector_search", run_manager):
+                distances = search_by_vector(vector, k=self.k)
+            relevance = relevance_score_fn(self.vectorstore)
+            hits = [(doc, relevance(distance)) for doc, distance in distances]
+        docs = []
+        for doc, score in hits:
+            doc.metadata["score"] = score
+            docs.append(doc)
+        return docs
+
+
+# ── 4. Format chunks ─────────────────────────────────────────
 def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
-# ── 8. RAG chain ─────────────────────────────────────────────
-rag_chain = (
-    {"context": retriever | format_docs, "question": RunnablePassthrough()}
-    | prompt
-    | llm
-    | StrOutputParser()
-)
 
-# ── 9. Questions ─────────────────────────────────────────────
+def to_sources(docs):
+    """Retrieved chunks as plain dicts: what the model saw and where it came from."""
+    return [
+        {
+            "source": doc.metadata.get("source"),
+            "score": doc.metadata.get("score"),
+            "content": doc.page_content,
+            "metadata": {k: v for k, v in doc.metadata.items() if k not in ("source", "score")},
+        }
+        for doc in docs
+    ]
+
+
+# ── 5. RAG chains ────────────────────────────────────────────
+def build_rag_chain(retriever, llm, prompt=prompt, format_context=format_docs):
+    return (
+        {"context": retriever | format_context, "question": RunnablePassthrough()}
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+
+
+def build_rag_chain_with_sources(retriever, llm, prompt=prompt, format_context=format_docs):
+    """
+    Same chain, but returns {"answer": str, "sources": [...]}.
+
+    Retrieval runs once: the retrieved chunks feed the prompt and are
+    returned alongside the answer, so evaluation and debugging score the
+    exact contexts the model saw instead of retrieving a second time.
+    """
+    generate = (
+        (lambda x: {"context": format_context(x["docs"]), "question": x["question"]})
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+    return (
+        {"docs": retriever, "question": RunnablePassthrough()}
+        | RunnablePassthrough.assign(answer=generate)
+        | (lambda x: {"answer": x["answer"], "sources": to_sources(x["docs"])})
+    )
+
+
+class RagPipeline:
+    """
+    LLM, embeddings, persisted Chroma collection and RAG chain, built once.
+
+    Args:
+        ingest (bool): Sync the collection with `docs_folder` first. Leave
+            False to serve an already-ingested collection read-only.
+        model (str): Ollama model for generation and embeddings
+        k (int): Chunks retrieved per question
+        backend (str): "chroma" searches the collection directly; "numpy"
+            answers from an in-process, memory-mapped export of it
+            (see numpy_index.py), re-exported whenever ingest() changes the
+            collection
+        storage (str): NumPy backend only — "float32", or "float16" / "int8" /
+            "pq" codes in RAM with float32 re-scoring from disk (quantization.py)
+        hybrid (bool): Fuse BM25 keyword matches with the dense results
+            (hybrid_retriever.py); the BM25 index is built at ingest time
+            (only when hybrid)
+        skip_dense_coverage (float | None): Hybrid only — answer from BM25
+            alone, without embedding the question, when the best keyword
+            match covers at least this share of the question (e.g. 0.8)
+        context_tokens (int | None): Token budget for the prompt context;
+            overlapping chunks are merged and duplicates dropped first
+            (context_builder.py). None joins the chunks as-is.
+        tracer (StageTracer | None): Record per-stage latency of every chain
+            call (rag_tracing.py). Defaults to one writing to $RAG_TRACE_PATH
+            when that is set; otherwise no tracing and no overhead.
+        llm, embeddings: Prebuilt clients, e.g. behind a cassette transport
+            in tests; default OllamaLLM(model) and the disk-cached
+            get_embeddings(model)
+
+    Example:
+        >>> pipeline = RagPipeline()
+        >>> pipeline.invoke("What is the refund policy?")
+        >>> pipeline.answer_batch(questions, max_concurrency=4)
+    """
+
+    def __init__(self, ingest=True, model=MODEL, docs_folder=DOCS_FOLDER,
+                 persist_directory=PERSIST_DIRECTORY, collection_name=COLLECTION_NAME,
+                 k=TOP_K, backend="chroma", storage="float32", hybrid=False,
+                 skip_dense_coverage=None, context_tokens=CONTEXT_TOKENS, tracer=None,
+                 llm=None, embeddings=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+        self.model = model
+        self.backend = backend
+        self.storage = storage
+        self.hybrid = hybrid
+        self.docs_folder = docs_folder
+        self.persist_directory = persist_directory
+        self.llm = llm or OllamaLLM(model=model)
+        # disk-cached, shared across scripts
+        self.embeddings = embeddings or get_embeddings(model=model)
+        self.splitter = RecursiveCharacterTextSplitter(**SPLITTER_CONFIG)
+        # Opened, never rebuilt: ingestion only embeds what changed
+        self.vectorstore = Chroma(
+            collection_name=collection_name,          # named collection
+            embedding_function=self.embeddings,
+            persist_directory=persist_directory,
+            collection_metadata={"hnsw:space": "cosine"}  # cosine similarity
+        )
+        self.retriever = None
+        self.ingest_stats = self.ingest() if ingest else None
+        if backend == "numpy":
+            self.retriever = NumpyRetriever(index=self.numpy_index(), embeddings=self.embeddings, k=k)
+        else:
+            self.retriever = ScoredRetriever(vectorstore=self.vectorstore, k=k)
+        if hybrid:
+            self.retriever = HybridRetriever(index=self.bm25_index(), dense=self.retriever, k=k,
+                                             skip_dense_coverage=skip_dense_coverage)
+        self.stream_history = deque(maxlen=1000)  # metrics of recent streamed answers
+        self.context_builder = ContextBuilder(context_tokens) if context_tokens else None
+        format_context = self.context_builder or format_docs
+        self.rag_chain = build_rag_chain(self.retriever, self.llm, format_context=format_context)
+        self.rag_chain_with_sources = build_rag_chain_with_sources(
+            self.retriever, self.llm, format_context=format_context)
+        self.tracer = tracer or (StageTracer(TRACE_PATH) if TRACE_PATH else None)
+        if self.tracer:
+            self.rag_chain = self.rag_chain.with_config(callbacks=[self.tracer])
+            self.rag_chain_with_sources = self.rag_chain_with_sources.with_config(
+                callbacks=[self.tracer])
+
+    # ── 6. Incremental ingestion (no stale data, no full re-embed) ──
+    def ingest(self, batch_size=32, max_workers=4):
+        """
+        Sync the collection with the docs folder.
+
+        Only chunks whose content changed since the last run are embedded
+        (batch_size chunks per request, max_workers requests in flight —
+        match OLLAMA_NUM_PARALLEL); chunks of edited/deleted files are removed.
+        With hybrid=True the BM25 index is rebuilt alongside whenever the
+        content changed. The retrievers are moved to the new NumPy / BM25
+        index generation.
+        """
+        stats = sync_documents(
+            self.vectorstore,
+            iter_docs(self.docs_folder),   # streamed: one file in memory at a time
+            self.splitter,
+            manifest_path_for(self.persist_directory),
+            config=dict(SPLITTER_CONFIG, embedding_model=self.model),
+            batch_size=batch_size,
+            max_workers=max_workers,
+        )
+        if self.hybrid:
+            self.bm25_index()
+        if self.retriever is not None:
+            self._reload_indexes()
+        return stats
+
+    def _reload_indexes(self):
+        """Swap the retrievers' in-memory indexes for the current exports."""
+        retriever = self.retriever
+        if self.hybrid:
+            retriever.index = self.bm25_index()
+            retriever = retriever.dense
+        if self.backend == "numpy":
+            retriever.index = self.numpy_index()
+
+    def chunk_count(self):
+        return self.vectorstore._collection.count()
+
+    def collection_version(self):
+        """Changes whenever ingestion changes the indexed content."""
+        return collection_version(manifest_path_for(self.persist_directory))
+
+    def numpy_index(self, refresh=False):
+        """Memory-mapped NumPy export of the collection, re-exported if stale."""
+        directory = index_path_for(self.persist_directory)
+        version = self.collection_version()
+        wanted = {"version": version, "storage": self.storage}
+        if refresh or version is None or NumpyVectorIndex.stored_info(directory) != wanted:
+            return NumpyVectorIndex.export_chroma(self.vectorstore, directory, version=version,
+                                                  storage=self.storage)
+        return NumpyVectorIndex.load(directory)
+
+    def bm25_index(self, refresh=False):
+        """Keyword index over the collection, rebuilt if stale."""
+        directory = bm25_path_for(self.persist_directory)
+        version = self.collection_version()
+        if refresh or version is None or BM25Index.stored_version(directory) != version:
+            BM25Index.from_chroma(self.vectorstore, version=version).save(directory)
+        return BM25Index.load(directory)
+
+    # ── 7. Query API ─────────────────────────────────────────
+    def invoke(self, question):
+        return self.rag_chain.invoke(question)
+
+    def answer_with_sources(self, question):
+        """Answer plus the retrieved chunks, scores and sources from a single retrieval."""
+        return self.rag_chain_with_sources.invoke(question)
+
+    def stream(self, question, stop_on_abstain=False):
+        """
+        Tokens as Ollama produces them (a TokenStream: iterate, then read
+        .metrics for TTFT and tokens/sec). stop_on_abstain closes the
+        request once the abstention sentence is out.
+        """
+        return TokenStream(self.rag_chain.stream(question), stop_on_abstain,
+                           on_finish=self.stream_history.append)
+
+    def astream(self, question, stop_on_abstain=False):
+        """Async variant: `async for token in pipeline.astream(q)`."""
+        return TokenStream(self.rag_chain.astream(question), stop_on_abstain,
+                           on_finish=self.stream_history.append)
+
+    def stream_summary(self):
+        """TTFT percentiles and decode speed over the recent streamed requests."""
+        return summarize_streams(list(self.stream_history))
+
+    def trace_summary(self):
+        """Per-stage latency histograms (p50/p95/p99 ms), or None when not tracing."""
+        return self.tracer.summary() if self.tracer else None
+
+    def answer_batch(self, questions, max_concurrency=4):
+        return answer_batch(self.rag_chain, questions, max_concurrency=max_concurrency)
+
+    async def aanswer_batch(self, questions, max_concurrency=4):
+        return await aanswer_batch(self.rag_chain, questions, max_concurrency=max_concurrency)
+
+
+# ── 8. Questions ─────────────────────────────────────────────
 questions = [
     "What is the refund policy?",
     "How many days of annual leave do employees get?",
@@ -143,18 +383,50 @@ questions = [
     "How long is maternity AND paternity leave combined?",
 ]
 
-print("\n" + "="*50)
-for q in questions:
-    print(f"\nQ: {q}")
-    answer = rag_chain.invoke(q)
-    print(f"A: {answer}")
-    print("-"*40)
-
-# ── 10. Debug retrieval ──────────────────────────────────────
-print("\n" + "="*50)
-print("DEBUG — Chunks retrieved for 'refund policy':")
-print("="*50)
-for i, doc in enumerate(retriever.invoke("What is the refund policy?")):
-    print(f"\nChunk {i+1} from: {doc.metadata['source']}")
-    print(f"Content: {doc.page_content[:100]}...")
-    print("-"*40)
\ No newline at end of file
+
+def main():
+    pipeline = RagPipeline()
+    stats = dict(pipeline.ingest_stats)
+    embed_report = stats.pop("embedding")
+    print(f"Ingestion: {stats}")
+    print(f"Embedded {embed_report['chunks']} chunks in {embed_report['seconds']:.1f}s "
+          f"({embed_report['chunks_per_sec']:.1f} chunks/sec)")
+    print(f"Embedding cache: {pipeline.embeddings.stats()}")
+
+    print("\n" + "="*50)
+    # Answered concurrently; results come back in question order
+    results = pipeline.answer_batch(questions, max_concurrency=4)
+    for result in results:
+        print(f"\nQ: {result['question']}")
+        print(f"A: {result['answer'] or result['error']}")
+        print(f"⏱️ {result['seconds']:.2f}s")
+        print("-"*40)
+    print(f"Batch timings: {summarize(results)}")
+
+    # Streamed: tokens print as they arrive; abstentions stop right away
+    print("\n" + "="*50)
+    for question in ["What happens in week 1 of onboarding?", "What is the CEO's name?"]:
+        print(f"\nQ: {question}\nA: ", end="")
+        stream = pipeline.stream(question, stop_on_abstain=True)
+        for token in stream:
+            print(token, end="", flush=True)
+        metrics = stream.metrics
+        print(f"\n⏱️ first token {metrics['ttft_seconds']}s, "
+              f"{metrics['tokens_per_sec']} tokens/sec, stopped early: {metrics['stopped_early']}")
+    print(f"Streaming: {pipeline.stream_summary()}")
+
+    # ── 9. Debug retrieval ───────────────────────────────────
+    # Same single pass that produced the answer — no second retrieval
+    print("\n" + "="*50)
+    print("DEBUG — Chunks retrieved for 'refund policy':")
+    print("="*50)
+    result = pipeline.answer_with_sources("What is the refund policy?")
+    print(f"A: {result['answer']}")
+    for i, source in enumerate(result["sources"]):
+        print(f"\nChunk {i+1} from: {source['source']} (score {source['score']:.3f})")
+        print(f"Content: {source['content'][:100]}...")
+        print("-"*40)
+
+
+if __name__ == "__main__":
+    main()
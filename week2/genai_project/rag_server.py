@@ -0,0 +1,362 @@
+# rag_server.py
+"""
+RAG Query Service
+
+Long-running HTTP server that opens the persisted Chroma collection once,
+keeps the RAG chain (and the Ollama model) warm, and answers questions
+without a cold start per question.
+
+Endpoints:
+    GET  /health   liveness — the process is up
+    GET  /ready    readiness — 200 once index and model are loaded, else 503
+    GET  /trace    with --trace: recent requests in Chrome trace format, one
+                   span per chain stage (open in ui.perfetto.dev)
+    POST /query    {"question": "..."}  → {"answer": "...", "seconds": ...}
+                   {"questions": [...]} → {"results": [...]}
+    POST /query/stream  {"question": "...", "stop_on_abstain": true}
+                   → NDJSON: {"token": "..."} lines, then {"done": true, "metrics": {...}}
+                   (answer cache hits arrive as one token, with "cache": tier)
+
+Concurrent requests are micro-batched: questions that arrive within
+`max_wait_ms` of each other are taken off the queue together, embedded
+with one Ollama call, and each is answered with rag_chain.invoke on a
+pool of `max_concurrency` threads. Streamed questions share the same
+`max_concurrency` limit. With --cache-threshold, repeated questions
+(streamed or not) are answered from the semantic answer cache (hit rates
+are reported by /ready). With --trace (or RAG_TRACE_PATH), every
+request's per-stage latency is appended to a JSONL file and /ready
+reports per-stage p50/p95/p99.
+
+Usage:
+    python rag_server.py --port 8000            # serve the existing index
+    python rag_server.py --ingest               # sync sampledocs first
+    python rag_server.py --backend numpy        # in-process NumPy retriever
+    python rag_server.py --backend numpy --storage int8
+    python rag_server.py --hybrid --skip-dense-coverage 0.8
+    python rag_server.py --trace rag_trace.jsonl
+    curl -s localhost:8000/trace > trace.json
+    curl -s localhost:8000/query -d '{"question": "What is the refund policy?"}'
+    curl -sN localhost:8000/query/stream -d '{"question": "What is the refund policy?"}'
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from answer_cache import SemanticAnswerCache, DEFAULT_TTL_SECONDS
+from quantization import STORAGES
+from rag_pipeline import BACKENDS, RagPipeline
+from rag_tracing import StageTracer, TRACE_PATH
+from streaming import TokenStream
+
+
+class MicroBatcher:
+    """
+    Collects questions from many request threads into small batches.
+
+    A collector thread waits for the first question, then keeps collecting
+    until `max_batch_size` questions are queued or `max_wait_ms` has passed.
+    The questions of a batch are embedded with one embed_documents call
+    (one Ollama request instead of one per question); the vectors land in
+    the embedding cache, so the retriever's and answer cache's embed_query
+    calls are cache hits. Each question is then answered with chain.invoke
+    on a pool of `max_concurrency` threads. The collector goes straight
+    back to the queue, so the pool, not the batch, bounds the questions in
+    flight and a new batch never waits for the previous one to finish.
+
+    Without `embeddings` there is nothing to share within a batch, so the
+    collector does not wait: `max_wait_ms` only applies when batching saves
+    embedding calls.
+
+    `slots` holds one permit per question being generated; /query/stream
+    takes the same permits, so streamed and batched questions together
+    never exceed `max_concurrency` requests to Ollama.
+
+    Not chain.batch: OllamaLLM generates the prompts of one batch call one
+    after another, so a batch of four took as long as four questions in a row.
+    """
+
+    def __init__(self, chain, embeddings=None, max_batch_size=8, max_wait_ms=10,
+                 max_concurrency=4):
+        self.chain = chain
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000 if embeddings is not None else 0
+        self.max_concurrency = max_concurrency
+        self.batches = 0
+        self.questions = 0
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="rag-answer")
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, question):
+        future = Future()
+        self._queue.put((question, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self.batches += 1
+            self.questions += len(batch)
+            self._embed([question for question, _ in batch])
+            for question, future in batch:
+                self._pool.submit(self._answer, question, future)
+
+    def _embed(self, questions):
+        if self.embeddings is None or len(questions) < 2:
+            return
+        try:
+            self.embeddings.embed_documents(questions)
+        except Exception:
+            pass  # each chain.invoke embeds its own question and reports the error
+
+    def _answer(self, question, future):
+        try:
+            with self.slots:
+                future.set_result(self.chain.invoke(question))
+        except Exception as e:
+            future.set_exception(e)
+
+
+class ServiceState:
+    """Everything the handlers need; filled in by the background loader."""
+
+    def __init__(self):
+        self.pipeline = None
+        self.batcher = None
+        self.cache = None
+        self.ready = False
+        self.error = None
+        self.started = time.time()
+
+    def load(self, ingest, max_batch_size, max_wait_ms, max_concurrency,
+             cache_threshold=None, cache_ttl=DEFAULT_TTL_SECONDS, backend="chroma",
+             storage="float32", hybrid=False, skip_dense_coverage=None, trace_path=None):
+        try:
+            print("🔧 Opening index and warming up model...")
+            tracer = StageTracer(trace_path) if trace_path else None
+            self.pipeline = RagPipeline(ingest=ingest, backend=backend, storage=storage,
+                                        hybrid=hybrid, skip_dense_coverage=skip_dense_coverage,
+                                        tracer=tracer)
+            # Warm-up: loads the model into Ollama memory and primes the chain
+            self.pipeline.invoke("What is the refund policy?")
+            chain = self.pipeline.rag_chain
+            if cache_threshold is not None:
+                self.cache = SemanticAnswerCache(
+                    chain, self.pipeline.embeddings,
+                    threshold=cache_threshold, ttl_seconds=cache_ttl,
+                    version_fn=self.pipeline.collection_version,
+                )
+                chain = self.cache
+            self.batcher = MicroBatcher(
+                chain,
+                embeddings=self.pipeline.embeddings,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+                max_concurrency=max_concurrency,
+            )
+            self.ready = True
+            print(f"✅ Ready: {self.pipeline.chunk_count()} chunks indexed")
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ Failed to load pipeline: {e}")
+
+    def readiness(self):
+        info = {"ready": self.ready, "uptime_seconds": round(time.time() - self.started, 1)}
+        if self.error:
+            info["error"] = self.error
+        if self.ready:
+            info.update({
+                "model": self.pipeline.model,
+                "backend": self.pipeline.backend,
+                "storage": self.pipeline.storage,
+                "hybrid": self.pipeline.hybrid,
+                "chunks": self.pipeline.chunk_count(),
+                "batches": self.batcher.batches,
+                "questions": self.batcher.questions,
+            })
+            if self.pipeline.hybrid:
+                retriever = self.pipeline.retriever
+                info["retrieval"] = {"dense": retriever.dense_calls,
+                                     "lexical_only": retriever.dense_skipped}
+            if self.pipeline.stream_history:
+                info["streaming"] = self.pipeline.stream_summary()
+            if self.cache:
+                info["answer_cache"] = self.cache.stats()
+            if self.pipeline.tracer:
+                info["stages"] = self.pipeline.trace_summary()
+        return info
+
+
+def make_handler(state):
+    class RagRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/ready":
+                self._send_json(200 if state.ready else 503, state.readiness())
+            elif self.path == "/trace":
+                tracer = state.pipeline.tracer if state.pipeline else None
+                if tracer is None:
+                    return self._send_json(404, {"error": "tracing is off (start with --trace)"})
+                self._send_json(200, tracer.chrome_trace())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _send_stream(self, payload):
+            """Tokens as NDJSON lines while they are generated (connection closes at the end)."""
+            question = payload.get("question")
+            if not isinstance(question, str) or not question:
+                return self._send_json(400, {"error": "expected 'question'"})
+            stop_on_abstain = payload.get("stop_on_abstain", True)
+            cache = state.cache
+            answer, tier, vector = cache.lookup(question) if cache else (None, None, None)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            if answer is not None:
+                # Cache hit: the whole answer as one token, no generation
+                return self._write_stream(TokenStream(iter([answer]), stop_on_abstain), cache=tier)
+
+            with state.batcher.slots:
+                version = cache.version_fn() if cache else None
+                stream = state.pipeline.stream(question, stop_on_abstain=stop_on_abstain)
+                completed = self._write_stream(stream)
+            if cache and completed and not stream.metrics["stopped_early"]:
+                cache.store(question, stream.text, version, vector)
+
+        def _write_stream(self, stream, **extra):
+            """Write a TokenStream as NDJSON; True if it ran to the end without error."""
+            try:
+                for token in stream:
+                    self.wfile.write((json.dumps({"token": token}) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                final = dict(extra, done=True, metrics=stream.metrics)
+            except (BrokenPipeError, ConnectionResetError):
+                return False  # client went away; closing the stream stopped generation
+            except Exception as e:
+                final = dict(extra, done=True, error=str(e), metrics=stream.metrics)
+            self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+            return "error" not in final
+
+        def do_POST(self):
+            if self.path not in ("/query", "/query/stream"):
+                return self._send_json(404, {"error": "not found"})
+            if not state.ready:
+                return self._send_json(503, {"error": "pipeline not ready"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": "invalid JSON"})
+            if self.path == "/query/stream":
+                return self._send_stream(payload)
+
+            if "questions" in payload:
+                questions, single = payload["questions"], False
+            elif "question" in payload:
+                questions, single = [payload["question"]], True
+            else:
+                return self._send_json(400, {"error": "expected 'question' or 'questions'"})
+            if (not isinstance(questions, list) or not questions
+                    or not all(isinstance(q, str) and q for q in questions)):
+                return self._send_json(400, {"error": "questions must be non-empty strings"})
+
+            started = time.perf_counter()
+            futures = [state.batcher.submit(q) for q in questions]
+            results = []
+            for question, future in zip(questions, futures):
+                try:
+                    results.append({"question": question, "answer": future.result(), "error": None})
+                except Exception as e:
+                    results.append({"question": question, "answer": None, "error": str(e)})
+            seconds = time.perf_counter() - started
+
+            if single:
+                result = results[0]
+                status = 500 if result["error"] else 200
+                return self._send_json(status, dict(result, seconds=seconds))
+            self._send_json(200, {"results": results, "seconds": seconds})
+
+        def log_message(self, format, *args):
+            pass  # keep stdout for our own status lines
+
+    return RagRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ingest", action="store_true",
+                        help="sync the collection with sampledocs before serving")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=int, default=10)
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="questions generated in parallel (match OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--cache-threshold", type=float, default=None,
+                        help="enable the semantic answer cache with this similarity threshold")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL_SECONDS,
+                        help="answer cache entry lifetime in seconds")
+    parser.add_argument("--backend", choices=BACKENDS, default="chroma",
+                        help="retriever backend: Chroma or the in-process NumPy index")
+    parser.add_argument("--storage", choices=STORAGES, default="float32",
+                        help="NumPy backend: vector storage for the first-pass search")
+    parser.add_argument("--hybrid", action="store_true",
+                        help="fuse BM25 keyword matches with dense retrieval")
+    parser.add_argument("--skip-dense-coverage", type=float, default=None,
+                        help="with --hybrid: skip the question embedding when keywords cover "
+                             "this share of the question")
+    parser.add_argument("--trace", default=TRACE_PATH, metavar="PATH",
+                        help="append per-stage latency of every request to this JSONL file")
+    args = parser.parse_args()
+
+    state = ServiceState()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    # Load in the background so /health and /ready answer during start-up
+    threading.Thread(
+        target=state.load,
+        args=(args.ingest, args.max_batch_size, args.max_wait_ms, args.max_concurrency,
+              args.cache_threshold, args.cache_ttl, args.backend, args.storage,
+              args.hybrid, args.skip_dense_coverage, args.trace),
+        daemon=True,
+    ).start()
+    print(f"🚀 Listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
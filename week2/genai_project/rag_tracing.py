@@ -0,0 +1,408 @@
+# rag_tracing.py
+"""
+Per-Stage Latency Tracing
+
+StageTracer is a LangChain callback handler. Attached to a chain, it
+records a span with wall time for every runnable of every request:
+
+    request                      the whole rag_chain call
+    ├── retrieve                 retriever run
+    │   ├── embed_query          question embedding     (stage_span in the retriever)
+    │   └── vector_search        Chroma / NumPy search  (stage_span in the retriever)
+    ├── format_docs              context formatting (or the ContextBuilder)
+    ├── prompt                   ChatPromptTemplate rendering
+    ├── llm                      OllamaLLM call, split at the first token into
+    │   ├── llm_prefill            start → first token
+    │   └── llm_generate           first token → last token
+    └── parse                    StrOutputParser
+
+When Ollama reports them, the llm span also carries its own prompt-eval /
+eval durations and token counts. Container runnables (RunnableParallel,
+...) are recorded under their own names. Each question is one trace, so
+answer them with invoke (rag_server's MicroBatcher and rag_batch both
+do): under chain.batch every prompt goes through one OllamaLLM call, the
+llm spans all cover that call and only the first gets a prefill/generate
+split.
+
+Per stage, durations go into fixed-bucket histograms (bounded memory, for
+long-running servers). Each finished request can be appended to a JSONL
+file as one line with all its spans, and recent requests can be exported
+in Chrome trace format (open in chrome://tracing or ui.perfetto.dev).
+
+Tracing costs nothing when it is off: no handler is attached, and
+stage_span() checks the run's handlers and returns a shared no-op context.
+
+Usage:
+    tracer = StageTracer("rag_trace.jsonl")
+    chain = build_rag_chain(retriever, llm).with_config(callbacks=[tracer])
+    chain.invoke("What is the refund policy?")
+    tracer.summary()                          # {stage: {count, p50_ms, p95_ms, ...}}
+    tracer.export_chrome_trace("rag_trace.chrome.json")
+
+    RAG_TRACE_PATH=rag_trace.jsonl python rag_server.py     # RagPipeline traces itself
+    python rag_tracing.py rag_trace.jsonl --chrome rag_trace.chrome.json
+"""
+import argparse
+import bisect
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+TRACE_PATH = os.environ.get("RAG_TRACE_PATH")
+STAGE_NAMES = {
+    "ChatPromptTemplate": "prompt",
+    "PromptTemplate": "prompt",
+    "StrOutputParser": "parse",
+    "format_docs": "format_docs",
+    "ContextBuilder": "format_docs",
+}
+# bucket upper bounds; slower spans land in a final overflow bucket
+BUCKET_BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+                    1000, 2500, 5000, 10000, 30000, 60000, 120000)
+_NOT_TRACED = contextlib.nullcontext()
+
+
+class StageHistogram:
+    """Counts of durations per bucket; percentiles are bucket upper bounds (capped at max)."""
+
+    def __init__(self, bounds_ms=BUCKET_BOUNDS_MS):
+        self.bounds_ms = bounds_ms
+        self.buckets = [0] * (len(bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(self.bounds_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank, seen = p / 100 * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                bound = self.bounds_ms[i] if i < len(self.bounds_ms) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "trace_id", "name", "stage", "start", "end",
+                 "first_token", "error", "attrs")
+
+    def __init__(self, span_id, parent_id, trace_id, name, stage, start, attrs=None):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.trace_id = trace_id
+        self.name = name
+        self.stage = stage
+        self.start = start
+        self.end = None
+        self.first_token = None
+        self.error = None
+        self.attrs = attrs or {}
+
+    @property
+    def ms(self):
+        return (self.end - self.start) * 1000
+
+    def to_dict(self, epoch):
+        entry = {
+            "span_id": str(self.span_id),
+            "parent_id": str(self.parent_id) if self.parent_id else None,
+            "name": self.name,
+            "stage": self.stage,
+            "start": round(epoch + self.start, 6),
+            "ms": round(self.ms, 3),
+        }
+        if self.error:
+            entry["error"] = self.error
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        return entry
+
+
+def find_tracer(run_manager):
+    """The StageTracer among a run's handlers, or None."""
+    if run_manager is not None:
+        for handler in run_manager.handlers:
+            if isinstance(handler, StageTracer):
+                return handler
+    return None
+
+
+def stage_span(stage, run_manager=None, **attrs):
+    """
+    Time a block inside a runnable as a child span of its run. A no-op
+    unless the run is traced.
+
+    Example:
+        >>> def _get_relevant_documents(self, query, *, run_manager=None):
+        ...     with stage_span("embed_query", run_manager):
+        ...         vector = self.embeddings.embed_query(query)
+    """
+    tracer = find_tracer(run_manager)
+    if tracer is None:
+        return _NOT_TRACED
+    return tracer.span(stage, run_manager.run_id, **attrs)
+
+
+class StageTracer(BaseCallbackHandler):
+    """
+    Args:
+        path (str | None): Append every finished request to this JSONL file
+        max_traces (int): Finished requests kept in memory for export_chrome_trace
+    """
+    run_inline = True  # timestamps taken where the event happens, not in an executor
+
+    def __init__(self, path=None, max_traces=200):
+        self.path = path
+        self.histograms = {}
+        self.recent = collections.deque(maxlen=max_traces)
+        self.requests = 0
+        self.errors = 0
+        self._open = {}    # run id -> Span
+        self._traces = {}  # root run id -> its spans
+        self._lock = threading.Lock()
+        self._epoch = time.time() - time.perf_counter()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    # ── Span bookkeeping ───────────────────────────────────────
+    def _start(self, run_id, parent_id, name, stage=None, **attrs):
+        started = time.perf_counter()
+        with self._lock:
+            parent = self._open.get(parent_id)
+            if parent is None:  # not inside a traced run: a new request
+                span = Span(run_id, None, run_id, name, "request", started, attrs)
+                self._traces[run_id] = []
+            else:
+                span = Span(run_id, parent_id, parent.trace_id, name,
+                            stage or STAGE_NAMES.get(name, name), started, attrs)
+            self._open[run_id] = span
+            self._traces[span.trace_id].append(span)
+        return span
+
+    def _end(self, run_id, error=None, **attrs):
+        ended = time.perf_counter()
+        with self._lock:
+            span = self._open.pop(run_id, None)
+            if span is None:
+                return
+            span.end = ended
+            span.error = error
+            span.attrs.update(attrs)
+            spans = [span]
+            if span.stage == "llm" and span.first_token is not None:
+                spans += [Span(uuid.uuid4(), run_id, span.trace_id, "prefill", "llm_prefill", span.start),
+                          Span(uuid.uuid4(), run_id, span.trace_id, "generate", "llm_generate",
+                               span.first_token)]
+                spans[1].end, spans[2].end = span.first_token, ended
+                self._traces[span.trace_id] += spans[1:]
+            for s in spans:
+                self._histogram(s.stage).add(s.ms)
+            if span.span_id == span.trace_id:
+                self._finish(span, self._traces.pop(span.trace_id), ended)
+
+    def _histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = StageHistogram()
+        return histogram
+
+    def _finish(self, root, spans, ended):
+        for span in spans:
+            if span.end is None:  # e.g. a stream closed early: never ended by LangChain
+                self._open.pop(span.span_id, None)
+                span.end, span.error = ended, span.error or "unfinished"
+        stages = collections.defaultdict(float)
+        for span in spans:
+            stages[span.stage] += span.ms
+        trace = {
+            "trace_id": str(root.trace_id),
+            "name": root.name,
+            "start": round(self._epoch + root.start, 6),
+            "ms": round(root.ms, 3),
+            "error": root.error,
+            "stages": {stage: round(ms, 3) for stage, ms in stages.items()},
+            "spans": [s.to_dict(self._epoch) for s in spans],
+        }
+        self.requests += 1
+        self.errors += root.error is not None
+        self.recent.append(trace)
+        if self._file:
+            self._file.write(json.dumps(trace) + "\n")
+            self._file.flush()
+
+    @contextlib.contextmanager
+    def span(self, stage, parent_id, **attrs):
+        span_id = uuid.uuid4()
+        self._start(span_id, parent_id, stage, stage=stage, **attrs)
+        try:
+            yield
+        except BaseException as e:
+            self._end(span_id, error=repr(e))
+            raise
+        self._end(span_id)
+
+    # ── LangChain callbacks ────────────────────────────────────
+    @staticmethod
+    def _name(serialized, kwargs):
+        return kwargs.get("name") or (serialized or {}).get("name") or "runnable"
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        parent = self._open.get(parent_run_id)
+        nested = parent is not None and parent.stage == "retrieve"  # e.g. hybrid → dense
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs),
+                    stage="dense_retrieve" if nested else "retrieve")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs), stage="llm")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs), stage="llm")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self._open.get(run_id)
+        if span is not None and span.first_token is None and token:
+            span.first_token = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        info = {}
+        generations = getattr(response, "generations", None)
+        if generations and generations[0]:
+            info = generations[0][0].generation_info or {}
+        attrs = {}
+        # Ollama's own timings (nanoseconds) and token counts, when it reports them
+        for key, name in (("prompt_eval_duration", "ollama_prefill_ms"),
+                          ("eval_duration", "ollama_generate_ms"),
+                          ("load_duration", "ollama_load_ms")):
+            if info.get(key):
+                attrs[name] = round(info[key] / 1e6, 3)
+        for key, name in (("prompt_eval_count", "prompt_tokens"), ("eval_count", "output_tokens")):
+            if info.get(key) is not None:
+                attrs[name] = info[key]
+        self._end(run_id, **attrs)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    # ── Reports ────────────────────────────────────────────────
+    def summary(self):
+        """{stage: count / mean / p50 / p95 / p99 / max in ms} over every traced request."""
+        with self._lock:
+            return {stage: h.summary() for stage, h in self.histograms.items()}
+
+    def chrome_trace(self):
+        """Recent requests in Chrome trace format."""
+        with self._lock:
+            traces = list(self.recent)
+        return chrome_trace(traces)
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def read_traces(path):
+    """Every complete trace line in `path`; a line torn by a crash is skipped."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def chrome_events(traces):
+    """Complete ("X") events, one row (tid) per request so concurrent requests don't overlap."""
+    pid = os.getpid()
+    events = []
+    for lane, trace in enumerate(traces, start=1):
+        events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": lane,
+                       "args": {"name": f"{trace['name']} {trace['trace_id'][:8]}"}})
+        for span in trace["spans"]:
+            args = dict(span.get("attrs", {}), name=span["name"])
+            if span.get("error"):
+                args["error"] = span["error"]
+            events.append({"ph": "X", "name": span["stage"], "cat": "rag", "pid": pid,
+                           "tid": lane, "ts": round(span["start"] * 1e6, 1),
+                           "dur": round(span["ms"] * 1000, 1), "args": args})
+    return events
+
+
+def chrome_trace(traces):
+    return {"traceEvents": chrome_events(traces), "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(traces, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(traces), f)
+
+
+def summarize_traces(traces):
+    """Per-stage histograms rebuilt from exported traces (e.g. a JSONL file)."""
+    histograms = {}
+    for trace in traces:
+        for span in trace["spans"]:
+            histograms.setdefault(span["stage"], StageHistogram()).add(span["ms"])
+    return {stage: h.summary() for stage, h in histograms.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency of traced RAG requests")
+    parser.add_argument("path", help="JSONL written by StageTracer (RAG_TRACE_PATH)")
+    parser.add_argument("--chrome", default=None, help="also write a Chrome trace to this file")
+    parser.add_argument("--last", type=int, default=None, help="only the last N requests")
+    args = parser.parse_args()
+
+    traces = list(read_traces(args.path))
+    if args.last:
+        traces = traces[-args.last:]
+    print(f"{len(traces)} requests")
+    print(f"{'Stage':<36} {'count':>7} {'mean ms':>10} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>10}")
+    for stage, s in sorted(summarize_traces(traces).items(), key=lambda kv: -kv[1]["mean_ms"]):
+        print(f"{stage:<36} {s['count']:>7} {s['mean_ms']:>10.2f} {s['p50_ms']:>9} "
+              f"{s['p95_ms']:>9} {s['p99_ms']:>9} {s['max_ms']:>10.2f}")
+    if args.chrome:
+        export_chrome_trace(traces, args.chrome)
+        print(f"Chrome trace → {args.chrome}")
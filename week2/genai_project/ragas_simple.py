@@ -1,17 +1,17 @@
 # ragas_simple.py — Fixed for Ollama
-from langchain_ollama import OllamaLLM, OllamaEmbeddings, ChatOllama
+from langchain_ollama import OllamaLLM, ChatOllama
 from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from ragas import evaluate
 from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 from datasets import Dataset
 from golden_dataset import golden_data
-import os
+from embedding_cache import get_embeddings
+from doc_loader import load_docs
+from rag_batch import answer_batch
+from rag_pipeline import ScoredRetriever, build_rag_chain_with_sources
 
 # Import metrics from correct location
 from ragas.metrics import faithfulness, answer_relevancy
@@ -20,23 +20,12 @@ print("Setting up RAG pipeline...")
 
 # Setup LLM and embeddings
 llm = OllamaLLM(model="llama3.2")
-embeddings = OllamaEmbeddings(model="llama3.2")
+embeddings = get_embeddings(model="llama3.2")  # disk-cached, shared across scripts
 
 # CRITICAL: Tell RAGAS to use Ollama for evaluation (not OpenAI)
 ragas_llm = LangchainLLMWrapper(ChatOllama(model="llama3.2"))
 ragas_embeddings = LangchainEmbeddingsWrapper(embeddings)
 
-def load_docs(folder="sampledocs"):
-    docs = []
-    for filename in os.listdir(folder):
-        if filename.endswith(".txt"):
-            with open(os.path.join(folder, filename)) as f:
-                docs.append(Document(
-                    page_content=f.read(),
-                    metadata={"source": filename}
-                ))
-    return docs
-
 splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
 chunks = splitter.split_documents(load_docs())
 
@@ -45,7 +34,8 @@ vectorstore = Chroma.from_documents(
     collection_name="ragas_test",
     persist_directory="./chroma_ragas"
 )
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+# Scored retriever: chunks come back with their relevance score
+retriever = ScoredRetriever(vectorstore=vectorstore, k=3)
 
 prompt = ChatPromptTemplate.from_template("""
 ONLY answer using the context below.
@@ -55,22 +45,18 @@ Context: {context}
 Question: {question}
 """)
 
-rag_chain = (
-    {"context": retriever | (lambda docs: "\n\n".join(d.page_content for d in docs)), 
-     "question": RunnablePassthrough()}
-    | prompt | llm | StrOutputParser()
-)
+# One retrieval per question: the chain returns the answer AND the exact
+# chunks the model saw, so RAGAS scores the real contexts
+rag_chain = build_rag_chain_with_sources(retriever, llm, prompt)
 
 # Run RAG
 print("Running RAG on questions...")
-answers = []
-contexts = []
-
-for q in golden_data['question']:
-    print(f"  Processing: {q[:60]}...")
-    answer = rag_chain.invoke(q)
-    answers.append(answer)
-    contexts.append([d.page_content for d in retriever.invoke(q)])
+results = answer_batch(rag_chain, golden_data['question'], max_concurrency=4)
+for r in results:
+    print(f"  Processed in {r['seconds']:.1f}s: {r['question'][:60]}...")
+outputs = [r['answer'] or {"answer": "", "sources": []} for r in results]
+answers = [o['answer'] for o in outputs]
+contexts = [[s['content'] for s in o['sources']] for o in outputs]
 
 print("\n" + "="*60)
 print("Answers collected. Preparing RAGAS evaluation...")
@@ -0,0 +1,198 @@
+# streaming.py
+"""
+Streaming Answers with Latency Metrics
+
+Wraps chain.stream()/astream() so callers see tokens as Ollama produces
+them, and every request records:
+
+- ttft_seconds: time to first token (retrieval + prompt prefill), the
+  latency users actually perceive
+- tokens_per_sec: decode speed after the first token
+- total_seconds, tokens, abstained, stopped_early
+
+With stop_on_abstain=True the stream is closed as soon as the guardrail
+abstention sentence has been emitted. Closing the underlying stream
+drops the HTTP connection, which makes Ollama stop generating — nobody
+reads what a model writes after "I don't know ...". The check is
+incremental (only the new chunk plus a short normalized tail is looked
+at) and ends once the answer is ABSTAIN_WINDOW_CHARS long without the
+sentence: an answer that abstains says so up front.
+"""
+import time
+
+ABSTAIN_ANSWER = "I don't know based on available information."
+_ABSTAIN_KEY = "i don't know based on available information"
+ABSTAIN_WINDOW_CHARS = 200  # where the abstention sentence may start
+
+
+def _normalize(text):
+    return " ".join(text.replace("’", "'").lower().split())
+
+
+def is_abstention(text):
+    """True once the guardrail abstention sentence appears in `text`."""
+    return _ABSTAIN_KEY in _normalize(text)
+
+
+class AbstentionDetector:
+    """
+    is_abstention for a text that arrives in chunks, without re-reading it.
+
+    Keeps the normalized tail (one character shorter than the sentence)
+    so a sentence split across chunks is still found. Gives up once more
+    than `window` normalized characters went by without it starting.
+    """
+
+    def __init__(self, window=ABSTAIN_WINDOW_CHARS):
+        self.window = window
+        self.found = False
+        self._tail = ""
+        self._seen = 0          # normalized characters so far
+        self._space = False     # the text so far ends in whitespace
+
+    @property
+    def done(self):
+        return self.found or self._seen > self.window + len(_ABSTAIN_KEY)
+
+    def feed(self, chunk):
+        """Add a chunk; True once the sentence has appeared."""
+        if self.done:
+            return self.found
+        text = chunk.replace("’", "'").lower()
+        words = text.split()
+        if words:
+            piece = " ".join(words)
+            if self._tail and (self._space or text[0].isspace()):
+                piece = " " + piece
+            tail = self._tail + piece
+            self._seen += len(piece)
+            self.found = _ABSTAIN_KEY in tail
+            self._tail = tail[-(len(_ABSTAIN_KEY) - 1):]
+        if text:
+            self._space = text[-1].isspace()
+        return self.found
+
+
+class StreamMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.finished = None
+        self.tokens = 0
+        self.text = ""
+        self.stopped_early = False
+
+    def add(self, token):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.tokens += 1
+        self.text += token
+
+    def as_dict(self):
+        finished = self.finished or time.perf_counter()
+        decode = finished - self.first_token if self.first_token else 0.0
+        return {
+            "ttft_seconds": round(self.first_token - self.started, 4) if self.first_token else None,
+            "total_seconds": round(finished - self.started, 4),
+            "tokens": self.tokens,
+            # first token excluded: its time is prefill, not decode
+            "tokens_per_sec": round((self.tokens - 1) / decode, 2) if decode > 0 else None,
+            "abstained": is_abstention(self.text),
+            "stopped_early": self.stopped_early,
+        }
+
+
+class TokenStream:
+    """
+    Iterate to get tokens; .metrics / .text once done (or mid-stream).
+
+    Args:
+        chunks: Iterator of string chunks, e.g. rag_chain.stream(question)
+        stop_on_abstain (bool): Stop after the abstention sentence
+        on_finish (callable): Called with the metrics dict when the stream
+            ends, is stopped early or is abandoned by the caller
+
+    Example:
+        >>> stream = pipeline.stream("What is the CEO's name?", stop_on_abstain=True)
+        >>> for token in stream:
+        ...     print(token, end="", flush=True)
+        >>> stream.metrics   # {"ttft_seconds": 0.41, "tokens_per_sec": 23.5, ...}
+    """
+
+    def __init__(self, chunks, stop_on_abstain=False, on_finish=None):
+        self._chunks = chunks
+        self.stop_on_abstain = stop_on_abstain
+        self.on_finish = on_finish
+        self._metrics = StreamMetrics()
+        self._abstention = AbstentionDetector()
+
+    @property
+    def metrics(self):
+        return self._metrics.as_dict()
+
+    @property
+    def text(self):
+        return self._metrics.text
+
+    def _accept(self, chunk):
+        """Record a chunk; returns True when the stream should stop after it."""
+        self._metrics.add(chunk)
+        if self.stop_on_abstain and self._abstention.feed(chunk):
+            self._metrics.stopped_early = True
+            return True
+        return False
+
+    def _finish(self):
+        self._metrics.finished = time.perf_counter()
+        if self.on_finish:
+            self.on_finish(self.metrics)
+
+    def __iter__(self):
+        try:
+            for chunk in self._chunks:
+                if not chunk:
+                    continue
+                stop = self._accept(chunk)
+                yield chunk
+                if stop:
+                    break
+        finally:
+            close = getattr(self._chunks, "close", None)
+            if close:
+                close()  # stops the upstream request, not just our loop
+            self._finish()
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._chunks:
+                if not chunk:
+                    continue
+                stop = self._accept(chunk)
+                yield chunk
+                if stop:
+                    break
+        finally:
+            aclose = getattr(self._chunks, "aclose", None)
+            if aclose:
+                await aclose()
+            self._finish()
+
+
+def summarize_streams(history):
+    """p50/p95 TTFT, mean decode speed and early stops over recorded streams."""
+    ttfts = sorted(m["ttft_seconds"] for m in history if m["ttft_seconds"] is not None)
+    speeds = [m["tokens_per_sec"] for m in history if m["tokens_per_sec"]]
+    if not ttfts:
+        return {"requests": len(history)}
+
+    def percentile(p):
+        return ttfts[min(len(ttfts) - 1, int(round(p / 100 * (len(ttfts) - 1))))]
+
+    return {
+        "requests": len(history),
+        "ttft_p50_seconds": percentile(50),
+        "ttft_p95_seconds": percentile(95),
+        "mean_tokens_per_sec": round(sum(speeds) / len(speeds), 2) if speeds else None,
+        "stopped_early": sum(m["stopped_early"] for m in history),
+        "abstained": sum(m["abstained"] for m in history),
+    }
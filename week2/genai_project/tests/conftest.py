@@ -1,95 +1,161 @@
 # tests/conftest.py
 import pytest
 import os
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
+import sys
+import httpx
+from langchain_ollama import OllamaLLM
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 """
 pytest Configuration and Fixtures
 
 Provides reusable fixtures for RAG pipeline testing:
-- rag_pipeline: Session-scoped RAG chain (built once, reused)
+- rag_pipeline: Session-scoped RagPipeline with production defaults
+- hybrid_rag_pipeline: The same with hybrid=True (BM25 + dense)
 - sample_questions: Golden dataset for testing
+
+Parallel runs: `pytest -n 4` (pytest-xdist). Every worker talks to Ollama
+through one pooled client, and all workers together keep at most
+OLLAMA_TEST_CONCURRENCY requests in flight (see ollama_pool.py). The
+terminal summary lists the slowest LLM-backed tests.
+
+Cassettes: Ollama calls are replayed from tests/cassettes/ when recorded
+(LLM_CASSETTE=replay, the default), so a recorded suite runs without a
+model. LLM_CASSETTE=strict fails on anything unrecorded, =record
+re-records everything, =off always calls Ollama (see cassette.py).
+When the calls would go to Ollama (nothing recorded yet, or a mode that
+always calls it) and Ollama does not answer, the LLM-backed tests are
+skipped instead of waiting on the connection. In replay mode a test that
+needs a request missing from the cassette, with Ollama down, is skipped
+as "not recorded"; strict mode fails it.
+
+Outside =off, the embedding cache and the warm index live in a per-session
+temp dir, so every embedding and generation request reaches the cassette:
+the shared disk caches would otherwise answer them on a developer's
+machine and leave them out of the recording.
 """
+# Make project modules (ingestion, ...) importable when running plain `pytest`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import DEFAULT_CACHE_PATH, get_embeddings
+from doc_loader import load_docs
+from rag_pipeline import MODEL, SPLITTER_CONFIG, RagPipeline
+from cassette import DEFAULT_MODE, DEFAULT_PATH, CassetteMiss, cassette_client_kwargs, needs_server
+from golden_dataset import golden_test_questions
+from ollama_pool import shared_transport
+from warm_index import DEFAULT_ROOT, open_warm_index
+
+TEST_COLLECTION = "test_collection"
+
+
+def ollama_unreachable(timeout=2.0):
+    """Why Ollama can't be used, or None when it answers."""
+    host = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+    url = host if "://" in host else f"http://{host}"
+    try:
+        httpx.get(f"{url}/api/version", timeout=timeout)
+    except httpx.HTTPError as e:
+        return f"Ollama is unreachable at {url} ({type(e).__name__})"
+    return None
+
+
 @pytest.fixture(scope="session")
-def rag_pipeline():
+def test_index(tmp_path_factory):
+    """
+    LLM, embeddings and the warm index the pipeline fixtures share.
+
+    The index lives in test_chroma/<key>/, keyed by corpus, splitter
+    config and embedding model, in RagPipeline's on-disk layout. It is
+    built by the first session (one xdist worker, under a file lock) and
+    reused read-only afterwards. With a cassette, index and embedding
+    cache start empty in a temp dir instead (see the module docstring).
     """
-    Create RAG pipeline fixture for all tests.
-    
+    if needs_server():
+        reason = ollama_unreachable()
+        if reason:
+            if DEFAULT_MODE == "replay":
+                reason += f" and nothing is recorded to replay ({DEFAULT_PATH} is missing)"
+            pytest.skip(f"{reason}; LLM_CASSETTE={DEFAULT_MODE} needs a running Ollama")
+
+    # Recorded calls are replayed from tests/cassettes; the rest go through the
+    # pooled, cross-worker limited client (and are recorded)
+    client_kwargs = cassette_client_kwargs(inner=shared_transport())
+    llm = OllamaLLM(model=MODEL, client_kwargs=client_kwargs)
+    cache_path, root = DEFAULT_CACHE_PATH, DEFAULT_ROOT  # shared: warm after the first run
+    if DEFAULT_MODE != "off":
+        scratch = tmp_path_factory.mktemp("cassette")
+        cache_path, root = str(scratch / "embeddings.sqlite3"), str(scratch / "test_chroma")
+    embeddings = get_embeddings(model=MODEL, path=cache_path, client_kwargs=client_kwargs)
+    _, _, info = open_warm_index(load_docs(), RecursiveCharacterTextSplitter(**SPLITTER_CONFIG),
+                                 SPLITTER_CONFIG, embeddings, MODEL, root=root,
+                                 collection_name=TEST_COLLECTION)
+    print(f"{'♻️ Reused' if info['reused'] else '🏗️ Built'} test index {info['key']} "
+          f"({info['chunks']} chunks)")
+    return {"llm": llm, "embeddings": embeddings, "persist_directory": info["persist_directory"]}
+
+
+def open_pipeline(test_index, **options):
+    return RagPipeline(ingest=False, collection_name=TEST_COLLECTION, **test_index, **options)
+
+
+@pytest.fixture(scope="session")
+def rag_pipeline(test_index):
+    """
+    The pipeline as it ships: RagPipeline with its production defaults
+    (prompt, dense Chroma retrieval, context builder), over the test index.
+
     Scope: session (created once, reused across all tests)
-    
+
     Returns:
-        RunnableSequence: Complete RAG chain
-        
-    Note:
-        Uses test_chroma directory to avoid conflicts with main pipeline
+        RagPipeline: .invoke(question) runs the full chain
     """
     print("\n🔧 Setting up RAG pipeline for tests...")
-    
-    # Setup
-    llm = OllamaLLM(model="llama3.2")
-    embeddings = OllamaEmbeddings(model="llama3.2")
-    
-    def load_docs(folder="sampledocs"):
-        docs = []
-        for filename in os.listdir(folder):
-            if filename.endswith(".txt"):
-                with open(os.path.join(folder, filename)) as f:
-                    docs.append(Document(
-                        page_content=f.read(),
-                        metadata={"source": filename}
-                    ))
-        return docs
-    
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(load_docs())
-    
-    vectorstore = Chroma.from_documents(
-        chunks, embeddings,
-        collection_name="test_collection",
-        persist_directory="./test_chroma"
-    )
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-    
-    prompt = ChatPromptTemplate.from_template("""You are a helpful assistant for answering questions about company policies.
-
-        RULES:
-        1. ONLY answer using the context below
-        2. If the answer is not in the context, say: "I don't know based on available information."
-        3. Never make up information
-        4. Do NOT write code, functions, or scripts
-        5. Do NOT answer questions unrelated to the provided policies
-
-        Context: {context}
-
-        Question: {question}
-    """)
-    
-    rag_chain = (
-        {"context": retriever | (lambda docs: "\n\n".join(d.page_content for d in docs)), 
-         "question": RunnablePassthrough()}
-        | prompt | llm | StrOutputParser()
-    )
-    
+    pipeline = open_pipeline(test_index)
     print("✅ RAG pipeline ready")
-    return rag_chain
+    return pipeline
+
+
+@pytest.fixture(scope="session")
+def hybrid_rag_pipeline(test_index):
+    """Same pipeline with BM25 keyword matches fused in (RagPipeline(hybrid=True))."""
+    return open_pipeline(test_index, hybrid=True)
 
 
 @pytest.fixture
 def sample_questions():
     """Golden dataset questions for testing"""
-    return {
-        'answerable': [
-            "What is the refund policy?",
-            "How many days of annual leave do employees get?",
-            "What happens in week 1 of onboarding?",
-        ],
-        'unanswerable': [
-            "What is the CEO's name?",
-            "What is the company stock price?",
-        ]
-    }
\ No newline at end of file
+    return golden_test_questions
+
+
+# ── Per-test latency report ──────────────────────────────────
+LLM_FIXTURES = {"rag_pipeline", "hybrid_rag_pipeline"}
+SLOWEST_SHOWN = 10
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if (DEFAULT_MODE == "replay" and call.excinfo is not None
+            and call.excinfo.errisinstance(CassetteMiss)):
+        report.outcome = "skipped"
+        report.longrepr = (str(item.path), item.location[1],
+                           f"Skipped: not recorded and Ollama is down: {call.excinfo.value}")
+    if report.when == "call" and LLM_FIXTURES & set(item.fixturenames):
+        # user_properties travel with the report from xdist workers to the controller
+        report.user_properties.append(("llm_backed", True))
+
+
+def pytest_terminal_summary(terminalreporter):
+    reports = [r for key in ("passed", "failed") for r in terminalreporter.stats.get(key, [])
+               if getattr(r, "when", None) == "call"
+               and any(name == "llm_backed" for name, *_ in r.user_properties)]
+    if not reports:
+        return
+    durations = sorted(r.duration for r in reports)
+    p50 = durations[len(durations) // 2]
+    p95 = durations[min(len(durations) - 1, int(0.95 * len(durations)))]
+    terminalreporter.section("LLM test latency")
+    terminalreporter.write_line(f"{len(reports)} tests, {sum(durations):.1f}s total, "
+                                f"p50 {p50:.2f}s, p95 {p95:.2f}s")
+    for report in sorted(reports, key=lambda r: -r.duration)[:SLOWEST_SHOWN]:
+        terminalreporter.write_line(f"{report.duration:7.2f}s  {report.nodeid}")
@@ -0,0 +1,143 @@
+# tests/test_answer_cache.py
+"""
+Semantic answer cache tests — fake chain and bag-of-words embeddings.
+"""
+from langchain_core.embeddings import Embeddings
+
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+VOCAB = ["refund", "policy", "leave", "annual", "days", "ceo", "maternity"]
+
+
+class BagOfWordsEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        words = text.lower().replace("?", "").split()
+        return [float(words.count(w)) + 0.01 for w in VOCAB]
+
+
+class CountingChain:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, question, config=None):
+        self.calls += 1
+        return f"answer #{self.calls}"
+
+    def batch(self, questions, config=None, return_exceptions=False):
+        return [self.invoke(q) for q in questions]
+
+
+def make_cache(chain, **kwargs):
+    return SemanticAnswerCache(chain, BagOfWordsEmbeddings(), **kwargs)
+
+
+def test_exact_and_semantic_tiers():
+    chain = CountingChain()
+    cache = make_cache(chain, threshold=0.95)
+
+    first = cache.invoke("What is the refund policy?")
+    assert cache.invoke("what is the REFUND policy") == first          # exact (normalized)
+    assert cache.invoke("Refund policy please?") == first              # semantic
+    cache.invoke("How many annual leave days?")                        # different question
+
+    stats = cache.stats()
+    assert chain.calls == 2
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 2)
+    print("✅ Exact + semantic hits")
+
+
+def test_ttl_expiry():
+    chain = CountingChain()
+    cache = make_cache(chain, ttl_seconds=0)
+
+    cache.invoke("What is the refund policy?")
+    cache.invoke("What is the refund policy?")
+
+    assert chain.calls == 2
+    assert cache.stats()["expired"] >= 1
+    print("✅ Expired entries are not served")
+
+
+def test_expired_nearest_entry_falls_back_to_live_one(monkeypatch):
+    now = {"value": 1000.0}
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now["value"])
+    chain = CountingChain()
+    cache = make_cache(chain, threshold=0.8, ttl_seconds=100)
+
+    cache.invoke("What is the refund policy?")   # answer #1, will expire
+    now["value"] += 50
+    cache.invoke("Refund policy days?")          # answer #2, still live
+    now["value"] += 70
+
+    # the expired entry is the closer match; the live one is still above threshold
+    assert cache.invoke("Refund policy?") == "answer #2"
+    assert chain.calls == 2 and cache.stats()["expired"] == 1
+    print("✅ Expired rows masked in semantic search")
+
+
+def test_collection_change_invalidates():
+    chain = CountingChain()
+    version = {"value": "v1"}
+    cache = make_cache(chain, version_fn=lambda: version["value"])
+
+    cache.invoke("What is the refund policy?")
+    version["value"] = "v2"  # ingestion changed the documents
+    cache.invoke("What is the refund policy?")
+
+    assert chain.calls == 2
+    assert cache.stats()["invalidations"] == 1
+    print("✅ Cache dropped on collection change")
+
+
+def test_answer_generated_across_a_collection_change_is_not_stored():
+    version = {"value": "v1"}
+
+    class IngestingChain(CountingChain):
+        def invoke(self, question, config=None):
+            version["value"] = "v2"  # ingestion finishes while the answer is generated
+            return super().invoke(question)
+
+    chain = IngestingChain()
+    cache = make_cache(chain, version_fn=lambda: version["value"])
+
+    cache.invoke("What is the refund policy?")
+    cache.invoke("What is the refund policy?")
+
+    assert chain.calls == 2
+    assert cache.stats()["entries"] == 1  # only the answer generated against v2
+    print("✅ Stale answer dropped")
+
+
+def test_batch_only_sends_misses_to_chain():
+    chain = CountingChain()
+    cache = make_cache(chain)
+    cache.invoke("What is the refund policy?")
+
+    answers = cache.batch(["What is the refund policy?", "Who is the CEO?"])
+
+    assert answers == ["answer #1", "answer #2"]
+    assert chain.calls == 2
+    print("✅ Batch serves hits from cache")
+
+
+def test_miss_embeds_the_question_once():
+    class CountingEmbeddings(BagOfWordsEmbeddings):
+        calls = 0
+
+        def embed_query(self, text):
+            CountingEmbeddings.calls += 1
+            return super().embed_query(text)
+
+    chain = CountingChain()
+    cache = SemanticAnswerCache(chain, CountingEmbeddings())
+
+    cache.invoke("What is the refund policy?")
+    cache.batch(["Who is the CEO?", "How many annual leave days?"])
+
+    assert CountingEmbeddings.calls == 3
+    assert cache.stats()["entries"] == 3
+    print("✅ One embedding per missed question")
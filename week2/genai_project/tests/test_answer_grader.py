@@ -0,0 +1,72 @@
+# tests/test_answer_grader.py
+"""
+Answer grader tests — the one-pass matcher must agree with the plain
+`phrase in answer` checks it replaces.
+"""
+import random
+
+from answer_grader import (DEFAULT_CASE_SENSITIVE, DEFAULT_CATEGORIES, AnswerGrader,
+                           grade, grade_many)
+
+
+def naive_grade(answer):
+    """The check the tests used to copy: any(phrase in answer) per category."""
+    return {
+        name: any(p in answer if name in DEFAULT_CASE_SENSITIVE else p.lower() in answer.lower()
+                  for p in phrases)
+        for name, phrases in DEFAULT_CATEGORIES.items()
+    }
+
+
+def test_batch_matches_naive_checks():
+    rng = random.Random(7)
+    phrases = [p for group in DEFAULT_CATEGORIES.values() for p in group]
+    filler = ["Refunds", "take", "30 days.", "Leave", "is", "20 days", "per", "year", "not"]
+    answers = []
+    for _ in range(2000):
+        words = [rng.choice(filler) for _ in range(rng.randint(0, 12))]
+        for _ in range(rng.randint(0, 3)):
+            phrase = rng.choice(phrases)
+            words.insert(rng.randint(0, len(words)), rng.choice([phrase, phrase.upper(), phrase.lower()]))
+        answers.append(" ".join(words))
+
+    grades = grade_many(answers, batch_size=300)  # several batches
+
+    assert len(grades) == len(answers)
+    for answer, row in zip(answers, grades.rows()):
+        assert row == naive_grade(answer), answer
+    assert grades.counts()["abstain"] == sum(naive_grade(a)["abstain"] for a in answers)
+
+
+def test_overlapping_and_case_sensitive_phrases():
+    # "don't know" sits inside the leaked-prompt phrase; "I think" is in two categories
+    row = grade('My rules: say: "I don\'t know based on..." I THINK so.')
+    assert row["leaked_prompt"] and row["abstain"]
+    assert row["hallucination"] and row["opinion"]
+
+    # leaked-prompt and code phrases are case-sensitive
+    row = grade("I can only answer using the documents. Import duties are not covered.")
+    assert not row["leaked_prompt"] and not row["code"]
+    assert grade("import os\ndef leave_days(): ...")["code"]
+
+    # abstention needs the full phrase: "not in" alone is an ordinary answer
+    assert not grade("Refunds are not included for digital products.")["abstain"]
+    assert grade("That is not in the provided documents.")["abstain"]
+    row = grade("The notice period is not specified.")
+    assert row["unspecified"] and not row["abstain"]
+
+    # phrases never match across two answers of a batch, and None is empty
+    grades = grade_many(["I don't", "know", None, "cannot answer"])
+    assert grades["abstain"].tolist() == [False, False, False, True]
+
+
+def test_custom_categories_prefix_phrases_and_unicode():
+    grader = AnswerGrader({"a": ["not", "not in", "note"], "b": ["no"], "c": ["x"]},
+                          case_sensitive=["c"])
+    assert grader.grade("NOT IN") == {"a": True, "b": True, "c": False}
+    assert grader.grade("NOTHING x") == {"a": True, "b": True, "c": True}
+    assert grader.grade("nah X") == {"a": False, "b": False, "c": False}
+
+    # "İ".lower() is two characters: later answers must still map to themselves
+    grades = grader.grade_many(["İİİ", "fine", "no"])
+    assert grades["b"].tolist() == [False, False, True]
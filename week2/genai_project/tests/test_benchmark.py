@@ -0,0 +1,39 @@
+# tests/test_benchmark.py
+"""
+Benchmark smoke test — tiny corpus against the fake Ollama server.
+"""
+import argparse
+import json
+import os
+
+from benchmark import run_benchmark
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["load_docs", "split", "embed_and_store", "retrieval", "retrieval_numpy",
+          "vector_search", "vector_search_numpy", "rag_chain"]
+
+
+def test_benchmark_reports_every_stage(monkeypatch):
+    monkeypatch.chdir(PROJECT_DIR)  # the corpus is built from ./sampledocs
+    monkeypatch.delenv("OLLAMA_HOST", raising=False)  # restored after run_benchmark sets it
+    args = argparse.Namespace(docs=4, queries=3, batch_size=8, workers=2, concurrency=2,
+                              ollama_host=None, first_token_ms=1.0, tokens_per_sec=0.0,
+                              embed_ms=0.0, embed_ms_per_text=0.0, output=None)
+
+    report = run_benchmark(args)
+
+    assert list(report["stages"]) == STAGES
+    for name, stage in report["stages"].items():
+        assert stage["count"] > 0 and stage["wall_seconds"] > 0, name
+        assert stage["p50_ms"] <= stage["p95_ms"] <= stage["p99_ms"], name
+        assert stage["throughput_per_sec"] > 0 and stage["peak_rss_mb"] > 0, name
+    stages = report["stages"]
+    assert stages["load_docs"]["count"] == 4
+    assert stages["embed_and_store"]["count"] == stages["split"]["chunks"]
+    assert stages["embed_and_store"]["failed"] == 0
+    assert stages["retrieval"]["count"] == stages["rag_chain"]["count"] == 3
+    assert stages["rag_chain"]["errors"] == 0
+    assert report["fake_server"]["embedded_texts"] >= stages["split"]["chunks"]
+    assert report["config"]["docs"] == 4 and "output" not in report["config"]
+    json.dumps(report)  # what main() prints
+    print(f"✅ Benchmark report: {sorted(stages)}")
@@ -0,0 +1,86 @@
+# tests/test_cassette.py
+"""
+Cassette tests — record against the fake Ollama server, replay with it stopped.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from langchain_ollama import ChatOllama, OllamaEmbeddings, OllamaLLM
+
+from cassette import Cassette, CassetteMiss, CassetteTransport, needs_server, request_key
+from fake_ollama import FakeOllamaServer
+
+PROMPT = "Context:\nRefunds are processed within 30 days.\nQuestion: How long do refunds take?"
+
+
+def clients(url, transport):
+    kwargs = {"client_kwargs": {"transport": transport}, "base_url": url, "model": "llama3.2"}
+    return OllamaLLM(**kwargs), ChatOllama(**kwargs), OllamaEmbeddings(**kwargs)
+
+
+def test_recorded_calls_replay_without_a_server(tmp_path):
+    path = str(tmp_path / "ollama.jsonl.gz")
+    with FakeOllamaServer() as server:
+        url = server.url
+        llm, chat, embeddings = clients(url, CassetteTransport(Cassette(path), "record"))
+        answer = llm.invoke(PROMPT)
+        chat_answer = chat.invoke(PROMPT).content
+        vector = embeddings.embed_query("refund policy")
+        served = server.stats()
+
+    # server is gone: every call below must come from the cassette
+    transport = CassetteTransport(Cassette(path), "strict")
+    llm, chat, embeddings = clients(url, transport)
+    assert llm.invoke(PROMPT) == answer
+    assert chat.invoke(PROMPT).content == chat_answer
+    assert embeddings.embed_query("refund policy") == vector
+    assert asyncio.run(llm.ainvoke(PROMPT)) == answer
+    assert transport.stats()["hits"] == 4 and transport.stats()["misses"] == 0
+    assert sum(served.values()) >= 3
+
+
+def test_strict_mode_fails_on_unrecorded_requests_and_replay_records_them(tmp_path):
+    path = str(tmp_path / "ollama.jsonl.gz")
+    assert needs_server("replay", path) and not needs_server("strict", path)
+    llm, _, _ = clients("http://127.0.0.1:9", CassetteTransport(Cassette(path), "strict"))
+    with pytest.raises(CassetteMiss, match="/api/generate"):
+        llm.invoke(PROMPT)
+
+    with FakeOllamaServer() as server:
+        transport = CassetteTransport(Cassette(path), "replay")
+        llm, _, _ = clients(server.url, transport)
+        llm.invoke(PROMPT)   # miss: goes to the server, gets recorded
+        llm.invoke(PROMPT)   # hit
+        assert transport.stats() == {"mode": "replay", "hits": 1, "misses": 1,
+                                     "recorded": 1, "entries": 1}
+    assert len(Cassette(path)) == 1  # appended to disk, readable by the next session
+    assert not needs_server("replay", path) and needs_server("record", path)
+
+
+def test_request_key_ignores_host_and_json_key_order():
+    body = {"model": "llama3.2", "prompt": PROMPT, "options": {"temperature": 0}}
+    a = httpx.Request("POST", "http://127.0.0.1:11434/api/generate", content=json.dumps(body))
+    b = httpx.Request("POST", "http://gpu-box:11434/api/generate",
+                      content=json.dumps(dict(reversed(list(body.items())))))
+    c = httpx.Request("POST", "http://127.0.0.1:11434/api/generate",
+                      content=json.dumps(dict(body, prompt="Another question")))
+    assert request_key(a) == request_key(b) != request_key(c)
+
+
+def test_replay_reports_unrecorded_requests_when_the_server_is_down(tmp_path):
+    path = str(tmp_path / "ollama.jsonl.gz")
+    with FakeOllamaServer() as server:
+        url = server.url
+        llm, _, _ = clients(url, CassetteTransport(Cassette(path), "replay"))
+        answer = llm.invoke(PROMPT)
+
+    # the cassette exists now, but only covers PROMPT
+    assert not needs_server("replay", path)
+    llm, _, embeddings = clients(url, CassetteTransport(Cassette(path), "replay"))
+    assert llm.invoke(PROMPT) == answer
+    with pytest.raises(CassetteMiss, match="/api/embed.*Ollama is unreachable"):
+        embeddings.embed_query("refund policy")
+    with pytest.raises(CassetteMiss, match="/api/generate.*Ollama is unreachable"):
+        asyncio.run(llm.ainvoke("Another question"))
@@ -0,0 +1,78 @@
+# tests/test_chunking_sweep.py
+"""
+Chunking sweep tests — hand-built corpus, hashed bag-of-words embeddings.
+"""
+import zlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from chunking_sweep import retrieval_metrics, run_sweep, tokenize, top_k
+
+DOCS = [
+    Document(page_content=(
+        "Refunds are accepted within thirty days of purchase.\n\n"
+        "Annual leave is twenty days per year for employees.\n\n"
+        "Maternity leave lasts twenty six weeks fully paid."
+    )),
+]
+QUESTIONS = ["When are refunds accepted?", "How much annual leave?", "How long is maternity leave?"]
+TRUTHS = [
+    "Refunds are accepted within thirty days of purchase.",
+    "Annual leave is twenty days per year for employees.",
+    "Maternity leave lasts twenty six weeks fully paid.",
+]
+
+
+class HashedEmbeddings(Embeddings):
+    """Deterministic: every content word adds 1 to its hashed dimension."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        vector = [0.0] * 64
+        for word in tokenize(text):
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector
+
+
+def test_top_k_orders_best_first_and_clamps_k():
+    vectors = np.eye(3, dtype=np.float32)
+    queries = np.array([[0.1, 0.9, 0.5], [1.0, 0.0, 0.2]], dtype=np.float32)
+
+    assert top_k(vectors, queries, 2).tolist() == [[1, 2], [0, 2]]
+    assert top_k(vectors, queries, 10).tolist() == [[1, 2, 0], [0, 2, 1]]
+    print("✅ top_k")
+
+
+def test_retrieval_metrics_hit_rate_mrr_and_f2():
+    chunks = [Document(page_content=t) for t in ["leave policy text", *TRUTHS]]
+    # question 0: relevant chunk at rank 2; question 1: rank 1; question 2: not retrieved
+    hits = [[0, 1], [2, 0], [0, 1]]
+
+    metrics = retrieval_metrics(chunks, hits, TRUTHS)
+
+    assert metrics["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+    assert metrics["mrr"] == pytest.approx((1 / 2 + 1 + 0) / 3, abs=1e-4)
+    recall, precision = metrics["context_recall"], metrics["context_precision"]
+    assert 0 < precision < recall < 1
+    assert metrics["retrieval_score"] == pytest.approx(
+        5 * precision * recall / (4 * precision + recall), abs=1e-3)
+    print("✅ Hit rate, MRR and F2")
+
+
+def test_sweep_picks_one_fact_per_chunk():
+    rows = run_sweep(DOCS, HashedEmbeddings(), QUESTIONS, TRUTHS,
+                     chunk_sizes=[20, 60, 1000], overlaps=[0], ks=[1, 3], max_workers=2)
+
+    best = rows[0]
+    assert len(rows) == 6
+    assert (best["chunk_size"], best["k"], best["chunks"]) == (60, 1, 3)
+    assert best["hit_rate"] == 1.0 and best["mrr"] == 1.0
+    whole_doc = next(r for r in rows if r["chunk_size"] == 1000 and r["k"] == 1)
+    assert whole_doc["context_recall"] == 1.0
+    assert whole_doc["context_precision"] < best["context_precision"]
+    print(f"✅ Sweep picked {best}")
@@ -0,0 +1,74 @@
+# tests/test_context_builder.py
+"""
+Context builder tests — real splitter output, no Ollama.
+"""
+import pytest
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from context_builder import ContextBuilder, count_tokens
+
+POLICY = "\n".join(f"Rule {i}: follow item {i}." for i in range(60))
+
+
+def chunks_of(text, source="policy.txt", **splitter_args):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=50, **splitter_args)
+    return splitter.split_documents([Document(page_content=text, metadata={"source": source})])
+
+
+def test_overlapping_chunks_are_merged_without_repeats():
+    chunks = chunks_of(POLICY, add_start_index=True)[:4]
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["score"] = 0.9 - i / 10
+
+    text, stats = ContextBuilder(max_tokens=10_000).build_with_stats(chunks[::-1])
+
+    assert stats["blocks_out"] == 1
+    assert text == POLICY[:chunks[3].metadata["start_index"] + len(chunks[3].page_content)]
+    assert stats["tokens_out"] < stats["tokens_in"]
+    print(f"✅ {stats['tokens_in']} → {stats['tokens_out']} tokens")
+
+
+def test_overlap_detected_from_text_without_start_index():
+    a, b = chunks_of(POLICY)[:2]
+
+    text = ContextBuilder().build([b, a, Document(page_content=a.page_content, metadata=a.metadata)])
+
+    assert text == POLICY[:POLICY.index(b.page_content) + len(b.page_content)]
+    print("✅ Splitter overlap removed by text")
+
+
+def test_blocks_ordered_by_score_and_budget_enforced():
+    refund = Document(page_content="Refunds are processed within 5 business days.",
+                      metadata={"source": "refund.txt", "score": 0.4})
+    leave = Document(page_content="Full-time employees receive 20 days of annual leave.",
+                     metadata={"source": "leave.txt", "score": 0.8})
+    long_doc = Document(page_content=POLICY, metadata={"source": "policy.txt", "score": 0.6})
+
+    builder = ContextBuilder(max_tokens=count_tokens(leave.page_content) + 60)
+    text, stats = builder.build_with_stats([refund, leave, long_doc])
+
+    assert text.startswith(leave.page_content)
+    assert "Rule 0" in text and "Refunds" not in text  # 0.6 block cut to fit, 0.4 dropped
+    assert count_tokens(text) <= builder.max_tokens
+    assert stats["truncated"] and builder.build([refund, leave, long_doc]) == text
+    print("✅ Score order and token budget")
+
+
+def test_missing_tiktoken_warns_once_and_estimates(monkeypatch):
+    import sys
+    import warnings
+
+    import context_builder
+
+    monkeypatch.setitem(sys.modules, "tiktoken", None)  # import fails
+    context_builder._encoding.cache_clear()
+    try:
+        with pytest.warns(RuntimeWarning, match="tiktoken unavailable"):
+            assert count_tokens("x" * 40) == 10
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            assert count_tokens("x" * 8) == 2  # no second warning
+    finally:
+        context_builder._encoding.cache_clear()
+    print("✅ Fallback estimate, warned once")
@@ -0,0 +1,48 @@
+# tests/test_doc_loader.py
+"""
+Streaming loader tests — plain files in tmp_path, no LLM.
+"""
+import doc_loader
+from doc_loader import iter_docs, load_docs
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_walks_subfolders_and_skips_other_files(tmp_path):
+    write(tmp_path / "refund.txt", "Refunds within 30 days.")
+    write(tmp_path / "hr" / "leave.txt", "20 days of annual leave.")
+    write(tmp_path / "notes.md", "not loaded")
+
+    sources = sorted(doc.metadata["source"] for doc in iter_docs(str(tmp_path)))
+
+    assert sources == ["hr/leave.txt", "refund.txt"]
+    print("✅ Recursive walk")
+
+
+def test_reads_stop_when_the_consumer_stops(tmp_path, monkeypatch):
+    for i in range(20):
+        write(tmp_path / f"doc{i:02d}.txt", f"Policy {i}.")
+    read = []
+    original = doc_loader.read_text
+    monkeypatch.setattr(doc_loader, "read_text", lambda path: read.append(path) or original(path))
+
+    docs = iter_docs(str(tmp_path), workers=2, max_in_flight=3)
+    first = [next(docs) for _ in range(2)]
+    docs.close()
+
+    assert [d.page_content for d in first] == ["Policy 0.", "Policy 1."]
+    assert len(read) <= 2 + 3  # consumed plus at most max_in_flight read ahead
+    print("✅ Bounded read-ahead")
+
+
+def test_text_is_read_byte_for_byte(tmp_path):
+    text = "Café policy:\r\nRefunds within 30 days.\r\n"
+    (tmp_path / "crlf.txt").write_bytes(text.encode("utf-8"))
+
+    docs = load_docs(str(tmp_path))
+
+    assert docs[0].page_content == text  # no newline translation
+    print("✅ Content read as is")
@@ -0,0 +1,124 @@
+# tests/test_embedding_cache.py
+"""
+Embedding cache tests — a counting fake stands in for OllamaEmbeddings.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    model = "fake-model"
+
+    def __init__(self):
+        self.texts_embedded = 0
+
+    def embed_documents(self, texts):
+        self.texts_embedded += len(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_second_session_hits_disk_cache(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    texts = ["Refunds within 30 days.", "20 days of annual leave."]
+
+    first = CachedEmbeddings(CountingEmbeddings(), path=path)
+    vectors = first.embed_documents(texts)
+
+    inner = CountingEmbeddings()
+    second = CachedEmbeddings(inner, path=path)  # new "script run", same file
+    assert second.embed_documents(texts) == vectors
+    assert inner.texts_embedded == 0
+    assert second.stats()["hits"] == 2
+    print("✅ Cache shared across sessions")
+
+
+def test_duplicates_in_batch_embedded_once(tmp_path):
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, path=str(tmp_path / "cache.sqlite3"))
+
+    vectors = cache.embed_documents(["same text", "same   text", "other"])
+
+    assert inner.texts_embedded == 2  # whitespace-normalized duplicate skipped
+    assert vectors[0] == vectors[1]
+    assert cache.stats()["deduplicated"] == 1
+    print("✅ In-batch duplicates embedded once")
+
+
+def test_lru_eviction_keeps_recent_entries(tmp_path):
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+
+    cache.embed_documents(["a"])
+    cache.embed_documents(["b"])
+    cache.embed_query("a")            # touch "a" so "b" is least recently used
+    cache.embed_documents(["c"])      # evicts "b"
+    inner.texts_embedded = 0
+    cache.embed_documents(["a", "b"])
+
+    assert cache.stats()["entries"] == 2
+    assert inner.texts_embedded == 1  # only "b" had to be re-embedded
+    print("✅ LRU eviction")
+
+
+def test_concurrent_misses_embedded_once_with_one_dtype(tmp_path):
+    class SlowEmbeddings(CountingEmbeddings):
+        def embed_documents(self, texts):
+            time.sleep(0.05)  # long enough for every thread to miss
+            return [[0.1, v] for v, _ in super().embed_documents(texts)]
+
+    inner = SlowEmbeddings()
+    cache = CachedEmbeddings(inner, path=str(tmp_path / "cache.sqlite3"))
+    start = threading.Barrier(8)
+
+    def embed(_):
+        start.wait()
+        return cache.embed_documents(["Refunds within 30 days."])[0]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        cold = list(pool.map(embed, range(8)))
+
+    assert inner.texts_embedded == 1
+    stats = cache.stats()
+    assert stats["misses"] + stats["hits"] + stats["deduplicated"] == 8
+    # 0.1 is not a float32: cold and cached vectors must still be identical
+    assert all(v == cold[0] for v in cold)
+    assert cache.embed_query("Refunds within 30 days.") == cold[0]
+    print("✅ Concurrent misses shared one embedding call")
+
+
+def test_every_text_embedded_once_under_contention(tmp_path):
+    class TallyEmbeddings(CountingEmbeddings):
+        def __init__(self):
+            super().__init__()
+            self.tally = {}
+            self.lock = threading.Lock()
+
+        def embed_documents(self, texts):
+            with self.lock:
+                for t in texts:
+                    self.tally[t] = self.tally.get(t, 0) + 1
+            return super().embed_documents(texts)
+
+    inner = TallyEmbeddings()
+    cache = CachedEmbeddings(inner, path=str(tmp_path / "cache.sqlite3"))
+    texts = [f"policy clause {i}" for i in range(300)]
+
+    def embed(offset):
+        for i in range(len(texts)):
+            cache.embed_query(texts[(i + offset) % len(texts)])
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(embed, [0, 0, 1, 1, 2, 2]))
+
+    # a thread finishing between another's lookup and its in-flight check
+    # would show up here as a text embedded twice
+    assert set(inner.tally.values()) == {1} and len(inner.tally) == len(texts)
+    print("✅ No duplicate embeddings under contention")
@@ -0,0 +1,77 @@
+# tests/test_eval_runner.py
+"""
+Evaluation runner tests — fake answers, fake scorers, fake judge model.
+"""
+import asyncio
+import json
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from eval_runner import JudgeCache, load_checkpoint, run_eval, summarize_results
+
+ROWS = [{"question": f"question {i}", "ground_truth": f"truth {i}"} for i in range(8)]
+
+
+class FakeRag:
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.active = self.peak = 0
+        self.fail_on = fail_on
+
+    async def __call__(self, question):
+        self.calls.append(question)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if question == self.fail_on:
+            raise RuntimeError("model crashed")
+        return {"answer": f"answer to {question}", "sources": [{"content": "ctx"}]}
+
+
+async def length_score(result):
+    return len(result["answer"]) / 100
+
+
+def test_pipelined_run_respects_concurrency(tmp_path):
+    rag = FakeRag()
+
+    results = asyncio.run(run_eval(ROWS, rag, {"length": length_score}, tmp_path / "ckpt.jsonl",
+                                   answer_concurrency=2, score_concurrency=2, progress_every=0))
+
+    assert [r["question"] for r in results] == [r["question"] for r in ROWS]
+    assert rag.peak == 2
+    assert summarize_results(results, ["length"])["errors"] == 0
+    assert all(r["contexts"] == ["ctx"] for r in results)
+    print("✅ All rows answered and scored")
+
+
+def test_resume_skips_finished_rows_and_retries_failures(tmp_path):
+    checkpoint = tmp_path / "ckpt.jsonl"
+    first = FakeRag(fail_on="question 3")
+    asyncio.run(run_eval(ROWS[:5], first, {"length": length_score}, checkpoint, progress_every=0))
+    with open(checkpoint, "a") as f:
+        f.write('{"row_id": "torn')  # killed mid-write
+
+    second = FakeRag()
+    results = asyncio.run(run_eval(ROWS, second, {"length": length_score}, checkpoint, progress_every=0))
+
+    assert sorted(second.calls) == ["question 3", "question 5", "question 6", "question 7"]
+    assert len(load_checkpoint(checkpoint)) == 8
+    assert all(r["error"] is None for r in results)
+    print("✅ Resumed: only unfinished and failed rows re-run")
+
+
+def test_judge_cache_answers_repeated_prompts_from_disk(tmp_path):
+    path = str(tmp_path / "judge.sqlite3")
+    responses = ['{"verdict": 1}', '{"verdict": 0}']
+    judge = FakeListChatModel(responses=responses, cache=JudgeCache(path))
+    first = judge.invoke("Is the answer faithful?").content
+
+    again = FakeListChatModel(responses=responses, cache=JudgeCache(path))  # a later run
+
+    assert again.invoke("Is the answer faithful?").content == first == '{"verdict": 1}'
+    assert again.i == 0  # model never called
+    assert again.cache.stats()["hits"] == 1
+    assert again.invoke("A different prompt").content == '{"verdict": 1}'  # miss → model
+    print("✅ Judge calls cached across runs")
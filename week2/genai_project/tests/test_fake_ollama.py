@@ -0,0 +1,45 @@
+# tests/test_fake_ollama.py
+"""
+Fake Ollama server tests — real langchain_ollama clients, no model needed.
+"""
+import pytest
+from langchain_ollama import OllamaEmbeddings, OllamaLLM
+
+from fake_ollama import ABSTAIN_ANSWER, FakeOllamaServer, fake_answer, fake_embedding
+from streaming import is_abstention
+
+
+@pytest.fixture
+def fake_server():
+    with FakeOllamaServer() as server:
+        yield server
+
+
+def test_fake_answer_uses_context_or_abstains():
+    prompt = ("Context:\nRefunds are processed within 30 days. Employees get 20 leave days.\n"
+              "Question: How long do refunds take to be processed?")
+    assert fake_answer(prompt) == "Refunds are processed within 30 days."
+    assert fake_answer("Context:\nNothing relevant.\nQuestion: Who is the CEO?") == ABSTAIN_ANSWER
+    assert is_abstention(ABSTAIN_ANSWER)  # the streaming early stop still recognizes it
+
+
+def test_fake_embeddings_are_deterministic_and_similar_texts_are_close():
+    a, b, c = (fake_embedding(t) for t in
+               ("refund policy for customers", "customer refund policy", "annual leave days"))
+    assert a == fake_embedding("refund policy for customers")
+    dot = lambda x, y: sum(i * j for i, j in zip(x, y))
+    assert dot(a, b) > dot(a, c)
+
+
+def test_langchain_clients_talk_to_fake_server(fake_server):
+    llm = OllamaLLM(model="llama3.2", base_url=fake_server.url)
+    embeddings = OllamaEmbeddings(model="llama3.2", base_url=fake_server.url)
+
+    prompt = "Context:\nRefunds are processed within 30 days.\nQuestion: When are refunds processed?"
+    assert llm.invoke(prompt) == "Refunds are processed within 30 days."
+    assert "".join(llm.stream(prompt)) == "Refunds are processed within 30 days."
+    assert len(embeddings.embed_documents(["one", "two"])) == 2
+
+    stats = fake_server.stats()
+    assert stats["generate"] == 2
+    assert stats["embedded_texts"] == 2
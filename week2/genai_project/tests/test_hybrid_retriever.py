@@ -0,0 +1,74 @@
+# tests/test_hybrid_retriever.py
+"""
+Hybrid retrieval tests — BM25 over the sample docs, fake dense retriever.
+"""
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from doc_loader import load_docs
+from hybrid_retriever import BM25Index, HybridRetriever
+
+
+class FixedRetriever(BaseRetriever):
+    docs: list
+    calls: int = 0
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        self.calls += 1
+        return [Document(page_content=d.page_content, metadata=dict(d.metadata, score=0.5))
+                for d in self.docs]
+
+
+def make_chunks():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=20)
+    return splitter.split_documents(load_docs())
+
+
+def test_bm25_finds_exact_policy_terms(tmp_path):
+    index = BM25Index.from_documents(make_chunks(), version="v1")
+    index.save(tmp_path)
+    index = BM25Index.load(tmp_path)
+
+    for query, expected in [("refunds for digital products", "non-refundable"),
+                            ("maternity leave", "26 weeks"),
+                            ("Can't I get a refund after downloading?", "downloaded")]:
+        row, _ = index.search(query, k=3)[0]
+        assert expected in index.texts[row], query
+    assert index.search("quarterly revenue", k=3) == []
+    assert BM25Index.stored_version(tmp_path) == "v1"
+    print("✅ Keyword lookups hit the right chunk")
+
+
+def test_dense_skipped_only_when_lexical_is_confident():
+    chunks = make_chunks()
+    dense = FixedRetriever(docs=chunks[-1:])
+    retriever = HybridRetriever(index=BM25Index.from_documents(chunks), dense=dense, k=3,
+                                skip_dense_coverage=0.8)
+
+    docs = retriever.invoke("maternity leave")
+    assert dense.calls == 0 and retriever.dense_skipped == 1
+    assert docs[0].metadata["retrieval"] == "lexical"
+    assert "Maternity" in docs[0].page_content
+
+    retriever.invoke("What is the CEO's salary?")   # unknown terms → no confidence
+    assert dense.calls == 1 and retriever.dense_calls == 1
+    print("✅ Dense embedding skipped for confident keyword matches")
+
+
+def test_fusion_merges_both_rankings():
+    chunks = make_chunks()
+    index = BM25Index.from_documents(chunks)
+    second_lexical = chunks[index.search("refund policy", k=2)[1][0]]
+    onboarding = next(c for c in chunks if "onboarding" in c.page_content.lower())
+    retriever = HybridRetriever(index=index, k=10,
+                                dense=FixedRetriever(docs=[second_lexical, onboarding]))
+
+    docs = retriever.invoke("refund policy")
+
+    contents = [d.page_content for d in docs]
+    assert contents[0] == second_lexical.page_content  # found by both sides
+    assert onboarding.page_content in contents           # dense-only hit kept
+    assert docs[0].metadata["dense_score"] == 0.5 and "lexical_score" in docs[0].metadata
+    assert [d.metadata["score"] for d in docs] == sorted((d.metadata["score"] for d in docs), reverse=True)
+    print("✅ RRF fusion")
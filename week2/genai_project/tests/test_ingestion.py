@@ -0,0 +1,160 @@
+# tests/test_ingestion.py
+"""
+Incremental ingestion tests — no Ollama, no Chroma.
+A fake vector store records which chunk IDs get embedded and deleted.
+"""
+import pytest
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from ingestion import chunk_ids, sync_documents
+
+
+class FakeEmbeddings:
+    def __init__(self, fail_times=0, fail_on=None):
+        self.embedded = 0
+        self.fail_times = fail_times
+        self.fail_on = fail_on  # texts containing this always fail
+
+    def embed_documents(self, texts):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("Ollama busy")
+        if self.fail_on and any(self.fail_on in t for t in texts):
+            raise ConnectionError("Ollama down")
+        self.embedded += len(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+
+class FakeVectorStore:
+    """The parts of the Chroma API that ingestion uses."""
+
+    def __init__(self, embeddings=None):
+        self.ids = set()
+        self.metadatas = {}
+        self.embeddings = embeddings or FakeEmbeddings()
+
+    @property
+    def embedded(self):
+        return self.embeddings.embedded
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        vectors = self.embeddings.embed_documents(texts)
+        assert len(ids) == len(vectors) == len(metadatas)
+        self.ids.update(ids)
+        self.metadatas.update(zip(ids, metadatas))
+        return ids
+
+    def get(self, ids=None, limit=None, include=None):
+        found = sorted(self.ids if ids is None else self.ids.intersection(ids))[:limit]
+        return {"ids": found, "metadatas": [self.metadatas[i] for i in found]}
+
+    def delete(self, ids):
+        self.ids.difference_update(ids)
+
+
+@pytest.fixture
+def splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=60, chunk_overlap=0)
+
+
+def make_docs(refund_text="Refunds within 30 days. " * 6):
+    return [
+        Document(page_content=refund_text, metadata={"source": "refund.txt"}),
+        Document(page_content="Employees get 20 days of leave. " * 6, metadata={"source": "leave.txt"}),
+    ]
+
+
+def test_restart_without_changes_embeds_nothing(tmp_path, splitter):
+    store = FakeVectorStore()
+    manifest = str(tmp_path / "manifest.json")
+
+    first = sync_documents(store, make_docs(), splitter, manifest)
+    embedded_after_first_run = store.embedded
+    second = sync_documents(store, make_docs(), splitter, manifest)
+
+    assert first["chunks_added"] > 0
+    assert second["files_unchanged"] == 2
+    assert store.embedded == embedded_after_first_run  # zero new embedding calls
+    print("✅ Unchanged corpus skipped")
+
+
+def test_changed_and_removed_files_drop_their_chunks(tmp_path, splitter):
+    store = FakeVectorStore()
+    manifest = str(tmp_path / "manifest.json")
+    sync_documents(store, make_docs(), splitter, manifest)
+
+    edited = make_docs(refund_text="Refunds within 60 days. " * 6)[:1]  # leave.txt deleted
+    stats = sync_documents(store, edited, splitter, manifest)
+
+    assert stats["files_changed"] == 1
+    assert stats["files_removed"] == 1
+    assert len(store.ids) == stats["chunks_added"]  # only the new refund chunks remain
+    print("✅ Stale chunks deleted")
+
+
+def test_edit_above_a_chunk_refreshes_its_start_index(tmp_path):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=30, chunk_overlap=0, add_start_index=True)
+    store = FakeVectorStore()
+    manifest = str(tmp_path / "manifest.json")
+    policy = "Refunds within 30 days.\n\nReturns need a receipt.\n\nOr you get store credit."
+    sync_documents(store, make_docs(policy), splitter, manifest)
+
+    edited = make_docs("Updated in March.\n\n" + policy)  # same chunks, new offsets
+    stats = sync_documents(store, edited, splitter, manifest)
+
+    chunks = splitter.split_documents(edited[:1])
+    for cid, chunk in zip(chunk_ids("refund.txt", chunks), chunks):
+        assert store.metadatas[cid] == chunk.metadata  # kept chunks moved with the edit
+    assert stats["chunks_moved"] > 0
+    assert sync_documents(store, edited, splitter, manifest)["chunks_moved"] == 0
+    print("✅ Moved chunks re-stored with their new offsets")
+
+
+def test_config_change_triggers_full_rebuild(tmp_path, splitter):
+    store = FakeVectorStore()
+    manifest = str(tmp_path / "manifest.json")
+    sync_documents(store, make_docs(), splitter, manifest, config={"chunk_size": 60})
+
+    bigger = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0)
+    stats = sync_documents(store, make_docs(), bigger, manifest, config={"chunk_size": 200})
+
+    assert stats["files_changed"] == 2
+    assert len(store.ids) == stats["chunks_added"]
+    print("✅ Config change rebuilt the collection")
+
+
+def test_embedding_batches_retry_then_store(tmp_path, splitter):
+    store = FakeVectorStore(FakeEmbeddings(fail_times=1))
+    manifest = str(tmp_path / "manifest.json")
+
+    stats = sync_documents(store, make_docs(), splitter, manifest, batch_size=2, max_workers=2,
+                           backoff=0)
+
+    assert stats["files_failed"] == 0
+    assert stats["embedding"]["batches"] > 1
+    assert len(store.ids) == stats["chunks_added"]
+    print("✅ Failed batch retried")
+
+
+def test_failed_file_stays_tracked_until_it_is_stored(tmp_path, splitter):
+    store = FakeVectorStore(FakeEmbeddings(fail_on="Sick leave"))
+    manifest = str(tmp_path / "manifest.json")
+    leave = "Employees get 20 days of leave. " * 3 + "Sick leave is separate. " * 3
+    docs = [make_docs()[0], Document(page_content=leave, metadata={"source": "leave.txt"})]
+
+    refund_ids = set(chunk_ids("refund.txt", splitter.split_documents(docs[:1])))
+
+    stats = sync_documents(store, docs, splitter, manifest, batch_size=1, backoff=0)
+    assert stats["files_failed"] == 1 and stats["embedding"]["failed_ids"]
+    assert store.ids - refund_ids  # the leave chunks that did not fail are stored
+
+    # the stored leave chunks are tracked, so deleting the file before a retry removes them
+    stats = sync_documents(store, docs[:1], splitter, manifest)
+    assert stats["files_removed"] == 1 and store.ids == refund_ids
+
+    store.embeddings.fail_on = None  # Ollama is back
+    sync_documents(store, docs, splitter, manifest, batch_size=1, backoff=0)
+    stats = sync_documents(store, docs, splitter, manifest)
+    assert stats["files_unchanged"] == 2 and stats["files_failed"] == 0
+    print("✅ Partially stored file tracked and retried")
@@ -0,0 +1,128 @@
+# tests/test_numpy_index.py
+"""
+NumPy index tests — random vectors and a fake embedding model, no Ollama.
+"""
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from numpy_index import NumpyRetriever, NumpyVectorIndex
+
+
+def make_index(n=50, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim))
+    return NumpyVectorIndex.from_records(
+        [f"id-{i}" for i in range(n)],
+        [f"chunk {i}" for i in range(n)],
+        [{"source": f"doc{i % 3}.txt"} if i % 5 else {} for i in range(n)],
+        vectors,
+        version="v1",
+    ), vectors
+
+
+def test_top_k_matches_brute_force():
+    index, vectors = make_index()
+    query = np.random.default_rng(1).normal(size=16)
+
+    hits = index.search(query, k=5)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:5]
+    assert [row for row, _ in hits] == list(expected)
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+    assert len(index.search(query, k=500)) == 50
+    print("✅ argpartition top-k == full sort")
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    index, _ = make_index()
+    index.save(tmp_path)
+
+    loaded = NumpyVectorIndex.load(tmp_path)
+
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.version == NumpyVectorIndex.stored_info(tmp_path)["version"] == "v1"
+    assert loaded.document(1).metadata == {"source": "doc1.txt"}
+    assert loaded.document(0).metadata == {}  # missing keys stay missing
+    print("✅ Round-trips through disk, memory-mapped")
+
+
+def test_resave_leaves_a_loaded_index_readable(tmp_path):
+    old, _ = make_index(seed=0)
+    old.save(tmp_path)
+    loaded = NumpyVectorIndex.load(tmp_path)
+    before = loaded.search(np.ones(16), k=3)
+
+    new, _ = make_index(n=20, seed=1)
+    new.version = "v2"
+    new.save(tmp_path)
+
+    assert loaded.search(np.ones(16), k=3) == before  # still its own pages, no SIGBUS
+    reloaded = NumpyVectorIndex.load(tmp_path)
+    assert len(reloaded) == 20 and reloaded.version == "v2"
+    assert len(list(tmp_path.glob("vectors-*.npy"))) == 1  # the old generation is gone
+    print("✅ Saves switch generations atomically")
+
+
+def test_retriever_returns_scored_documents():
+    embeddings = DeterministicFakeEmbedding(size=16)
+    texts = ["refund within 30 days", "20 days of annual leave", "week 1 culture"]
+    index = NumpyVectorIndex.from_records(
+        ["a", "b", "c"], texts, [{"source": "x.txt"}] * 3, embeddings.embed_documents(texts))
+
+    docs = NumpyRetriever(index=index, embeddings=embeddings, k=2).invoke("refund within 30 days")
+
+    assert docs[0].page_content == "refund within 30 days"
+    assert docs[0].metadata["score"] > 0.99
+    assert docs[0].metadata["source"] == "x.txt" and docs[0].id == "a"
+    print("✅ Drop-in retriever")
+
+
+def test_pipeline_ingest_moves_numpy_retriever_to_new_export(tmp_path, monkeypatch):
+    import rag_pipeline
+    from embedding_cache import get_embeddings
+    from fake_ollama import FakeOllamaServer
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "refund.txt").write_text("Customers can request a refund within 30 days.")
+    monkeypatch.setattr(rag_pipeline, "get_embeddings",
+                        lambda model: get_embeddings(model, path=str(tmp_path / "emb.sqlite3")))
+    with FakeOllamaServer() as server:
+        monkeypatch.setenv("OLLAMA_HOST", server.url)
+        pipeline = rag_pipeline.RagPipeline(docs_folder=str(docs), persist_directory=str(tmp_path / "db"),
+                                            backend="numpy", hybrid=True)
+        assert len(pipeline.retriever.dense.index) == len(pipeline.retriever.index) == 1
+
+        (docs / "leave.txt").write_text("Full-time employees receive 20 days of annual leave.")
+        pipeline.ingest()
+        sources = {d.metadata["source"] for d in pipeline.retriever.invoke("annual leave days")}
+
+    assert len(pipeline.retriever.dense.index) == len(pipeline.retriever.index) == 2
+    assert any(source.endswith("leave.txt") for source in sources)
+    print("✅ ingest() refreshes the NumPy and BM25 indexes in use")
+
+
+def test_export_pages_through_chroma_into_a_memmap(tmp_path, monkeypatch):
+    from langchain_community.vectorstores import Chroma
+
+    store = Chroma(collection_name="export", embedding_function=DeterministicFakeEmbedding(size=16),
+                   persist_directory=str(tmp_path / "db"))
+    texts = [f"chunk number {i}" for i in range(10)]
+    store.add_texts(texts, metadatas=[{"source": f"doc{i % 3}.txt"} for i in range(10)],
+                    ids=[f"id-{i}" for i in range(10)])
+    pages = []
+    get = store._collection.get
+    monkeypatch.setattr(store._collection, "get", lambda **kw: pages.append(kw["limit"]) or get(**kw))
+
+    index = NumpyVectorIndex.export_chroma(store, tmp_path / "numpy", version="v1",
+                                           storage="int8", page_size=4)
+
+    assert pages == [4, 4, 4]
+    assert isinstance(index.vectors, np.memmap) and index.storage == "int8"
+    assert sorted(index.ids) == sorted(f"id-{i}" for i in range(10))
+    row = index.ids.index("id-7")
+    assert index.texts[row] == "chunk number 7" and index.document(row).metadata == {"source": "doc1.txt"}
+    query = DeterministicFakeEmbedding(size=16).embed_query("chunk number 7")
+    assert index.document(index.search(query, k=1)[0][0]).page_content == "chunk number 7"
+    assert len(list((tmp_path / "numpy").glob("vectors-*.npy"))) == 1
+    print("✅ Exported page by page, straight to disk")
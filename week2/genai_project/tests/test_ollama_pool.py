@@ -0,0 +1,74 @@
+# tests/test_ollama_pool.py
+"""
+Shared Ollama client tests — fake Ollama server, slot files in a temp dir.
+"""
+import asyncio
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from filelock import FileLock
+from langchain_ollama import OllamaEmbeddings, OllamaLLM
+
+from fake_ollama import FakeOllamaServer
+from ollama_pool import LimitedTransport, SlotLimiter
+
+
+def test_slots_cap_requests_in_flight(tmp_path):
+    with FakeOllamaServer(first_token_ms=200) as server:
+        transport = LimitedTransport(SlotLimiter(2, str(tmp_path)))
+        kwargs = {"transport": transport}
+        llm = OllamaLLM(model="llama3.2", base_url=server.url, client_kwargs=kwargs)
+        embeddings = OllamaEmbeddings(model="llama3.2", base_url=server.url, client_kwargs=kwargs)
+        assert len(embeddings.embed_query("refund policy")) > 0  # same pool for embeddings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            answers = list(pool.map(llm.invoke, [f"Question: refund {i}?" for i in range(6)]))
+        elapsed = time.perf_counter() - started
+
+    assert all(answers)
+    # 6 requests × 0.2s through 2 slots: 3 rounds, not 1
+    assert elapsed >= 0.55
+    assert transport.limiter.acquired == 7
+    print(f"✅ 6 requests through 2 slots in {elapsed:.2f}s")
+
+
+def test_slots_are_shared_with_other_processes(tmp_path):
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import sys, time; from filelock import FileLock; "
+         f"lock = FileLock({str(tmp_path / 'slot-0.lock')!r}); lock.acquire(); "
+         "print('held', flush=True); time.sleep(0.5)"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    assert holder.stdout.readline().strip() == "held"
+
+    limiter = SlotLimiter(1, str(tmp_path))
+    started = time.perf_counter()
+    lock = limiter.acquire()  # waits for the other "worker" to finish its request
+    waited = time.perf_counter() - started
+    lock.release()
+    holder.wait()
+    assert waited >= 0.3
+
+
+def test_async_requests_release_their_slot(tmp_path):
+    limiter = SlotLimiter(2, str(tmp_path))
+    with FakeOllamaServer() as server:
+        llm = OllamaLLM(model="llama3.2", base_url=server.url,
+                        client_kwargs={"transport": LimitedTransport(limiter)})
+
+        async def ask_all():
+            return await asyncio.gather(*(llm.ainvoke(f"Question: leave {i}?") for i in range(4)))
+
+        assert all(asyncio.run(ask_all()))
+        assert all(llm.invoke(f"Question: refund {i}?") for i in range(3))
+
+    # streamed responses were fully read and closed, so every slot is free again
+    for path in limiter.paths:
+        lock = FileLock(path, thread_local=False)
+        lock.acquire(timeout=0)
+        lock.release()
+    assert limiter.acquired == 7
@@ -0,0 +1,85 @@
+# tests/test_quantization.py
+"""
+Quantized storage tests — clustered random vectors, no Ollama.
+"""
+import numpy as np
+import pytest
+
+from numpy_index import NumpyVectorIndex
+from quantization import recall_report
+
+
+def make_index(n=600, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    vectors = centers[rng.integers(0, 20, n)] + 0.3 * rng.normal(size=(n, dim))
+    index = NumpyVectorIndex.from_records(
+        [str(i) for i in range(n)], [f"chunk {i}" for i in range(n)], [{}] * n, vectors)
+    queries = centers[:10] + 0.3 * rng.normal(size=(10, dim))
+    return index, queries
+
+
+def recall(index, exact, queries, k=5):
+    idx, _ = index.search_batch(queries, k)
+    return np.mean([len(set(a) & set(e)) / k for a, e in zip(idx, exact)])
+
+
+@pytest.mark.parametrize("storage,params,min_recall", [
+    ("float16", {}, 1.0),
+    ("int8", {}, 1.0),
+    ("pq", {"m": 16, "ksub": 64}, 0.9),
+])
+def test_quantized_search_with_rescoring(storage, params, min_recall):
+    index, queries = make_index()
+    exact, _ = index.search_batch(queries, 5)
+
+    quantized = index.with_storage(storage, rescore=10, **params)
+
+    assert recall(quantized, exact, queries) >= min_recall
+    assert quantized.memory_bytes() < index.memory_bytes()
+    _, scores = quantized.search_batch(queries, 5)
+    _, exact_scores = index.search_batch(queries, 5)
+    np.testing.assert_allclose(scores[:, 0], exact_scores[:, 0], rtol=1e-5)  # re-scored exactly
+    print(f"✅ {storage}: {index.memory_bytes() / quantized.memory_bytes():.1f}x smaller")
+
+
+def test_quantized_index_round_trips(tmp_path):
+    index, queries = make_index()
+    quantized = index.with_storage("pq", m=8, ksub=32)
+    quantized.save(tmp_path)
+
+    loaded = NumpyVectorIndex.load(tmp_path)
+
+    assert loaded.storage == "pq" and loaded.storage_params() == {"m": 8, "ksub": 32}
+    assert NumpyVectorIndex.stored_info(tmp_path)["storage"] == "pq"
+    np.testing.assert_array_equal(loaded.search_batch(queries, 3)[0], quantized.search_batch(queries, 3)[0])
+    print("✅ Codes saved and reloaded")
+
+
+def test_recall_report_covers_every_storage():
+    index, queries = make_index(n=300)
+
+    rows = recall_report(index, queries, ks=(1, 5), rescores=(0, 4),
+                         configs=(("int8", {}), ("pq", {"m": 8, "ksub": 32})))
+
+    assert [(r["storage"], r["rescore"]) for r in rows] == [
+        ("float32", 0), ("int8", 0), ("int8", 4), ("pq", 0), ("pq", 4)]
+    assert rows[0]["recall@5"] == 1.0 and rows[0]["compression"] == 1.0
+    assert rows[-1]["compression"] > 8
+    print("✅ Recall vs memory report")
+
+
+def test_codecs_are_fitted_on_a_sample(monkeypatch):
+    import quantization
+
+    index, queries = make_index(n=600)
+    fitted = []
+    fit = quantization.PQCodec.fit
+    monkeypatch.setattr(quantization, "FIT_ROWS", 200)
+    monkeypatch.setattr(quantization.PQCodec, "fit", lambda self, v: fitted.append(len(v)) or fit(self, v))
+
+    quantized = index.with_storage("pq", m=8, ksub=32)
+
+    assert fitted == [200]
+    assert len(quantized.codec.codes) == 600  # every row is still encoded
+    print("✅ PQ fitted on a 200-row sample")
@@ -1,6 +1,9 @@
 # tests/test_rag_basic.py
 import pytest
 
+from answer_grader import grade
+from golden_dataset import golden_test_questions
+
 def test_rag_pipeline_exists(rag_pipeline):
     """Test that RAG pipeline fixture loads successfully"""
     assert rag_pipeline is not None
@@ -29,23 +32,24 @@ def test_answer_reasonable_length(rag_pipeline):
     print(f"✅ Answer length OK: {len(answer)} chars")
 
 
-def test_answerable_questions_get_answers(rag_pipeline, sample_questions):
+# One test per question: runs in parallel under xdist and shows up
+# individually in the latency report
+@pytest.mark.parametrize("question", golden_test_questions['answerable'])
+def test_answerable_questions_get_answers(rag_pipeline, question):
     """Test that questions with answers in docs don't return 'I don't know'"""
-    for question in sample_questions['answerable']:
-        answer = rag_pipeline.invoke(question)
-        
-        # Should NOT abstain on answerable questions
-        assert "don't know" not in answer.lower(), f"Pipeline incorrectly abstained on: {question}"
-        print(f"✅ {question[:50]}... → Answered (not abstained)")
+    answer = rag_pipeline.invoke(question)
+    
+    # Should NOT abstain on answerable questions
+    assert not grade(answer)["abstain"], f"Pipeline incorrectly abstained on: {question}\nGot: {answer}"
+    print(f"✅ {question[:50]}... → Answered (not abstained)")
 
 
-def test_unanswerable_questions_abstain(rag_pipeline, sample_questions):
+@pytest.mark.parametrize("question", golden_test_questions['unanswerable'])
+def test_unanswerable_questions_abstain(rag_pipeline, question):
     """Test that questions without answers properly abstain"""
-    for question in sample_questions['unanswerable']:
-        answer = rag_pipeline.invoke(question)
-        
-        # SHOULD abstain on unanswerable questions
-        abstain_phrases = ["don't know", "not available", "no information"]
-        assert any(phrase in answer.lower() for phrase in abstain_phrases), \
-            f"Pipeline should have abstained but didn't: {question}\nGot: {answer}"
-        print(f"✅ {question[:50]}... → Abstained correctly")
\ No newline at end of file
+    answer = rag_pipeline.invoke(question)
+    
+    # SHOULD abstain on unanswerable questions
+    assert grade(answer)["abstain"], \
+        f"Pipeline should have abstained but didn't: {question}\nGot: {answer}"
+    print(f"✅ {question[:50]}... → Abstained correctly")
\ No newline at end of file
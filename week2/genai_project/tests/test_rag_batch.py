@@ -0,0 +1,75 @@
+# tests/test_rag_batch.py
+"""
+Batch QA tests — a slow fake chain stands in for rag_chain.
+"""
+import asyncio
+import threading
+import time
+
+from rag_batch import answer_batch, aanswer_batch
+
+
+class SlowChain:
+    """Echoes the question after a delay and tracks peak concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def invoke(self, question):
+        self._enter()
+        time.sleep(self.delay)
+        self._exit()
+        if "fail" in question:
+            raise RuntimeError("model crashed")
+        return f"answer to {question}"
+
+    async def ainvoke(self, question):
+        self._enter()
+        await asyncio.sleep(self.delay)
+        self._exit()
+        return f"answer to {question}"
+
+
+def test_batch_keeps_order_and_caps_concurrency():
+    chain = SlowChain()
+    questions = [f"q{i}" for i in range(10)]
+
+    results = answer_batch(chain, questions, max_concurrency=3)
+
+    assert [r["question"] for r in results] == questions
+    assert all(r["answer"] == f"answer to {r['question']}" for r in results)
+    assert chain.peak == 3
+    assert all(r["seconds"] >= chain.delay for r in results)
+    print("✅ Ordered, capped batch")
+
+
+def test_one_failure_does_not_abort_batch():
+    results = answer_batch(SlowChain(delay=0), ["ok", "please fail", "ok again"])
+
+    assert results[1]["answer"] is None
+    assert "model crashed" in results[1]["error"]
+    assert results[2]["answer"] == "answer to ok again"
+    print("✅ Failure isolated")
+
+
+def test_async_batch():
+    chain = SlowChain()
+    questions = [f"q{i}" for i in range(8)]
+
+    results = asyncio.run(aanswer_batch(chain, questions, max_concurrency=2))
+
+    assert [r["question"] for r in results] == questions
+    assert chain.peak == 2
+    print("✅ Async batch")
@@ -2,6 +2,8 @@
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 
+from answer_grader import grade_many
+
 def test_rag_with_mocked_llm():
     """Test RAG logic without calling real Ollama"""
     
@@ -77,17 +79,17 @@ def test_hallucination_detection_logic():
         "Based on industry trends, I would estimate...",
     ]
     
-    abstain_phrases = ["don't know", "not available", "cannot answer"]
+    # Graded in one batch, as for logged answers
+    abstained = grade_many(responses_that_should_abstain + responses_that_are_hallucinations)["abstain"]
     
     # Test correct abstentions
-    for response in responses_that_should_abstain:
-        is_abstaining = any(phrase in response.lower() for phrase in abstain_phrases)
+    for response, is_abstaining in zip(responses_that_should_abstain, abstained):
         assert is_abstaining, f"Should detect abstention in: {response}"
         print(f"✅ Correctly detected abstention")
     
     # Test hallucinations (should NOT contain abstention phrases)
-    for response in responses_that_are_hallucinations:
-        is_abstaining = any(phrase in response.lower() for phrase in abstain_phrases)
+    for response, is_abstaining in zip(responses_that_are_hallucinations,
+                                       abstained[len(responses_that_should_abstain):]):
         assert not is_abstaining, f"Should NOT detect abstention in: {response}"
         print(f"✅ Correctly detected hallucination (no abstention)")
 
@@ -0,0 +1,201 @@
+# tests/test_rag_server.py
+"""
+Query service tests — fake chain, real HTTP server on a free port.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+from langchain_ollama import OllamaEmbeddings, OllamaLLM
+
+from embedding_cache import CachedEmbeddings
+from fake_ollama import FakeOllamaServer
+from rag_pipeline import build_rag_chain
+from answer_cache import SemanticAnswerCache
+import rag_server
+from rag_server import MicroBatcher, ServiceState, make_handler
+from streaming import TokenStream
+
+
+class RecordingChain:
+    def __init__(self):
+        self.questions = []
+
+    def invoke(self, question, config=None):
+        self.questions.append(question)
+        return f"answer to {question}"
+
+
+class RetrievingChain(RecordingChain):
+    def __init__(self, embeddings):
+        super().__init__()
+        self.embeddings = embeddings
+
+    def invoke(self, question, config=None):
+        self.embeddings.embed_query(question)  # what the retriever does first
+        return super().invoke(question, config)
+
+
+class FakePipeline:
+    model, backend, storage, hybrid, tracer, embeddings = "llama3.2", "chroma", "float32", False, None, None
+
+    def __init__(self, **kwargs):
+        self.rag_chain = RecordingChain()
+        self.stream_history = []
+        self.streamed = []
+
+    def invoke(self, question):
+        return self.rag_chain.invoke(question)
+
+    def stream(self, question, stop_on_abstain=False):
+        self.streamed.append(question)
+        return TokenStream(iter(["Refunds ", "within ", "30 days."]), stop_on_abstain)
+
+    def chunk_count(self):
+        return 3
+
+    def collection_version(self):
+        return 1
+
+
+class UnitEmbeddings:
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+@pytest.fixture
+def server():
+    chain = RecordingChain()
+    state = ServiceState()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield state, chain, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST")
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def post_stream(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST")
+    with urllib.request.urlopen(request) as response:
+        return [json.loads(line) for line in response.read().splitlines()]
+
+
+def test_micro_batcher_embeds_a_batch_in_one_call(tmp_path):
+    with FakeOllamaServer() as server:
+        embeddings = CachedEmbeddings(OllamaEmbeddings(model="llama3.2", base_url=server.url),
+                                      path=str(tmp_path / "embeddings.sqlite3"))
+        chain = RetrievingChain(embeddings)
+        batcher = MicroBatcher(chain, embeddings=embeddings, max_batch_size=8, max_wait_ms=200)
+
+        futures = [batcher.submit(f"q{i}") for i in range(5)]
+        answers = [f.result(timeout=5) for f in futures]
+        requests = server.stats()
+
+    assert answers == [f"answer to q{i}" for i in range(5)]
+    assert batcher.batches == 1 and batcher.questions == 5
+    assert requests["embed"] == 1 and requests["embedded_texts"] == 5
+    print("✅ One embedding request for five concurrent questions")
+
+
+def test_micro_batcher_without_embeddings_does_not_wait():
+    chain = RecordingChain()
+    batcher = MicroBatcher(chain, max_wait_ms=1000)
+
+    started = time.perf_counter()
+    answer = batcher.submit("q").result(timeout=5)
+
+    assert answer == "answer to q"
+    assert time.perf_counter() - started < 0.5
+    print("✅ No batching wait when there is nothing to batch")
+
+
+def test_batched_questions_generate_in_parallel():
+    retriever = RunnableLambda(lambda q: [Document(page_content="Refunds within 30 days.")])
+    with FakeOllamaServer(first_token_ms=300, tokens_per_sec=1000) as server:
+        chain = build_rag_chain(retriever, OllamaLLM(model="llama3.2", base_url=server.url))
+        batcher = MicroBatcher(chain, max_batch_size=8, max_wait_ms=50, max_concurrency=4)
+
+        started = time.perf_counter()
+        futures = [batcher.submit(f"What is the refund policy? ({i})") for i in range(4)]
+        answers = [f.result(timeout=10) for f in futures]
+        seconds = time.perf_counter() - started
+
+    assert all(answers)
+    assert seconds < 0.8  # one after another would take at least 4 × 300 ms
+    print(f"✅ Four questions in {seconds:.2f}s")
+
+
+def test_ready_probe_flips_after_load(server, monkeypatch):
+    state, chain, url = server
+
+    with pytest.raises(urllib.error.HTTPError) as not_ready:
+        urllib.request.urlopen(f"{url}/ready")
+    assert not_ready.value.code == 503
+    assert json.loads(urllib.request.urlopen(f"{url}/health").read()) == {"status": "ok"}
+
+    monkeypatch.setattr(rag_server, "RagPipeline", FakePipeline)
+    state.load(ingest=False, max_batch_size=8, max_wait_ms=10, max_concurrency=2)
+    with urllib.request.urlopen(f"{url}/ready") as response:
+        ready = json.loads(response.read())
+        assert response.status == 200
+    assert ready["ready"] and ready["chunks"] == 3
+    print("✅ Not ready while loading, ready after")
+
+
+def test_query_endpoint_answers_through_batcher(server):
+    state, chain, url = server
+    state.batcher = MicroBatcher(chain, max_wait_ms=50)
+    state.ready = True
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        answers = list(pool.map(lambda q: post(f"{url}/query", {"question": q}), ["a", "b", "c", "d"]))
+    many = post(f"{url}/query", {"questions": ["x", "y"]})
+
+    assert [a["answer"] for a in answers] == ["answer to a", "answer to b", "answer to c", "answer to d"]
+    assert [r["answer"] for r in many["results"]] == ["answer to x", "answer to y"]
+    assert sorted(chain.questions) == ["a", "b", "c", "d", "x", "y"]
+    print("✅ Query endpoint")
+
+
+def test_query_rejects_malformed_questions(server):
+    state, chain, url = server
+    state.batcher = MicroBatcher(chain)
+    state.ready = True
+
+    for payload in ({"questions": "abc"}, {"questions": [1, 2]}, {"questions": []}, {"question": None}):
+        with pytest.raises(urllib.error.HTTPError) as bad:
+            post(f"{url}/query", payload)
+        assert bad.value.code == 400
+    assert chain.questions == []
+    print("✅ Malformed payloads are a 400")
+
+
+def test_stream_goes_through_answer_cache(server):
+    state, chain, url = server
+    state.pipeline = FakePipeline()
+    state.cache = SemanticAnswerCache(chain, UnitEmbeddings(), version_fn=state.pipeline.collection_version)
+    state.batcher = MicroBatcher(state.cache, max_concurrency=1)
+    state.ready = True
+
+    first = post_stream(f"{url}/query/stream", {"question": "What is the refund policy?"})
+    second = post_stream(f"{url}/query/stream", {"question": "what is the refund policy"})
+
+    assert "".join(line.get("token", "") for line in first) == "Refunds within 30 days."
+    assert second[0] == {"token": "Refunds within 30 days."}
+    assert second[-1]["cache"] == "exact" and second[-1]["done"]
+    assert state.pipeline.streamed == ["What is the refund policy?"]
+    assert state.batcher.slots.acquire(blocking=False)  # the stream gave its slot back
+    print("✅ Streams are cached and share the concurrency slots")
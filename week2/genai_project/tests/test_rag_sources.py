@@ -0,0 +1,64 @@
+# tests/test_rag_sources.py
+"""
+Answer-with-sources tests — in-memory vector store and a fake LLM.
+"""
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from rag_pipeline import ScoredRetriever, build_rag_chain_with_sources, relevance_score_fn
+
+
+class CountingRetriever(ScoredRetriever):
+    calls: int = 0
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        self.calls += 1
+        return super()._get_relevant_documents(query, run_manager=run_manager)
+
+
+class ScoredInMemoryVectorStore(InMemoryVectorStore):
+    def _select_relevance_score_fn(self):
+        return lambda score: score  # already cosine similarity
+
+
+def make_store():
+    store = ScoredInMemoryVectorStore(DeterministicFakeEmbedding(size=16))
+    store.add_documents([
+        Document(page_content="Customers can request a refund within 30 days.", metadata={"source": "refund.txt"}),
+        Document(page_content="Full-time employees receive 20 days of annual leave.", metadata={"source": "leave.txt"}),
+        Document(page_content="Week 1 covers company culture.", metadata={"source": "onboarding.txt"}),
+    ])
+    return store
+
+
+def test_scored_retriever_attaches_scores():
+    docs = ScoredRetriever(vectorstore=make_store(), k=2).invoke("refund")
+
+    assert len(docs) == 2
+    assert all(isinstance(d.metadata["score"], float) for d in docs)
+    assert docs[0].metadata["score"] >= docs[1].metadata["score"]
+    print("✅ Scores attached")
+
+
+def test_answer_and_sources_from_one_retrieval():
+    retriever = CountingRetriever(vectorstore=make_store(), k=3)
+    chain = build_rag_chain_with_sources(retriever, FakeListLLM(responses=["Refunds within 30 days."]))
+
+    result = chain.invoke("What is the refund policy?")
+
+    assert result["answer"] == "Refunds within 30 days."
+    assert len(result["sources"]) == 3
+    assert {"source", "score", "content", "metadata"} <= set(result["sources"][0])
+    assert retriever.calls == 1
+    print("✅ Single retrieval for answer + sources")
+
+
+def test_relevance_score_fn_falls_back_to_cosine():
+    plain = InMemoryVectorStore(DeterministicFakeEmbedding(size=16))  # raises NotImplementedError
+
+    assert relevance_score_fn(ScoredInMemoryVectorStore(DeterministicFakeEmbedding(size=16)))(0.8) == 0.8
+    assert relevance_score_fn(plain)(0.25) == 0.75
+    assert relevance_score_fn(object())(0.0) == 1.0
+    print("✅ Relevance function with cosine fallback")
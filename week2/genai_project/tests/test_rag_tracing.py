@@ -0,0 +1,118 @@
+# tests/test_rag_tracing.py
+"""
+Tracing tests — the real chain against the fake Ollama server, with
+per-stage spans checked in the summary, the JSONL file and the Chrome trace.
+"""
+import json
+import uuid
+
+import pytest
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+from langchain_ollama import OllamaLLM
+
+from fake_ollama import FakeOllamaServer
+from rag_batch import answer_batch
+from rag_pipeline import ScoredRetriever, build_rag_chain
+from rag_tracing import (StageHistogram, StageTracer, read_traces, stage_span,
+                         summarize_traces)
+
+CHAIN_STAGES = {"request", "retrieve", "embed_query", "vector_search", "format_docs",
+                "prompt", "llm", "llm_prefill", "llm_generate", "parse"}
+
+
+def make_retriever():
+    store = Chroma(collection_name=f"tracing_{uuid.uuid4().hex[:8]}",
+                   embedding_function=DeterministicFakeEmbedding(size=16),
+                   collection_metadata={"hnsw:space": "cosine"})
+    store.add_documents([
+        Document(page_content="Customers can request a refund within 30 days.", metadata={"source": "refund.txt"}),
+        Document(page_content="Full-time employees receive 20 days of annual leave.", metadata={"source": "leave.txt"}),
+    ])
+    return ScoredRetriever(vectorstore=store, k=2)
+
+
+def test_every_stage_of_every_request_is_traced(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    tracer = StageTracer(path)
+    with FakeOllamaServer(first_token_ms=20, tokens_per_sec=500) as server:
+        llm = OllamaLLM(model="llama3.2", base_url=server.url)
+        chain = build_rag_chain(make_retriever(), llm).with_config(callbacks=[tracer])
+        answer_batch(chain, ["What is the refund policy?", "How much leave?", "Who is the CEO?"],
+                     max_concurrency=3)
+        chain.invoke("What is the refund policy?")
+
+    summary = tracer.summary()
+    assert tracer.requests == 4 and tracer.errors == 0
+    assert CHAIN_STAGES <= set(summary)
+    assert all(summary[stage]["count"] == 4 for stage in CHAIN_STAGES)
+    assert summary["llm_prefill"]["p50_ms"] >= 15  # the fake server's first-token delay
+
+    traces = list(read_traces(path))
+    assert len(traces) == 4
+    for trace in traces:
+        spans = {s["span_id"]: s for s in trace["spans"]}
+        root = spans[trace["trace_id"]]
+        assert root["stage"] == "request" and root["parent_id"] is None
+        for span in spans.values():
+            if span is not root:
+                assert span["parent_id"] in spans  # a tree within the request
+                assert root["start"] <= span["start"] <= root["start"] + root["ms"] / 1000 + 1e-3
+        assert trace["stages"]["llm"] >= trace["stages"]["llm_prefill"]
+
+    chrome_path = str(tmp_path / "trace.chrome.json")
+    tracer.export_chrome_trace(chrome_path)
+    with open(chrome_path) as f:
+        events = [e for e in json.load(f)["traceEvents"] if e["ph"] == "X"]
+    assert len(events) == sum(len(t["spans"]) for t in traces)
+    assert len({e["tid"] for e in events}) == 4  # one row per request
+    tracer.close()
+
+
+class ProbeRetriever(BaseRetriever):
+    contexts: list = []
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        self.contexts.append(stage_span("vector_search", run_manager))
+        return [Document(page_content="Refunds within 30 days.")]
+
+
+def test_untraced_runs_are_no_ops_and_errors_are_recorded():
+    retriever = ProbeRetriever()
+    retriever.invoke("refund")
+    assert retriever.contexts[-1] is stage_span("vector_search")  # the shared no-op context
+
+    def explode(docs):
+        raise ValueError("boom")
+
+    tracer = StageTracer()
+    chain = (retriever | RunnableLambda(explode)).with_config(callbacks=[tracer])
+    with pytest.raises(ValueError):
+        chain.invoke("refund")
+
+    trace = tracer.recent[-1]
+    assert tracer.errors == 1 and "boom" in trace["error"]
+    failed = [s for s in trace["spans"] if s["name"] == "explode"]
+    assert failed and "boom" in failed[0]["error"]
+    assert not tracer._open and not tracer._traces  # nothing left behind
+
+
+def test_histogram_percentiles_and_summary_from_jsonl(tmp_path):
+    histogram = StageHistogram()
+    for ms in [0.3] * 90 + [40] * 9 + [200000]:
+        histogram.add(ms)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == 0.5 and summary["p95_ms"] == 50 and summary["p99_ms"] == 50
+    assert summary["max_ms"] == 200000 and histogram.percentile(100) == 200000
+
+    path = tmp_path / "trace.jsonl"
+    trace = {"trace_id": "t", "name": "RunnableSequence", "spans": [
+        {"span_id": "t", "parent_id": None, "stage": "request", "name": "RunnableSequence", "start": 0, "ms": 12.0},
+        {"span_id": "a", "parent_id": "t", "stage": "llm", "name": "OllamaLLM", "start": 0, "ms": 10.0},
+    ]}
+    path.write_text(json.dumps(trace) + "\n" + json.dumps(trace)[:40])  # last line torn
+    assert summarize_traces(read_traces(str(path)))["llm"]["count"] == 1
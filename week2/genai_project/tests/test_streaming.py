@@ -0,0 +1,91 @@
+# tests/test_streaming.py
+"""
+Streaming tests — fake streaming LLM, no Ollama.
+"""
+import asyncio
+
+from langchain_core.language_models.fake import FakeStreamingListLLM
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from streaming import (ABSTAIN_ANSWER, AbstentionDetector, TokenStream, is_abstention,
+                       summarize_streams)
+
+
+def make_chain(response):
+    return PromptTemplate.from_template("{question}") | FakeStreamingListLLM(responses=[response]) | StrOutputParser()
+
+
+class ClosableChunks:
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.tokens)
+
+    def close(self):
+        self.closed = True
+
+
+def test_tokens_arrive_with_metrics():
+    history = []
+    stream = TokenStream(make_chain("Refunds within 30 days.").stream({"question": "q"}),
+                         on_finish=history.append)
+
+    tokens = list(stream)
+
+    assert "".join(tokens) == "Refunds within 30 days." and len(tokens) > 1
+    metrics = stream.metrics
+    assert metrics["tokens"] == len(tokens)
+    assert 0 <= metrics["ttft_seconds"] <= metrics["total_seconds"]
+    assert not metrics["abstained"] and not metrics["stopped_early"]
+    assert history == [metrics]
+    print(f"✅ TTFT {metrics['ttft_seconds']}s")
+
+
+def test_stops_after_abstention_and_closes_upstream():
+    chunks = ClosableChunks(["I don't know ", "based on available ", "information.", " However,", " I guess..."])
+    stream = TokenStream(chunks, stop_on_abstain=True)
+
+    text = "".join(stream)
+
+    assert text == ABSTAIN_ANSWER
+    assert chunks.closed
+    assert stream.metrics["stopped_early"] and stream.metrics["abstained"]
+    assert is_abstention("I DON’T  know based on available information")
+    print("✅ Generation stopped after the abstention sentence")
+
+
+def test_async_stream_and_summary():
+    history = []
+
+    async def consume():
+        stream = TokenStream(make_chain(ABSTAIN_ANSWER + " Extra.").astream({"question": "q"}),
+                             stop_on_abstain=True, on_finish=history.append)
+        return "".join([token async for token in stream])
+
+    text = asyncio.run(consume())
+
+    assert is_abstention(text) and "Extra" not in text  # may stop before the final "."
+    summary = summarize_streams(history)
+    assert summary["requests"] == 1 and summary["stopped_early"] == 1
+    print("✅ Async streaming")
+
+
+def test_abstention_detector_matches_across_chunks_within_the_window():
+    text = "Sorry —  I DON’T know\nbased on available   information. Anything else?"
+    for size in (1, 3, 7, len(text)):
+        detector = AbstentionDetector()
+        found = [detector.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        assert found[-1] and found.index(True) * size < text.index("Anything")
+        assert len(detector._tail) < len(ABSTAIN_ANSWER)
+
+    late = AbstentionDetector(window=5)
+    assert not late.feed("The refund policy allows returns within thirty days. ")
+    assert late.done and not late.feed(ABSTAIN_ANSWER)  # past the window: no longer checked
+    assert is_abstention("The refund policy allows returns within thirty days. " + ABSTAIN_ANSWER)
+    print("✅ Incremental abstention check")
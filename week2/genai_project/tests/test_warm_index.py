@@ -0,0 +1,76 @@
+# tests/test_warm_index.py
+"""
+Warm-start index tests — fake embeddings, a temporary index root.
+"""
+import threading
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from doc_loader import load_docs
+from warm_index import index_key, open_warm_index
+
+CONFIG = {"chunk_size": 300, "chunk_overlap": 30}
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+
+def open_index(root, embeddings, docs=None, config=CONFIG, model="fake"):
+    return open_warm_index(docs or load_docs(), RecursiveCharacterTextSplitter(**config), config,
+                           embeddings, model, root=str(root))
+
+
+def test_second_session_reuses_the_index_without_embedding(tmp_path):
+    embeddings = CountingEmbeddings(size=16)
+    store, bm25, info = open_index(tmp_path, embeddings)
+    built_calls = embeddings.calls
+    assert not info["reused"] and built_calls == info["chunks"] > 0
+
+    store, bm25, info = open_index(tmp_path, embeddings)
+    assert info["reused"] and embeddings.calls == built_calls  # nothing re-embedded
+    assert store._collection.count() == len(bm25) == info["chunks"]
+    row, _ = bm25.search("maternity leave", k=1)[0]
+    assert "26 weeks" in bm25.texts[row]
+    assert store.similarity_search("refund policy", k=1)
+    print(f"✅ Warm start: {info['chunks']} chunks reused, 0 embedding calls")
+
+
+def test_key_changes_with_corpus_splitter_and_model():
+    docs = load_docs()
+    key = index_key(docs, CONFIG, "fake")
+    edited = [Document(page_content=d.page_content + " Updated.", metadata=d.metadata) if i == 0 else d
+              for i, d in enumerate(docs)]
+    assert index_key(list(reversed(docs)), CONFIG, "fake") == key  # load order doesn't matter
+    assert index_key(edited, CONFIG, "fake") != key
+    assert index_key(docs, dict(CONFIG, chunk_overlap=0), "fake") != key
+    assert index_key(docs, CONFIG, "nomic-embed-text") != key
+
+
+def test_concurrent_workers_build_once_and_crashed_builds_are_redone(tmp_path):
+    embeddings = CountingEmbeddings(size=16)
+    infos = []
+    workers = [threading.Thread(target=lambda: infos.append(open_index(tmp_path, embeddings)[2]))
+               for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert sorted(i["reused"] for i in infos) == [False, True, True, True]
+    assert embeddings.calls == infos[0]["chunks"]  # exactly one build
+
+    # a build killed before its READY marker is wiped and redone
+    crashed = tmp_path / "crashed"
+    leftover = crashed / index_key(load_docs(), CONFIG, "fake") / "half-written.bin"
+    leftover.parent.mkdir(parents=True)
+    leftover.write_bytes(b"\0" * 16)
+    store, _, info = open_index(crashed, embeddings)
+    assert not info["reused"] and not leftover.exists()
+    assert store._collection.count() == info["chunks"]
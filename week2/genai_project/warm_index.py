@@ -0,0 +1,120 @@
+# warm_index.py
+"""
+Warm-Start Test Index
+
+The session fixture in tests/conftest.py used to re-chunk and re-embed the
+whole corpus into ./test_chroma on every pytest run, and under
+pytest-xdist every worker did it again, racing on the same directory.
+
+open_warm_index() builds the index once per key:
+
+    key = hash(corpus content, splitter config, embedding model)
+
+and stores it under <root>/<key>/ in RagPipeline's on-disk layout —
+chroma/ (cosine collection), chroma_manifest.json and chroma_bm25/, built
+by the same sync_documents ingestion — plus a READY marker written last,
+so RagPipeline(persist_directory=<key>/chroma, ingest=False) opens it as
+is. Later sessions, and the other xdist workers,
+open it read-only. A file lock makes exactly one process build it while
+the others wait. A build that crashed halfway has no READY marker and is
+wiped and redone by the next process.
+"""
+import json
+import os
+import shutil
+import time
+
+from filelock import FileLock
+from langchain_community.vectorstores import Chroma
+
+from hybrid_retriever import BM25Index, bm25_path_for
+from ingestion import collection_version, content_hash, manifest_path_for, sync_documents
+
+READY_FILE = "READY.json"
+LAYOUT = 2  # part of the key: an index in an older on-disk layout is rebuilt, not misread
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_chroma")
+LOCK_TIMEOUT = 30 * 60  # a cold build embeds the whole corpus
+
+
+def index_key(docs, splitter_config, model):
+    """Fingerprint of what the index is built from; any change gives a new index."""
+    corpus = sorted((d.metadata.get("source", ""), content_hash(d.page_content)) for d in docs)
+    fingerprint = json.dumps([corpus, splitter_config, model, LAYOUT], sort_keys=True)
+    return content_hash(fingerprint)[:16]
+
+
+def _ready(directory):
+    try:
+        with open(os.path.join(directory, READY_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _chroma(directory, embeddings, collection_name):
+    return Chroma(collection_name=collection_name, embedding_function=embeddings,
+                  persist_directory=os.path.join(directory, "chroma"),
+                  collection_metadata={"hnsw:space": "cosine"})  # as RagPipeline creates it
+
+
+def _open(directory, embeddings, collection_name):
+    vectorstore = _chroma(directory, embeddings, collection_name)
+    return vectorstore, BM25Index.load(bm25_path_for(os.path.join(directory, "chroma")))
+
+
+def _build(directory, docs, splitter, embeddings, collection_name, info):
+    if os.path.exists(directory):
+        shutil.rmtree(directory)  # leftovers of a build that never finished
+    persist_directory = os.path.join(directory, "chroma")
+    manifest_path = manifest_path_for(persist_directory)
+    vectorstore = _chroma(directory, embeddings, collection_name)
+    started = time.perf_counter()
+    stats = sync_documents(vectorstore, docs, splitter, manifest_path,
+                           config=dict(info["splitter"], embedding_model=info["model"]))
+    if stats["files_failed"]:
+        raise RuntimeError(f"{stats['files_failed']} files failed to embed; index not marked ready")
+    BM25Index.from_chroma(vectorstore, version=collection_version(manifest_path)).save(
+        bm25_path_for(persist_directory))
+
+    ready = dict(info, chunks=stats["chunks_added"],
+                 built_seconds=round(time.perf_counter() - started, 2), built_at=time.time())
+    with open(os.path.join(directory, READY_FILE + ".tmp"), "w") as f:
+        json.dump(ready, f, indent=2)
+    os.replace(os.path.join(directory, READY_FILE + ".tmp"), os.path.join(directory, READY_FILE))
+    return ready
+
+
+def open_warm_index(docs, splitter, splitter_config, embeddings, model, root=DEFAULT_ROOT,
+                    collection_name="test_collection", timeout=LOCK_TIMEOUT):
+    """
+    Open the index for (docs, splitter_config, model), building it first if needed.
+
+    Args:
+        docs (list[Document]): Corpus, e.g. load_docs()
+        splitter: Text splitter matching `splitter_config`
+        splitter_config (dict): What the splitter does (chunk_size, overlap, ...);
+            part of the key, so changing it rebuilds
+        embeddings: Embeddings used for the build and for queries
+        model (str): Embedding model name, part of the key
+
+    Returns:
+        tuple: (Chroma vectorstore, BM25Index, info) where info["reused"]
+            tells whether this call found a finished index and
+            info["persist_directory"] is the collection's directory
+    """
+    key = index_key(docs, splitter_config, model)
+    directory = os.path.join(root, key)
+    info = {"key": key, "splitter": splitter_config, "model": model}
+
+    ready = _ready(directory)  # fast path: no lock once an index is finished
+    reused = ready is not None
+    if not reused:
+        os.makedirs(root, exist_ok=True)
+        with FileLock(directory + ".lock", timeout=timeout):
+            ready = _ready(directory)  # another worker may have built it meanwhile
+            reused = ready is not None
+            if not reused:
+                ready = _build(directory, docs, splitter, embeddings, collection_name, info)
+    vectorstore, bm25 = _open(directory, embeddings, collection_name)
+    return vectorstore, bm25, dict(ready, reused=reused, directory=directory,
+                                   persist_directory=os.path.join(directory, "chroma"))